@@ -15,7 +15,11 @@ setuptools.setup(
     packages=setuptools.find_packages(),
     install_requires=[
         'simpy',
+        'numpy',
     ],
+    extras_require={
+        'graph': ['scipy'],
+    },
     classifiers=[
         "Programming Language :: Python :: 3",
         "License :: OSI Approved :: BSD License",
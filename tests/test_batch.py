@@ -0,0 +1,58 @@
+from wsnsimpy.batch import collect_stats, param_grid, run_batch
+from wsnsimpy.wsnsimpy import (DefaultMacLayer, LayeredNode, Simulator, Stat,
+                               BROADCAST_ADDR)
+
+
+class CountingMac(DefaultMacLayer):
+    '''Custom layer keeping its own Stat object, as before the registry'''
+    def __init__(self,node):
+        super().__init__(node)
+        self.stat = Stat()
+        self.stat.total_sent = 0
+
+    def send_pdu(self,dst,pdu):
+        self.stat.total_sent += 1
+        super().send_pdu(dst,pdu)
+
+
+class Beacon(LayeredNode):
+    tx_range = 50
+
+    def init(self):
+        self.logging = False
+        self.set_layers(mac=CountingMac)
+
+    def run(self):
+        for _ in range(3):
+            yield self.timeout(1)
+            self.send(BROADCAST_ADDR)
+
+
+def scenario(seed,timescale,nodes=4):
+    sim = Simulator(until=10,timescale=timescale,seed=seed)
+    for i in range(nodes):
+        sim.add_node(Beacon,(i*20,0))
+    return sim
+
+
+def test_param_grid():
+    assert param_grid({'b':[1,2],'a':[3]}) == [{'a':3,'b':1},{'a':3,'b':2}]
+    assert param_grid(None) == [{}]
+
+
+def test_collect_stats_includes_custom_stat_objects():
+    sim = scenario(seed=0,timescale=0)
+    sim.run()
+    totals = collect_stats(sim)
+    assert totals['mac.total_sent'] == 12
+    assert totals['phy.total_tx'] == 12
+
+
+def test_run_batch_rows(tmp_path):
+    resume = tmp_path/'rows.jsonl'
+    rows = run_batch(scenario,{'nodes':[2,4]},seeds=[0,1],workers=2,
+                     resume=str(resume))
+    assert [(r['nodes'],r['seed']) for r in rows] == [(2,0),(2,1),(4,0),(4,1)]
+    assert [r['mac.total_sent'] for r in rows] == [6,6,12,12]
+    assert run_batch(scenario,{'nodes':[2,4]},seeds=[0,1],
+                     resume=str(resume)) == rows
@@ -0,0 +1,78 @@
+import numpy as np
+
+import pytest
+
+from wsnsimpy.channel import LogDistanceChannel, SinrPhyLayer
+from wsnsimpy.wsnsimpy import (AppPDU, BROADCAST_ADDR, LayeredNode, MacFrame,
+                               NetPDU, Node, Simulator)
+
+
+class Sensor(Node):
+    tx_range = 50
+
+
+def test_shadowing_depends_only_on_the_pair():
+    sim = Simulator(until=1,timescale=0)
+    sim.add_nodes(Sensor,[(i*10,0) for i in range(10)])
+    channel = LogDistanceChannel(sim,shadowing_db=6.0,seed=7)
+    src = np.array([0,3,5,9])
+    dst = np.array([1,8,2,4])
+    before = channel.shadowing_db(src,dst)
+    sim.add_nodes(Sensor,[(i*10,20) for i in range(25)])
+    assert np.array_equal(channel.shadowing_db(src,dst),before)
+    assert np.array_equal(channel.shadowing_db(dst,src),before)
+    assert len(set(before.tolist())) == len(before)
+
+
+def test_max_range_sets_the_interference_range():
+    positions = [(0,0),(40,0),(120,0)]
+    near = Simulator(until=1,timescale=0)
+    near.add_nodes(Sensor,positions)
+    far = Simulator(until=1,timescale=0,max_range=150)
+    far.add_nodes(Sensor,positions)
+    assert LogDistanceChannel(near).link_gains(0)[0].tolist() == [1]
+    assert LogDistanceChannel(far).link_gains(0)[0].tolist() == [1,2]
+
+
+def test_channel_follows_tx_range_changes():
+    sim = Simulator(until=1,timescale=0)
+    sim.add_nodes(Sensor,[(0,0),(40,0),(120,0)])
+    channel = LogDistanceChannel(sim)
+    assert channel.link_gains(0)[0].tolist() == [1]
+    sim.nodes[0].tx_range = 130
+    sim.nodes[0].check_range()
+    assert channel.link_gains(0)[0].tolist() == [1,2]
+
+
+class Radio(LayeredNode):
+    tx_range = 100
+
+    def init(self):
+        self.logging = False
+        self.received = []
+        self.set_layers(phy=SinrPhyLayer)
+
+    def on_receive(self,sender,*args,**kwargs):
+        self.received.append(sender)
+
+
+def broadcast(src):
+    packet = NetPDU(64,src,BROADCAST_ADDR,AppPDU(64,(),{}),0)
+    return MacFrame(64,src,BROADCAST_ADDR,packet,0)
+
+
+@pytest.mark.parametrize('interferer,received',[(90,[1]),(12,[])])
+def test_sinr_decides_reception_under_interference(interferer,received):
+    # node 0 locks onto node 1, 10 m away, before node 2 starts sending:
+    # at 90 m, node 2 leaves an SINR of about 26 dB and node 1's frame is
+    # captured; at 12 m, the SINR falls to about 2 dB, below the threshold
+    sim = Simulator(until=2,timescale=0,seed=1)
+    sim.add_nodes(Radio,[(0,0),(10,0),(interferer,0)])
+    sim.env.schedule_call(1.0,lambda: sim.nodes[1].phy.send_pdu(broadcast(1)))
+    sim.env.schedule_call(1.0001,lambda: sim.nodes[2].phy.send_pdu(broadcast(2)))
+    sim.run()
+    phy = sim.nodes[0].phy.stat
+    assert sim.nodes[0].received == received
+    assert phy.total_rx == len(received)
+    # a dropped frame and the frame overlapping it are both collisions
+    assert phy.total_collision == 2-2*len(received)
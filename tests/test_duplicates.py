@@ -0,0 +1,94 @@
+import pytest
+
+from wsnsimpy.wsnsimpy import (AppPDU, CsmaMacLayer, DefaultMacLayer,
+                               DuplicateCache, LayeredNode, MacFrame, NetPDU,
+                               Simulator)
+
+
+def test_cache_is_bounded_lru():
+    cache = DuplicateCache(capacity=2)
+    assert not cache.seen((1,1),0)
+    assert not cache.seen((1,2),0)
+    assert cache.seen((1,1),0)
+    # (1,2) is now the least recently seen and gets evicted
+    assert not cache.seen((1,3),0)
+    assert len(cache) == 2
+    assert not cache.seen((1,2),0)
+    assert cache.seen((1,3),0)
+
+
+def test_cache_lifetime():
+    cache = DuplicateCache(capacity=4,lifetime=1.0)
+    cache.seen((1,1),0)
+    assert cache.seen((1,1),0.5)
+    assert not cache.seen((1,1),2.0)
+
+
+class Sink(LayeredNode):
+    tx_range = 100
+    mac_class = DefaultMacLayer
+
+    def init(self):
+        self.logging = False
+        self.received = []
+        self.set_layers(mac=self.mac_class)
+
+    def on_receive(self,sender,*args,**kwargs):
+        self.received.append(args)
+
+
+class CsmaSink(Sink):
+    mac_class = CsmaMacLayer
+
+
+def frame(src,dst,seq,net_seq):
+    packet = NetPDU(64,src,dst,AppPDU(64,(net_seq,),{}),net_seq)
+    return MacFrame(64,src,dst,packet,seq)
+
+
+@pytest.mark.parametrize('nodeclass',[Sink,CsmaSink])
+def test_retransmitted_frames_are_passed_up_once(nodeclass):
+    sim = Simulator(until=1,timescale=0)
+    sim.add_node(nodeclass,(0,0))
+    sink = sim.add_node(nodeclass,(10,0))
+    for n in sim.nodes:
+        n.init()
+    copy = frame(0,1,5,9)
+    sink.mac.on_receive_pdu(copy)
+    sink.mac.on_receive_pdu(copy)
+    # same sequence number from another sender is not a duplicate
+    sink.mac.on_receive_pdu(frame(2,1,5,9))
+    sim.env.run(until=1)
+    assert sink.received == [(9,),(9,)]
+    assert sink.mac.stat.total_duplicate == 1
+    assert sink.mac.stat.total_ack == 3
+
+
+def test_sequence_numbers_do_not_wrap_within_the_lifetime():
+    sim = Simulator(until=1,timescale=0)
+    sim.add_node(Sink,(0,0))
+    sim.add_node(Sink,(10,0))
+    sim.add_node(Sink,(0,10))
+    for n in sim.nodes:
+        n.init()
+    # node 1 keeps the key of the first frame while node 0 sends node 2
+    # enough frames for an 8-bit sequence number to wrap around
+    sender = sim.nodes[0].mac
+    for i,dst in enumerate([1]+[2]*255+[1]):
+        sender.send_pdu(dst,NetPDU(64,0,dst,AppPDU(64,(i,),{}),i))
+    sim.env.run(until=1)
+    assert len(sender.tx_queue) == 0
+    assert sim.nodes[1].received == [(0,),(256,)]
+    assert sim.nodes[1].mac.stat.total_duplicate == 0
+
+
+def test_net_layer_drops_copies_from_other_relays():
+    sim = Simulator(until=1,timescale=0)
+    sink = sim.add_node(Sink,(0,0))
+    sink.init()
+    packet = NetPDU(64,7,0,AppPDU(64,('x',),{}),3)
+    sink.net.on_receive_pdu(4,packet)
+    sink.net.on_receive_pdu(5,packet)
+    sim.env.run(until=1)
+    assert sink.received == [('x',)]
+    assert sink.net.stat.total_duplicate == 1
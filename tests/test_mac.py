@@ -0,0 +1,67 @@
+from wsnsimpy.wsnsimpy import (AppPDU, CsmaMacLayer, LayeredNode, MacAck,
+                               MacFrame, NetPDU, Simulator, BROADCAST_ADDR)
+
+
+class Mote(LayeredNode):
+    tx_range = 100
+
+    def init(self):
+        self.logging = False
+        self.received = []
+        self.set_layers(mac=CsmaMacLayer)
+
+    def on_receive(self,sender,*args,**kwargs):
+        self.received.append((sender,args))
+
+
+def frame(src,dst,seq):
+    packet = NetPDU(64,src,dst,AppPDU(64,(),{}),seq)
+    return MacFrame(64,src,dst,packet,seq)
+
+
+def line(n=3,spacing=30,node=Mote):
+    sim = Simulator(until=10,timescale=0,seed=1)
+    for i in range(n):
+        sim.add_node(node,(i*spacing,0))
+    for n in sim.nodes:
+        n.init()
+    return sim
+
+
+def test_csma_ignores_acks_for_other_nodes():
+    sim = line()
+    mac = sim.nodes[0].mac
+    mac.tx_queue.append(frame(0,1,7))
+    mac._start_frame()
+    mac.state = mac.WAIT_ACK
+    # node 2's ACK for its own frame 7, overheard by node 0
+    mac.on_receive_pdu(MacAck(40,frame(2,1,7),7))
+    assert mac.state == mac.WAIT_ACK
+    assert mac.stat.total_tx_unicast == 0
+    mac.on_receive_pdu(MacAck(40,frame(0,1,7),7))
+    assert mac.stat.total_tx_unicast == 1
+
+
+class Sender(Mote):
+    def run(self):
+        if self.id == 0:
+            for i in range(5):
+                yield self.timeout(0.5)
+                self.send(1,i)
+                self.send(BROADCAST_ADDR,i)
+
+
+def test_csma_delivers_unicasts_and_broadcasts():
+    sim = Simulator(until=10,timescale=0,seed=1)
+    for i in range(3):
+        sim.add_node(Sender,(i*30,0))
+    sim.run()
+    stat = sim.nodes[0].mac.stat
+    assert stat.total_tx_unicast == 5
+    assert stat.total_tx_broadcast == 5
+    assert stat.total_tx_failure == 0
+    assert sim.nodes[1].mac.stat.total_ack == 5
+    assert sorted(sim.nodes[1].received) == sorted(
+            [(0,(i,)) for i in range(5)]*2)
+    assert sorted(sim.nodes[2].received) == [(0,(i,)) for i in range(5)]
+    assert len(sim.nodes[0].mac.tx_queue) == 0
@@ -0,0 +1,115 @@
+import math
+import random
+
+import pytest
+
+from wsnsimpy.wsnsimpy import Node, Simulator
+
+
+class RangedNode(Node):
+    tx_range = 30
+
+
+def brute_force(sim):
+    expected = []
+    for me in sim.nodes:
+        found = sorted((math.dist(me.pos,n.pos),n.id) for n in sim.nodes
+                       if n is not me and math.dist(me.pos,n.pos) <= me.tx_range)
+        expected.append(found)
+    return expected
+
+
+def in_range(node):
+    return [(d,id) for d,id in zip(node.neighbor_dists,node.neighbor_ids)
+            if d <= node.tx_range]
+
+
+def assert_matches(sim):
+    for node,expected in zip(sim.nodes,brute_force(sim)):
+        got = in_range(node)
+        assert [id for _,id in got] == [id for _,id in expected]
+        assert [d for d,_ in got] == pytest.approx([d for d,_ in expected])
+
+
+def random_positions(rnd,n,size=200):
+    return [(rnd.uniform(0,size),rnd.uniform(0,size)) for _ in range(n)]
+
+
+@pytest.mark.parametrize('cell_size',[None,7,100])
+def test_add_node_matches_brute_force(cell_size):
+    rnd = random.Random(1)
+    sim = Simulator(until=1,timescale=0,cell_size=cell_size)
+    for pos in random_positions(rnd,150):
+        sim.add_node(RangedNode,pos)
+    assert_matches(sim)
+
+
+def test_add_nodes_matches_add_node():
+    rnd = random.Random(2)
+    positions = random_positions(rnd,300)
+    one = Simulator(until=1,timescale=0)
+    for pos in positions:
+        one.add_node(RangedNode,pos)
+    bulk = Simulator(until=1,timescale=0)
+    bulk.add_nodes(RangedNode,positions)
+    for a,b in zip(one.nodes,bulk.nodes):
+        assert list(a.neighbor_ids) == list(b.neighbor_ids)
+    assert_matches(bulk)
+
+
+def test_mixed_ranges_and_refresh():
+    rnd = random.Random(3)
+    sim = Simulator(until=1,timescale=0)
+    sim.add_nodes(RangedNode,random_positions(rnd,200))
+    for n in sim.nodes[::3]:
+        n.tx_range = 55
+    sim.refresh_neighbor_lists()
+    assert_matches(sim)
+
+
+@pytest.mark.parametrize('moved',[5,150])
+def test_move_nodes_matches_brute_force(moved):
+    rnd = random.Random(4)
+    sim = Simulator(until=1,timescale=0)
+    sim.add_nodes(RangedNode,random_positions(rnd,200))
+    ids = rnd.sample(range(200),moved)
+    sim.move_nodes(ids,random_positions(rnd,moved))
+    assert_matches(sim)
+
+
+def test_growing_tx_range_extends_lists_when_used():
+    sim = Simulator(until=1,timescale=0)
+    sim.add_nodes(RangedNode,[(0,0),(20,0),(50,0),(90,0)])
+    me = sim.nodes[0]
+    assert [n.id for n in me.neighbors] == [1]
+    me.tx_range = 60
+    assert [n.id for n in me.neighbors] == [1,2]
+    assert_matches(sim)
+    # nodes added later are inserted up to the new range
+    sim.add_node(RangedNode,(55,5))
+    assert [n.id for n in me.neighbors] == [1,2,4]
+
+
+def test_max_range_keeps_farther_nodes():
+    sim = Simulator(until=1,timescale=0,max_range=100)
+    sim.add_nodes(RangedNode,[(0,0),(20,0),(50,0),(90,0),(150,0)])
+    me = sim.nodes[0]
+    assert list(me.neighbor_ids) == [1,2,3]
+    assert [n.id for n in me.neighbors] == [1]
+    assert_matches(sim)
+    me.tx_range = 95
+    assert [n.id for n in me.neighbors] == [1,2,3]
+    assert list(me.neighbor_ids) == [1,2,3]
+
+
+def test_move_after_regrid_detaches_from_old_neighbors():
+    class Short(Node):
+        tx_range = 10
+    sim = Simulator(until=1,timescale=0)
+    sim.add_nodes(Short,[(0,0),(5,0),(1000,0)])
+    sim.nodes[1].tx_range = 50
+    # the grid is rebuilt for the larger range while node 1 moves away
+    sim.nodes[1].move(990,0)
+    assert list(sim.nodes[0].neighbor_ids) == []
+    assert list(sim.nodes[2].neighbor_ids) == [1]
+    assert list(sim.nodes[1].neighbor_ids) == [2]
@@ -0,0 +1,103 @@
+import random
+
+import pytest
+
+from wsnsimpy.parallel import ShardedSimulator
+from wsnsimpy.wsnsimpy import (BROADCAST_ADDR, DefaultMacLayer, LayeredNode,
+                               MacFrame, Node, Simulator)
+
+
+class Flood(Node):
+    tx_range = 100
+
+    def init(self):
+        self.logging = False
+        self.reached = False
+        self.count = 0
+
+    def run(self):
+        if self.id == 0:
+            self.reached = True
+            yield self.timeout(1)
+            self.send(BROADCAST_ADDR)
+
+    def on_receive(self,sender,*args,**kwargs):
+        self.count += 1
+        if self.reached:
+            return
+        self.reached = True
+        yield self.timeout(0.5+(self.id%7)*0.01)
+        self.send(BROADCAST_ADDR)
+
+
+class RawMac(DefaultMacLayer):
+    '''MAC sending right away, so that runs draw no random numbers'''
+    def send_pdu(self,dst,pdu):
+        self.node.phy.send_pdu(MacFrame(self.HEADER_BITS,self.node.id,dst,pdu))
+
+
+class LayeredFlood(Flood,LayeredNode):
+
+    def init(self):
+        Flood.init(self)
+        self.set_layers(mac=RawMac)
+        if self.id == 0:
+            self.set_timer('go',1)
+
+    def run(self):
+        pass
+
+    def on_timer_fired(self,name):
+        self.reached = True
+        self.send(BROADCAST_ADDR)
+
+    def on_receive(self,sender,*args,**kwargs):
+        self.count += 1
+        if self.reached:
+            return
+        self.reached = True
+        self.set_timer('go',0.5+(self.id%7)*0.01)
+
+
+def collect(node):
+    return node.reached,node.count
+
+
+def build(nodeclass,sim):
+    rnd = random.Random(2)
+    for _ in range(200):
+        sim.add_node(nodeclass,(rnd.uniform(0,600),rnd.uniform(0,600)))
+    return sim
+
+
+@pytest.mark.parametrize('nodeclass',[Flood,LayeredFlood])
+def test_sharded_run_matches_serial_run(nodeclass):
+    serial = build(nodeclass,Simulator(until=20,timescale=0,seed=1))
+    serial.run()
+    sharded = build(nodeclass,ShardedSimulator(until=20,shards=3,seed=1,
+                                                collect=collect))
+    sharded.run()
+    assert sharded.results == {n.id:collect(n) for n in serial.nodes}
+    assert sharded.late_deliveries == 0
+    assert sharded.stats.totals() == serial.stats.totals()
+    assert sharded.now == 20
+
+
+def test_relaxed_lookahead_counts_late_deliveries():
+    sharded = build(LayeredFlood,ShardedSimulator(until=20,shards=3,seed=1,
+                                                   lookahead=1e-3))
+    sharded.run()
+    assert sharded.late_deliveries > 0
+
+
+class Broken(Flood):
+    def init(self):
+        super().init()
+        if self.id == 5:
+            raise KeyError('boom')
+
+
+def test_worker_errors_are_reported():
+    sharded = build(Broken,ShardedSimulator(until=5,shards=2))
+    with pytest.raises(RuntimeError,match='boom'):
+        sharded.run()
@@ -0,0 +1,48 @@
+import functools
+
+from wsnsimpy.wsnsimpy import (AppPDU, DefaultPhyLayer, LayeredNode, MacFrame,
+                               NetPDU, Simulator, BROADCAST_ADDR)
+
+
+class Listener(LayeredNode):
+    tx_range = 100
+
+
+def star(phy=None,receivers=20):
+    sim = Simulator(until=1,timescale=0)
+    sim.add_node(Listener,(0,0))
+    for i in range(receivers):
+        sim.add_node(Listener,(3+4*i,0))
+    if phy is not None:
+        for n in sim.nodes:
+            n.set_layers(phy=phy)
+    return sim
+
+
+def transmit(sim):
+    packet = NetPDU(64,0,BROADCAST_ADDR,AppPDU(64,(),{}),0)
+    frame = MacFrame(64,0,BROADCAST_ADDR,packet,0)
+    before = len(sim.env._callbacks)
+    sim.nodes[0].phy.send_pdu(frame)
+    return len(sim.env._callbacks) - before
+
+
+def test_receivers_share_events_by_default():
+    sim = star()
+    # on_tx_end, plus one rx-start and one rx-end for all receivers
+    assert transmit(sim) == 3
+    sim.env.run()
+    assert sum(n.phy.stat.total_rx for n in sim.nodes) == 20
+
+
+def test_exact_delays_without_quantum():
+    sim = star(functools.partial(DefaultPhyLayer,prop_delay_quantum=0))
+    assert transmit(sim) == 1 + 2*20
+    sim.env.run()
+    assert sum(n.phy.stat.total_rx for n in sim.nodes) == 20
+
+
+def test_quantum_rounds_delays_up():
+    sim = star(functools.partial(DefaultPhyLayer,prop_delay_quantum=1e-7))
+    # delays up to 79 m / 3e8 = 0.26 us fall into 3 buckets of 0.1 us
+    assert transmit(sim) == 1 + 2*3
@@ -0,0 +1,64 @@
+import io
+from time import perf_counter
+
+from wsnsimpy.wsnsimpy import BROADCAST_ADDR, LayeredNode, Simulator
+
+BUSY = 0.002
+
+
+class Flood(LayeredNode):
+    tx_range = 100
+
+    def init(self):
+        self.logging = False
+        self.reached = self.id == 0
+
+    def run(self):
+        if self.id == 0:
+            yield self.timeout(1)
+            self.send(BROADCAST_ADDR)
+
+    def on_receive(self,sender,*args,**kwargs):
+        start = perf_counter()
+        while perf_counter()-start < BUSY:
+            pass
+        if self.reached:
+            return
+        self.reached = True
+        yield self.timeout(0.5)
+        self.send(BROADCAST_ADDR)
+
+
+def test_flood_profile(capsys):
+    sim = Simulator(until=10,timescale=0,seed=1,profile=True)
+    for i in range(5):
+        sim.add_node(Flood,(i*60,0))
+    sim.run()
+    assert '=== wsnsimpy profile ===' in capsys.readouterr().out
+    p = sim.profiler
+    totals = sim.stats.totals()
+    tx,rx = totals['phy.total_tx'],totals['phy.total_rx']
+    assert (tx,rx) == (5,8)
+
+    # one broadcast per node, each starting and ending receptions once
+    for name in ('DefaultPhyLayer._start_rx_all','DefaultPhyLayer._end_rx_all',
+                 'DefaultPhyLayer.on_tx_end'):
+        assert p.scheduled[name] == p.executed[name] == tx
+    for name,count in p.executed.items():
+        assert count <= p.scheduled[name]
+    assert p.peak_queue > 0
+
+    assert p.calls['DefaultPhyLayer.send_pdu'] == tx
+    assert p.calls['DefaultPhyLayer.on_rx_end'] == rx
+    assert p.calls['Flood.on_receive'] == rx
+    # generator methods are timed between yields, when run as processes
+    assert p.times['Flood.on_receive'] >= rx*BUSY
+    assert p.times['DefaultPhyLayer.on_rx_end'] < rx*BUSY
+    assert p.wall_time >= p.times['Flood.on_receive']
+
+    out = io.StringIO()
+    p.report(out)
+    lines = out.getvalue().splitlines()
+    assert 'events executed: {}'.format(sum(p.executed.values())) in lines[1]
+    row = next(l for l in lines if l.startswith('Flood.on_receive'))
+    assert row.split()[1] == str(rx)
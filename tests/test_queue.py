@@ -0,0 +1,120 @@
+import functools
+
+import pytest
+
+from wsnsimpy.wsnsimpy import (AppPDU, DefaultMacLayer,
+                               Environment, LayeredNode, MacFrame, NetPDU,
+                               Simulator, TxQueue)
+
+
+def frame(priority=None,net_priority=None):
+    packet = NetPDU(64,0,1,AppPDU(64,(),{},priority),0,net_priority)
+    return MacFrame(64,0,1,packet,0)
+
+
+def test_tail_and_head_policies():
+    env = Environment()
+    frames = [frame() for _ in range(4)]
+    tail = TxQueue(env,3,'tail')
+    head = TxQueue(env,3,'head')
+    for f in frames[:3]:
+        assert tail.append(f) is None
+        assert head.append(f) is None
+    assert tail.append(frames[3]) is frames[3]
+    assert head.append(frames[3]) is frames[1]
+    assert list(head) == [frames[0],frames[2],frames[3]]
+
+
+def test_priority_policy_keeps_control_frames():
+    env = Environment()
+    queue = TxQueue(env,3,'priority')
+    data = [frame() for _ in range(3)]
+    control = frame(net_priority=1)
+    for f in data:
+        queue.append(f)
+    # the newest data frame makes room, the one being sent stays
+    assert queue.append(control) is data[2]
+    assert queue.append(frame()) is not control
+    assert control in list(queue)
+
+
+def test_deque_methods():
+    env = Environment()
+    frames = [frame() for _ in range(4)]
+    queue = TxQueue(env,3)
+    assert queue.extend(frames) == [frames[3]]
+    assert queue.appendleft(frames[3]) is frames[2]
+    assert list(queue) == [frames[3],frames[0],frames[1]]
+    env.run(until=2)
+    queue.clear()
+    assert len(queue) == 0
+    env.run(until=3)
+    assert queue.mean_length() == pytest.approx(2.0)
+
+
+def test_occupancy_is_time_weighted():
+    env = Environment()
+    queue = TxQueue(env)
+    queue.append(frame())
+    env.run(until=1)
+    queue.append(frame())
+    env.run(until=4)
+    queue.popleft()
+    queue.popleft()
+    env.run(until=5)
+    assert queue.mean_length() == pytest.approx((1*1+2*3)/5)
+    assert list(queue.time_at) == [1,1,3]
+
+
+class Burst(LayeredNode):
+    tx_range = 100
+    policy = 'priority'
+
+    def init(self):
+        self.logging = False
+        self.received = []
+        self.set_layers(mac=functools.partial(DefaultMacLayer,queue_capacity=6,
+                                              queue_policy=self.policy))
+
+    def run(self):
+        if self.id != 0:
+            return
+        yield self.timeout(0.1)
+        for i in range(15):
+            if i % 3 == 2:
+                self.send(1,kind='control',priority=1)
+            else:
+                self.send(1,kind='data')
+
+    def on_receive(self,sender,kind,**kwargs):
+        self.received.append(kind)
+
+
+class TailBurst(Burst):
+    policy = 'tail'
+
+
+@pytest.mark.parametrize('nodeclass',[Burst,TailBurst])
+def test_control_frames_survive_a_data_burst(nodeclass):
+    sim = Simulator(until=5,timescale=0)
+    sim.add_node(nodeclass,(0,0))
+    sim.add_node(nodeclass,(30,0))
+    sim.run()
+    received = sim.nodes[1].received
+    drops = sim.nodes[0].mac.stat.total_queue_drop
+    assert drops > 0
+    assert len(received) == 15 - drops
+    if nodeclass is Burst:
+        assert received.count('control') == 5
+    else:
+        assert received.count('control') < 5
+
+
+def test_histogram_covers_all_nodes_and_time():
+    sim = Simulator(until=5,timescale=0)
+    sim.add_node(Burst,(0,0))
+    sim.add_node(Burst,(30,0))
+    sim.run()
+    hist = sim.queue_length_histogram()
+    assert hist.sum() == pytest.approx(2*5)
+    assert len(hist) == 7
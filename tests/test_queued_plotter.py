@@ -0,0 +1,71 @@
+from wsnsimpy.topovis import GenericPlotter, Scene
+from wsnsimpy.topovis.TopoVis import QueuedPlotter
+
+
+class ListPlotter(GenericPlotter):
+    '''Target plotter keeping the batches and times it is given'''
+
+    def __init__(self):
+        GenericPlotter.__init__(self)
+        self.batches = []
+        self.times = []
+
+    def apply(self,commands):
+        self.batches.append(list(commands))
+
+    def setTime(self,time):
+        self.times.append(time)
+
+
+def cmd(name,*args):
+    return (name,args,{})
+
+
+def coalesce(*batch):
+    return QueuedPlotter(ListPlotter()).coalesce(list(batch))
+
+
+def test_last_node_attribute_wins():
+    assert coalesce(cmd('nodecolor',1,1,0,0),
+                    cmd('nodecolor',2,0,1,0),
+                    cmd('nodecolor',1,0,0,1)) == [
+            cmd('nodecolor',2,0,1,0),cmd('nodecolor',1,0,0,1)]
+
+
+def test_different_commands_keep_their_order():
+    batch = [cmd('nodemove',1,5,5),
+             cmd('nodecolor',1,1,0,0),
+             cmd('addlink',1,2,'s'),
+             cmd('nodemove',1,6,6),
+             cmd('nodewidth',1,2),
+             cmd('clearlinks'),
+             cmd('addlink',1,2,'s')]
+    # link commands are never dropped
+    assert coalesce(*batch) == batch[1:]
+
+
+def test_shapes_deleted_later_are_never_drawn():
+    circle = cmd('circle',0,0,5,7,None,None)
+    line = cmd('line',0,0,1,1,8,None)
+    redrawn = cmd('rect',0,0,1,1,7,None,None)
+    assert coalesce(circle,line,cmd('delshape',7)) == [line,cmd('delshape',7)]
+    # a shape drawn again after being deleted stays
+    assert coalesce(circle,cmd('delshape',7),redrawn) == [
+            cmd('delshape',7),redrawn]
+
+
+def test_drain_replays_one_coalesced_batch():
+    target = ListPlotter()
+    queued = QueuedPlotter(target)
+    scene = Scene(realtime=True)
+    scene.addPlotter(queued)
+    scene.init(100,100)
+    scene.node(1,0,0)
+    scene.nodecolor(1,1,0,0)
+    scene.nodecolor(1,0,1,0)
+    assert queued.count == 4
+    assert queued.drain() == 4
+    assert [c[0] for c in target.batches[0]] == ['init','node','nodecolor']
+    assert target.batches[0][-1] == cmd('nodecolor',1,0,1,0)
+    assert queued.drain() == 0
+    assert len(target.batches) == 1
@@ -0,0 +1,75 @@
+import os
+
+from wsnsimpy import wsnsimpy_tk
+from wsnsimpy.topovis import RasterPlotter, Scene
+
+
+class Clock:
+    time = 0.0
+
+    def __call__(self):
+        return self.time
+
+
+class Quiet(wsnsimpy_tk.Node):
+    tx_range = 50
+
+    def init(self):
+        super().init()
+        self.logging = False
+
+    def run(self):
+        # a single scene change early on, then nothing until the end
+        yield self.timeout(0.05)
+        self.scene.nodecolor(self.id,1,0,0)
+
+
+def test_frames_are_written_until_the_end(tmp_path):
+    outdir = tmp_path/'frames'
+    sim = wsnsimpy_tk.Simulator(until=1,timescale=0,visual=False,
+                                terrain_size=(100,100),frames=str(outdir),
+                                frame_interval=0.1)
+    sim.add_node(Quiet,(50,50))
+    sim.run()
+    frames = sorted(os.listdir(outdir))
+    # one frame per interval from 0 to until, plus the final frame
+    assert frames == ['frame%06d.png' % i for i in range(12)]
+
+
+class FramePlotter(RasterPlotter.Plotter):
+    '''Raster plotter keeping frames in memory'''
+
+    def __init__(self,clock):
+        super().__init__('unused',0.1,clock)
+        self.frames = []
+
+    def writeFrame(self):
+        self.frames.append(self.pixels.copy())
+        self.frame += 1
+
+
+def has_color(pixels,color):
+    return bool((pixels == color).all(axis=2).any())
+
+
+def test_catch_up_frames_show_the_state_at_their_time(tmp_path,monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    clock = Clock()
+    plotter = FramePlotter(clock)
+    scene = Scene(realtime=True)
+    scene.addPlotter(plotter)
+    scene.init(100,100)
+    scene.node(0,50,50)
+    clock.time = 0.05
+    scene.nodecolor(0,1,0,0)
+    # frames at 0.1, 0.2 and 0.3 are written when the node turns blue
+    clock.time = 0.35
+    scene.nodecolor(0,0,0,1)
+    assert len(plotter.frames) == 4
+    for pixels in plotter.frames[1:]:
+        assert has_color(pixels,(255,0,0))
+        assert not has_color(pixels,(0,0,255))
+    # batches also write frames due before changing the scene
+    clock.time = 0.45
+    scene.apply([('nodecolor',(0,0,1,0)),('nodemove',(0,20,20))])
+    assert has_color(plotter.frames[4],(0,0,255))
@@ -0,0 +1,101 @@
+from time import monotonic, perf_counter
+
+import pytest
+
+from wsnsimpy import wsnsimpy
+from wsnsimpy.wsnsimpy import Environment, HybridEnvironment, Node, Simulator
+
+
+class Changes:
+    '''Probe counting visible changes, made at the given simulation times'''
+
+    def __init__(self,env,times):
+        self.count = 0
+        for t in times:
+            env.schedule_call(t,self.change)
+
+    def change(self):
+        self.count += 1
+
+    def __call__(self):
+        return self.count
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    '''Record (simulation time of the next event,seconds) of each sleep'''
+    calls = []
+    def sleep(seconds):
+        calls.append((env_of[0].peek(),seconds))
+    env_of = []
+    monkeypatch.setattr(wsnsimpy,'sleep',sleep)
+    return calls,env_of
+
+
+def test_quiet_stretches_are_skipped_without_sleeping(sleeps):
+    calls,env_of = sleeps
+    env = HybridEnvironment(factor=1.0,hold=0.5)
+    env_of.append(env)
+    env.probe = Changes(env,[1.0,50.0])
+    for t in range(100):
+        env.schedule_call(t+0.25,lambda: None)
+    env.run(until=100)
+    # events within hold seconds after each change, including the first
+    # probe at time 0, are paced, none other
+    paced = sorted(t for t,_ in calls)
+    assert paced == [0.25,1.25,50.25]
+    assert all(seconds > 0 for _,seconds in calls)
+
+
+def test_without_probe_nothing_sleeps(sleeps):
+    calls,env_of = sleeps
+    env = HybridEnvironment(factor=1.0)
+    env_of.append(env)
+    for t in range(100):
+        env.schedule_call(t,lambda: None)
+    env.run(until=100)
+    assert calls == []
+
+
+def test_pacing_follows_the_factor():
+    env = HybridEnvironment(factor=0.5,hold=10)
+    env.probe = Changes(env,[0])
+    for t in range(1,5):
+        env.schedule_call(t*0.05,lambda: None)
+    start = monotonic()
+    env.run(until=0.25)
+    assert 0.1 <= monotonic()-start < 0.5
+    assert env.max_lag < 0.05
+
+
+class Busy(Node):
+    def run(self):
+        yield self.timeout(0.01)
+        start = perf_counter()
+        while perf_counter()-start < 0.05:
+            pass
+        yield self.timeout(0.001)
+
+
+class HybridSimulator(Simulator):
+    def create_env(self):
+        return HybridEnvironment(factor=self.timescale,hold=10)
+
+
+def test_realtime_lag_tells_how_far_behind():
+    sim = HybridSimulator(until=0.02,timescale=0.1)
+    sim.env.probe = Changes(sim.env,[0])
+    sim.add_node(Busy,(0,0))
+    sim.run()
+    assert sim.realtime_lag > 0.03
+    assert sim.env.max_lag >= sim.realtime_lag
+    assert Simulator(until=1,timescale=0).realtime_lag == 0.0
+
+
+def test_headless_tk_simulator_never_sleeps():
+    pytest.importorskip('tkinter')
+    from wsnsimpy import wsnsimpy_tk
+    sim = wsnsimpy_tk.Simulator(until=1,timescale=1,visual=False)
+    assert type(sim.env) is Environment
+    assert isinstance(Simulator(until=1,timescale=1).env,
+                      wsnsimpy.RealtimeEnvironment)
@@ -0,0 +1,107 @@
+import pytest
+
+from wsnsimpy.topovis import GenericPlotter, Scene
+from wsnsimpy.topovis.common import DEFAULT
+from wsnsimpy.topovis.Recorder import RecordingPlotter, readRecording
+from wsnsimpy.topovis.Replay import Player
+
+
+class Clock:
+    time = 0.0
+
+    def __call__(self):
+        return self.time
+
+
+class NodePlotter(GenericPlotter):
+    '''Plotter keeping the latest position and color drawn for each node'''
+
+    def __init__(self):
+        GenericPlotter.__init__(self)
+        self.pos = {}
+        self.colors = {}
+
+    def node(self,id,x,y):
+        self.pos[id] = (x,y)
+
+    nodemove = node
+
+    def nodecolor(self,id,r,g,b):
+        self.colors[id] = (r,g,b)
+
+
+@pytest.fixture
+def recording(tmp_path):
+    path = str(tmp_path/'scene.rec')
+    clock = Clock()
+    scene = Scene(realtime=True)
+    plotter = RecordingPlotter(path,clock,keyframeInterval=10)
+    scene.addPlotter(plotter)
+    scene.init(100,100)
+    for id in range(3):
+        scene.node(id,10*id,0)
+    scene.linestyle('route',color=(0,1,0))
+    clock.time = 5
+    scene.nodecolor(0,1,0,0)
+    scene.addlink(0,1,'route')
+    clock.time = 12
+    scene.nodemove(1,50,50)
+    scene.circle(5,5,3,id='range')
+    clock.time = 25
+    scene.nodecolor(0,0,0,1)
+    scene.delshape('range')
+    scene.clearlinks()
+    scene.nodemove(2,70,70)
+    plotter.close()
+    return path
+
+
+def state(player):
+    # restoring a keyframe sets default widths and colors explicitly
+    nodes = {}
+    for id,node in player.scene.nodes.items():
+        attrs = node.attributes()
+        if attrs['width'] == DEFAULT:
+            attrs['width'] = 1
+        if attrs['color'] == DEFAULT:
+            attrs['color'] = (0,0,0)
+        nodes[id] = attrs
+    return nodes,set(player.scene.links),repr(player.shapes)
+
+
+def test_keyframes_follow_the_first_command_of_each_interval(recording):
+    commands,keyframes = readRecording(recording)
+    # a snapshot holds the state right after the first command at or past
+    # each keyframe interval
+    assert [(k[0],k[2]) for k in keyframes] == [(0,1),(12,8),(25,10)]
+    assert [c[1] for c in commands[7:10]] == ['nodemove','circle','nodecolor']
+    snapshot = keyframes[2][1]
+    nodes = {n['id']:n for n in snapshot['nodes']}
+    assert nodes[1]['pos'] == (50,50)
+    assert nodes[0]['color'] == (0,0,1)
+    assert snapshot['links'] == [(0,1,'route')]
+    assert [s[0] for s in snapshot['shapes']] == ['circle']
+
+
+@pytest.mark.parametrize('time',[3,7,13,20])
+def test_seeking_back_matches_playing_forward(recording,time):
+    player = Player(recording)
+    player.seek(30)
+    player.seek(time)
+    reference = Player(recording)
+    reference.advance(time)
+    assert state(player) == state(reference)
+
+
+def test_seek_restores_plotter_colors_and_positions(recording):
+    plotter = NodePlotter()
+    player = Player(recording,plotter)
+    player.seek(30)
+    assert plotter.colors[0] == (0,0,1)
+    assert plotter.pos[2] == (70,70)
+    player.seek(13)
+    assert plotter.colors[0] == (1,0,0)
+    assert plotter.pos == {0:(0,0),1:(50,50),2:(20,0)}
+    player.seek(2)
+    assert plotter.colors[0] == (0,0,0)
+    assert plotter.pos[1] == (10,0)
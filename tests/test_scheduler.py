@@ -0,0 +1,57 @@
+from wsnsimpy.wsnsimpy import Environment, Node, Simulator
+
+
+def test_callbacks_run_in_time_order_and_can_be_cancelled():
+    env = Environment()
+    calls = []
+    env.schedule_call(2,calls.append,('b',))
+    first = env.schedule_call(1,calls.append,('a',))
+    cancelled = env.schedule_call(1.5,calls.append,('x',))
+    env.schedule_call(1,calls.append,('a2',))
+    env.cancel_call(cancelled)
+    assert env.peek() == 1
+    env.run()
+    assert calls == ['a','a2','b']
+    assert env.now == 2
+    assert first[2] is not None
+
+
+def test_simpy_events_go_first_at_equal_times():
+    env = Environment()
+    order = []
+    env.schedule_call(1,order.append,('callback',))
+    env.timeout(1).callbacks.append(lambda event: order.append('event'))
+    env.run()
+    assert order == ['event','callback']
+
+
+class Receiver(Node):
+    tx_range = 50
+
+    def init(self):
+        self.logging = False
+        self.plain = []
+        self.generated = []
+
+    def run(self):
+        if self.id == 0:
+            yield self.timeout(1)
+            self.send(1,'plain')
+            self.send(1,'generator')
+
+    def on_receive(self,sender,kind):
+        if kind == 'plain':
+            self.plain.append(self.now)
+            return
+        yield self.timeout(0.5)
+        self.generated.append(self.now)
+
+
+def test_plain_and_generator_callbacks():
+    sim = Simulator(until=5,timescale=0)
+    sim.add_node(Receiver,(0,0))
+    sim.add_node(Receiver,(10,0))
+    sim.run()
+    node = sim.nodes[1]
+    assert node.plain == [1+10/1e6]
+    assert node.generated == [1.5+10/1e6]
@@ -0,0 +1,72 @@
+import pickle
+
+import numpy as np
+import pytest
+
+from wsnsimpy.wsnsimpy import StatRegistry
+
+
+def view(index=0,**counters):
+    stats = StatRegistry()
+    return stats,stats.view('app',index,**counters)
+
+
+def test_bools_and_numpy_numbers_become_columns():
+    stats,stat = view(1)
+    stat.flag = True
+    stat.count = np.int64(3)
+    stat.energy = np.float64(0.5)
+    stat.done = np.bool_(True)
+    assert stats.columns['app.flag'].typecode == 'q'
+    assert stats.columns['app.count'].typecode == 'q'
+    assert stats.columns['app.energy'].typecode == 'd'
+    assert (stat.flag,stat.count,stat.energy,stat.done) == (1,3,0.5,1)
+    assert stats.totals() == {'app.flag':1,'app.count':3,'app.energy':0.5,
+                              'app.done':1}
+
+
+def test_int_column_is_widened_by_a_float():
+    stats,stat = view(1,total=int)
+    other = stats.view('app',0)
+    other.total = 2
+    stat.total += 0.25
+    assert stats.columns['app.total'].typecode == 'd'
+    assert stats.counters('app')['total'] is stats.columns['app.total']
+    assert (other.total,stat.total) == (2.0,0.25)
+    stats.resize(3)
+    assert list(stats.columns['app.total']) == [2.0,0.25,0.0]
+
+
+@pytest.mark.parametrize('value',[None,[1,2],'sink',(3,4)])
+def test_other_values_are_kept_in_the_view(value):
+    stats,stat = view(total=int)
+    stat.extra = value
+    assert stat.extra == value
+    assert list(stats.columns) == ['app.total']
+    with pytest.raises(AttributeError):
+        stat.missing
+
+
+def test_other_values_shadow_and_release_counters():
+    stats,stat = view(total=int)
+    stat.total = 4
+    stat.total = None
+    assert stat.total is None
+    stat.total = 5
+    assert stat.total == 5
+    assert stats.totals() == {'app.total':5}
+
+
+def test_other_values_survive_pickling():
+    stats,stat = view(total=int)
+    stat.route = [3,1]
+    stats2,stat2 = pickle.loads(pickle.dumps((stats,stat)))
+    assert stat2.route == [3,1]
+    stat2.total += 1
+    assert stats2.totals() == {'app.total':1}
+
+
+def test_declaring_a_non_numeric_counter_fails():
+    stats = StatRegistry()
+    with pytest.raises(TypeError):
+        stats.declare('app.name',str)
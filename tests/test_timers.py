@@ -0,0 +1,64 @@
+from wsnsimpy.wsnsimpy import Node, Simulator
+
+
+class Watchdog(Node):
+
+    def init(self):
+        self.logging = False
+        self.fired = []
+
+    def on_timer_fired(self,name,*args,**kwargs):
+        self.fired.append((self.now,name,args,kwargs))
+
+
+def single(until=10):
+    sim = Simulator(until=until,timescale=0)
+    node = sim.add_node(Watchdog,(0,0))
+    node.init()
+    return sim,node
+
+
+def test_set_and_fire():
+    sim,node = single()
+    node.set_timer('a',2,1,x=2)
+    assert node.timer_pending('a')
+    sim.env.run(until=10)
+    assert node.fired == [(2,'a',(1,),{'x':2})]
+    assert not node.timer_pending('a')
+
+
+def test_set_replaces_and_cancel():
+    sim,node = single()
+    node.set_timer('a',2)
+    node.set_timer('a',3)
+    node.set_timer('b',1)
+    assert node.cancel_timer('b')
+    assert not node.cancel_timer('b')
+    sim.env.run(until=10)
+    assert node.fired == [(3,'a',(),{})]
+
+
+def test_reset_keeps_arguments():
+    sim,node = single()
+    node.set_timer('route',2,'dest')
+    sim.env.run(until=1)
+    node.reset_timer('route',5)
+    node.reset_timer('other',1)
+    sim.env.run(until=10)
+    assert node.fired == [(2,'other',(),{}),(6,'route',('dest',),{})]
+
+
+class Blinker(Watchdog):
+
+    def on_timer_fired(self,name):
+        yield self.timeout(1)
+        self.fired.append((self.now,name))
+
+
+def test_generator_handler():
+    sim = Simulator(until=10,timescale=0)
+    node = sim.add_node(Blinker,(0,0))
+    node.init()
+    node.set_timer('blink',2)
+    sim.env.run(until=10)
+    assert node.fired == [(3,'blink')]
@@ -0,0 +1,136 @@
+import pytest
+
+pytest.importorskip('tkinter')
+
+from wsnsimpy.topovis import Scene
+from wsnsimpy.topovis.TkPlotter import Plotter
+
+
+class FakeCanvas:
+    '''
+    Minimal canvas keeping item tags and options, counting tag lookups and
+    calls that change items
+    '''
+
+    def __init__(self):
+        self.items = {}
+        self.searches = 0
+        self.calls = 0
+
+    def _create(self,tags=()):
+        item = len(self.items)+1
+        tags = (tags,) if isinstance(tags,str) else tags
+        self.items[item] = {'tags':set(tags),'options':{}}
+        return item
+
+    def create_oval(self,*coords,tags=(),**options):
+        return self._create(tags)
+
+    create_text = create_line = create_rectangle = create_oval
+
+    def _find(self,tagOrId):
+        if isinstance(tagOrId,int):
+            return [tagOrId]
+        assert '||' not in tagOrId and '&&' not in tagOrId
+        self.searches += 1
+        return [i for i,item in self.items.items() if tagOrId in item['tags']]
+
+    def itemconfigure(self,tagOrId,text=None,**options):
+        self.calls += 1
+        for i in self._find(tagOrId):
+            self.items[i]['options'].update(options)
+
+    itemconfig = itemconfigure
+
+    def coords(self,*args):
+        pass
+
+    def addtag_withtag(self,tag,tagOrId):
+        self.calls += 1
+        for i in self._find(tagOrId):
+            self.items[i]['tags'].add(tag)
+
+    def dtag(self,tagOrId,tag):
+        self.calls += 1
+        for i in self._find(tagOrId):
+            self.items[i]['tags'].discard(tag)
+
+    def delete(self,tagOrId):
+        for i in self._find(tagOrId):
+            del self.items[i]
+
+
+class FakeTk:
+    def update(self):
+        pass
+
+
+class CanvasPlotter(Plotter):
+    def prepareCanvas(self,terrain_size=None):
+        self.tk = FakeTk()
+        self.canvas = FakeCanvas()
+        self.timeText = self.canvas.create_text(0,0)
+
+
+def scene_with(n):
+    plotter = CanvasPlotter()
+    scene = Scene(realtime=True)
+    scene.addPlotter(plotter)
+    scene.init(100,100)
+    for id in range(n):
+        scene.node(id,id,id)
+    return scene,plotter
+
+
+def options(plotter,id):
+    node,label = plotter.nodes[id]
+    items = plotter.canvas.items
+    return items[node]['options'],items[label]['options']
+
+
+def test_bulk_colors_configure_each_style_once():
+    scene,plotter = scene_with(200)
+    canvas = plotter.canvas
+    canvas.searches = 0
+    scene.nodecolors(list(range(200)),[(1,0,0) if i%2 else (0,0,1)
+                                       for i in range(200)])
+    # two colors, each configured on ovals and labels
+    assert canvas.searches == 4
+    assert options(plotter,1) == ({'outline':'#ff0000'},{'fill':'#ff0000'})
+    assert options(plotter,2) == ({'outline':'#0000ff'},{'fill':'#0000ff'})
+
+
+def test_nodes_move_between_style_tags():
+    scene,plotter = scene_with(10)
+    scene.nodecolors(list(range(10)),(1,0,0))
+    scene.nodecolor(3,0,1,0)
+    scene.nodewidths(list(range(10)),2)
+    scene.nodewidth(4,5)
+    # configuring the red tag again must not recolor node 3
+    scene.nodecolors([0],(1,0,0))
+    plotter.canvas.itemconfigure('outline:#ff0000',outline='#ff0000')
+    assert options(plotter,3)[0] == {'outline':'#00ff00','width':2}
+    assert options(plotter,4)[0] == {'outline':'#ff0000','width':5}
+    node,_ = plotter.nodes[3]
+    assert 'outline:#ff0000' not in plotter.canvas.items[node]['tags']
+
+
+def test_single_node_calls_configure_items_directly():
+    scene,plotter = scene_with(10)
+    canvas = plotter.canvas
+    canvas.calls = canvas.searches = 0
+    scene.nodecolor(1,1,0,0)
+    scene.nodewidth(1,3)
+    assert canvas.calls == 3
+    assert canvas.searches == 0
+    # a node taken into style tags by a bulk call leaves them once
+    scene.nodecolors(list(range(10)),(0,0,1))
+    canvas.calls = 0
+    scene.nodecolor(1,0,1,0)
+    assert canvas.calls == 4
+    canvas.calls = 0
+    scene.nodecolor(1,1,0,0)
+    assert canvas.calls == 2
+    canvas.itemconfigure('outline:#0000ff',outline='#0000ff')
+    assert options(plotter,1) == ({'outline':'#ff0000','width':3},
+                                  {'fill':'#ff0000'})
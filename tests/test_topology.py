@@ -0,0 +1,86 @@
+import random
+from collections import deque
+
+import numpy as np
+
+from wsnsimpy.topology import Topology
+from wsnsimpy.wsnsimpy import Node, Simulator
+
+
+class Sensor(Node):
+    tx_range = 22
+
+
+def network(seed=2,n=300,size=400):
+    rnd = random.Random(seed)
+    sim = Simulator(until=1,timescale=0)
+    sim.add_nodes(Sensor,[(rnd.uniform(0,size),rnd.uniform(0,size))
+                          for _ in range(n)])
+    for node in sim.nodes[::7]:
+        node.tx_range = 30
+    sim.refresh_neighbor_lists()
+    return sim,rnd
+
+
+def bfs(sim,source,reverse=False):
+    links = [[n.id for n in node.neighbors] for node in sim.nodes]
+    if reverse:
+        rev = [[] for _ in links]
+        for i,ids in enumerate(links):
+            for j in ids:
+                rev[j].append(i)
+        links = rev
+    dist = [-1]*len(links)
+    dist[source] = 0
+    queue = deque([source])
+    while queue:
+        i = queue.popleft()
+        for j in links[i]:
+            if dist[j] < 0:
+                dist[j] = dist[i]+1
+                queue.append(j)
+    return dist
+
+
+def test_incremental_refresh_matches_full_rebuild():
+    sim,rnd = network()
+    topo = sim.topology
+    for step in range(10):
+        ids = rnd.sample(range(len(sim.nodes)),3 if step%3 else 100)
+        sim.move_nodes(ids,[(rnd.uniform(0,400),rnd.uniform(0,400)) for _ in ids])
+        full = Topology(sim)
+        for a,b in zip(topo.csr(),full.csr()):
+            assert np.array_equal(a,b)
+    sim.add_node(Sensor,(10,10))
+    assert np.array_equal(topo.csr()[1],Topology(sim).csr()[1])
+
+
+def test_degrees_and_hops_match_brute_force():
+    sim,_ = network()
+    topo = sim.topology
+    assert topo.degree().tolist() == [len(n.neighbors) for n in sim.nodes]
+    assert topo.degree_histogram().sum() == len(sim.nodes)
+    assert topo.hops(0).tolist() == bfs(sim,0)
+    assert topo.hops(0,reverse=True).tolist() == bfs(sim,0,reverse=True)
+    within = [i for i,d in enumerate(bfs(sim,5)) if 0 < d <= 2]
+    assert topo.k_hop(5,2).tolist() == within
+
+
+def test_components_without_scipy(monkeypatch):
+    sim,_ = network()
+    topo = sim.topology
+    count,labels = topo.connected_components()
+    import builtins
+    real_import = builtins.__import__
+
+    def no_scipy(name,*args,**kwargs):
+        if name.startswith('scipy'):
+            raise ImportError(name)
+        return real_import(name,*args,**kwargs)
+
+    monkeypatch.setattr(builtins,'__import__',no_scipy)
+    count2,labels2 = topo.connected_components()
+    assert count == count2
+    # same partition, whatever the label numbering
+    pairs = set(zip(labels.tolist(),labels2.tolist()))
+    assert len(pairs) == count
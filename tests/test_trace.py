@@ -0,0 +1,76 @@
+from wsnsimpy.trace import Tracer, format_trace, load_trace
+from wsnsimpy.wsnsimpy import Node, Simulator
+
+
+def expected(time,node,msg):
+    return f"Node {'#'+str(node):4}[{time:10.5f}] {msg}"
+
+
+def log_some(tracer,n):
+    lines = []
+    for i in range(n):
+        args = (i,i/4,'node{}'.format(i%3))
+        tracer.record(float(i),i%5,'step {} at {} by {}',args)
+        lines.append(expected(float(i),i%5,'step {} at {} by {}'.format(*args)))
+    return lines
+
+
+def test_ring_keeps_the_latest_records_in_order():
+    tracer = Tracer(capacity=8)
+    lines = log_some(tracer,20)
+    assert tracer.count == 20
+    trace = tracer.columns()
+    assert trace['time'].tolist() == [float(i) for i in range(12,20)]
+    assert list(format_trace(trace)) == lines[12:]
+
+
+def test_ring_drops_strings_no_longer_referenced():
+    tracer = Tracer(capacity=4)
+    for i in range(1000):
+        tracer.record(float(i),0,'unique {}',('s{}'.format(i),))
+    # the format string plus one string per buffered record
+    assert len(tracer.strings) <= 1+4
+    assert len([s for s in tracer.strings if s is not None]) == 5
+    assert list(format_trace(tracer.columns())) == [
+            expected(float(i),0,'unique s{}'.format(i)) for i in range(996,1000)]
+
+
+def test_file_round_trip(tmp_path):
+    path = str(tmp_path/'run.trace')
+    tracer = Tracer(path,capacity=7)
+    lines = log_some(tracer,30)
+    tracer.close()
+    trace = load_trace(path)
+    assert len(trace['time']) == 30
+    assert trace['intmask'][0] == 1 and trace['strmask'][0] == 4
+    assert list(format_trace(trace)) == lines
+
+
+def test_too_many_args_are_formatted_right_away():
+    tracer = Tracer(capacity=4,max_args=2)
+    tracer.record(1.0,3,'{} {} {}',(1,2.5,'x'))
+    tracer.record(2.0,3,'done')
+    trace = tracer.columns()
+    assert trace['nargs'].tolist() == [1,0]
+    assert list(format_trace(trace)) == [expected(1.0,3,'1 2.5 x'),
+                                         expected(2.0,3,'done')]
+
+
+class Chatty(Node):
+    def run(self):
+        for i in range(3):
+            yield self.timeout(1)
+            self.log('tick {} of {}',i,self.id)
+
+
+def test_node_logs_go_to_the_tracer(tmp_path,capsys):
+    path = str(tmp_path/'sim.trace')
+    sim = Simulator(until=10,timescale=0)
+    sim.tracer = Tracer(path)
+    for i in range(2):
+        sim.add_node(Chatty,(i,0))
+    sim.run()
+    assert capsys.readouterr().out == ''
+    lines = list(format_trace(load_trace(path)))
+    assert lines == [expected(float(t),id,'tick {} of {}'.format(t-1,id))
+                     for t in (1,2,3) for id in (0,1)]
@@ -0,0 +1,105 @@
+'''
+Run independent replications of a simulation scenario in parallel
+'''
+import itertools
+import json
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from .wsnsimpy import StatView
+
+LAYERS = ('phy','mac','net')
+
+###########################################################
+def param_grid(params):
+    '''
+    Expand a dict mapping parameter names to lists of values into a list of
+    dicts, one for every combination of values
+    '''
+    if not params:
+        return [{}]
+    names = sorted(params)
+    return [dict(zip(names,values))
+            for values in itertools.product(*(params[n] for n in names))]
+
+###########################################################
+def collect_stats(sim):
+    '''
+    Sum every counter of sim.stats over all nodes, together with the
+    attributes of Stat objects that custom layers keep outside of the
+    registry, and return them as a dict keyed by "<layer>.<counter>"
+    '''
+    totals = sim.stats.totals()
+    for node in sim.nodes:
+        for layer in LAYERS:
+            stat = getattr(getattr(node,layer,None),'stat',None)
+            if stat is None or isinstance(stat,StatView):
+                continue
+            for name,value in vars(stat).items():
+                key = layer + '.' + name
+                totals[key] = totals.get(key,0) + value
+    return totals
+
+###########################################################
+def _replication_key(params,seed):
+    return json.dumps([params,seed],sort_keys=True)
+
+###########################################################
+def _run_replication(factory,params,seed):
+    # scenarios often draw positions and delays from the random module
+    # directly, so seed it as well for reproducible replications
+    random.seed(seed)
+    sim = factory(seed=seed,timescale=0,**params)
+    if sim.timescale != 0:
+        raise ValueError('scenario factory must pass timescale on to Simulator')
+    sim.run()
+    row = dict(params)
+    row['seed'] = seed
+    row.update(collect_stats(sim))
+    return row
+
+###########################################################
+def run_batch(factory,params=None,seeds=range(10),workers=None,resume=None):
+    '''
+    Call factory(seed=seed,timescale=0,**p) and run the returned Simulator
+    for every combination p of the parameter grid params and every seed,
+    spreading replications over a pool of worker processes.  Return a list
+    of rows, one per replication in grid order, holding the parameters, the
+    seed and every statistics counter summed over all nodes.
+
+    factory must be a module-level callable so that it can be sent to
+    worker processes.  When resume names a file, every finished row is
+    appended to it as a JSON line right away, and replications already
+    recorded there are not run again.
+    '''
+    jobs = [(p,seed) for p in param_grid(params) for seed in seeds]
+
+    done = {}
+    if resume is not None and os.path.exists(resume):
+        with open(resume) as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                done[entry['key']] = entry['row']
+
+    pending = [(p,seed) for (p,seed) in jobs
+               if _replication_key(p,seed) not in done]
+    if pending:
+        out = open(resume,'a') if resume is not None else None
+        try:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                futures = {pool.submit(_run_replication,factory,p,seed):(p,seed)
+                           for (p,seed) in pending}
+                for future in as_completed(futures):
+                    key = _replication_key(*futures[future])
+                    done[key] = future.result()
+                    if out is not None:
+                        out.write(json.dumps({'key':key,'row':done[key]})+'\n')
+                        out.flush()
+        finally:
+            if out is not None:
+                out.close()
+
+    return [done[_replication_key(p,seed)] for (p,seed) in jobs]
@@ -0,0 +1,302 @@
+'''
+Channel models with path loss, shadowing and SINR-based reception
+'''
+import math
+from bisect import bisect_right
+from itertools import count
+
+import numpy as np
+
+from .wsnsimpy import DefaultPhyLayer
+
+###########################################################
+def dbm_to_mw(dbm):
+    return 10**(dbm/10)
+
+###########################################################
+def mw_to_dbm(mw):
+    return 10*math.log10(mw) if mw > 0 else -math.inf
+
+###########################################################
+def _uniform(keys,seed):
+    '''
+    Map integer keys to floats uniformly distributed in (0,1) using the
+    splitmix64 finalizer, so that values do not depend on drawing order
+    '''
+    with np.errstate(over='ignore'):
+        x = keys.astype(np.uint64) + np.uint64(seed)*np.uint64(0x9E3779B97F4A7C15)
+        x = (x ^ (x >> np.uint64(30)))*np.uint64(0xBF58476D1CE4E5B9)
+        x = (x ^ (x >> np.uint64(27)))*np.uint64(0x94D049BB133111EB)
+        x = x ^ (x >> np.uint64(31))
+    return ((x >> np.uint64(11)).astype(float)+0.5)/float(1 << 53)
+
+###########################################################
+class ChannelModel:
+    '''
+    Base class of channel models shared by all nodes of a simulator.
+
+    Path gains are only kept for pairs of nodes found in each other's
+    neighbor lists, i.e., within the transmitter's tx_range, or the
+    simulator's max_range when larger, which acts as the interference
+    range.  They are stored as a sparse matrix in CSR form
+    (indptr, indices, gains), built in one vectorized pass and rebuilt only
+    after the neighbor graph changes.
+
+    The model also keeps per-receiver arrays of the total power received
+    from ongoing transmissions, and of the signal power and worst SINR of
+    the frame each receiver is locked onto.  Starting or ending a
+    transmission updates these arrays for all of its receivers at once.
+    Noise floor, sensitivity and SINR threshold are shared by all
+    receivers.  Subclasses provide path_loss_db().
+    '''
+    def __init__(self,sim,noise_dbm=-100.0,sensitivity_dbm=-95.0,
+                 sinr_threshold_db=4.0,cca_threshold_dbm=-85.0):
+        self.sim = sim
+        self.noise = dbm_to_mw(noise_dbm)
+        self.sensitivity = dbm_to_mw(sensitivity_dbm)
+        self.sinr_threshold = 10**(sinr_threshold_db/10)
+        self.cca_threshold = dbm_to_mw(cca_threshold_dbm)
+        self._version = None
+        self._serial = count()
+        self.indptr = np.zeros(1,dtype=np.int64)
+        self.indices = np.zeros(0,dtype=np.int64)
+        self.gains = np.zeros(0)
+        self.total = np.zeros(0)      # total received power (mW)
+        self.signal = np.zeros(0)     # power of the locked frame (mW)
+        self.min_sinr = np.zeros(0)   # worst SINR seen by the locked frame
+        self.lock = np.zeros(0,dtype=np.int64)  # serial of the locked frame
+
+    ############################
+    def path_loss_db(self,dist):
+        '''
+        Return path losses in dB for a NumPy array of distances.  To be
+        overridden.
+        '''
+        raise NotImplementedError
+
+    ############################
+    def shadowing_db(self,src,dst):
+        '''
+        Return extra losses in dB for links given as NumPy arrays of source
+        and destination IDs.  No shadowing by default.
+        '''
+        return 0.0
+
+    ############################
+    def link_gains(self,id):
+        '''
+        Return the IDs of nodes reached by transmissions of node id and the
+        linear path gains towards them, as NumPy arrays
+        '''
+        if self._version != self.sim.topology_version:
+            self.rebuild()
+        lo,hi = self.indptr[id],self.indptr[id+1]
+        return self.indices[lo:hi],self.gains[lo:hi]
+
+    ############################
+    def rebuild(self):
+        '''
+        Recompute the sparse gain matrix from the current neighbor lists
+        '''
+        nodes = self.sim.nodes
+        counts = [bisect_right(node.neighbor_dists,self.sim.neighbor_range(node))
+                  for node in nodes]
+        src = np.repeat(np.arange(len(nodes)),counts)
+        dst = np.concatenate([np.zeros(0,dtype=np.intc)]+
+                [np.frombuffer(node.neighbor_ids,dtype=np.intc)[:k]
+                 for node,k in zip(nodes,counts)]).astype(np.int64)
+        dist = np.concatenate([np.zeros(0)]+
+                [np.frombuffer(node.neighbor_dists)[:k]
+                 for node,k in zip(nodes,counts)])
+        loss = self.path_loss_db(dist)
+        loss = loss + self.shadowing_db(src,dst)
+        self.indptr = np.zeros(len(nodes)+1,dtype=np.int64)
+        np.cumsum(np.bincount(src,minlength=len(nodes)),out=self.indptr[1:])
+        self.indices = dst
+        self.gains = 10**(-loss/10)
+        self._resize(len(nodes))
+        self._version = self.sim.topology_version
+
+    ############################
+    def _resize(self,size):
+        grow = size - len(self.total)
+        if grow <= 0:
+            return
+        self.total = np.concatenate([self.total,np.zeros(grow)])
+        self.signal = np.concatenate([self.signal,np.zeros(grow)])
+        self.min_sinr = np.concatenate([self.min_sinr,np.zeros(grow)])
+        self.lock = np.concatenate([self.lock,np.full(grow,-1,dtype=np.int64)])
+
+    ############################
+    def begin(self,ids,power):
+        '''
+        Add a transmission received at nodes ids with the given powers (mW).
+        Receivers already locked onto a frame get their SINR updated, and
+        idle receivers lock onto the new frame if it is strong enough.
+        Return the serial number of the transmission and a boolean array
+        telling which receivers locked onto it.
+        '''
+        serial = next(self._serial)
+        total,signal = self.total,self.signal
+        total[ids] += power
+
+        busy = signal[ids] > 0
+        b = ids[busy]
+        if len(b):
+            s = signal[b]
+            self.min_sinr[b] = np.minimum(self.min_sinr[b],
+                                          s/(self.noise+total[b]-s))
+
+        sinr = power/(self.noise+total[ids]-power)
+        locked = ~busy & (power >= self.sensitivity) & (sinr >= self.sinr_threshold)
+        l = ids[locked]
+        signal[l] = power[locked]
+        self.min_sinr[l] = sinr[locked]
+        self.lock[l] = serial
+        return serial,locked
+
+    ############################
+    def end(self,ids,power,serial):
+        '''
+        Remove a transmission started by begin().  Return the IDs of nodes
+        that were locked onto it and a boolean array telling whose SINR
+        stayed above the threshold during the whole frame.
+        '''
+        self.total[ids] = np.maximum(self.total[ids]-power,0.0)
+        r = ids[self.lock[ids] == serial]
+        ok = self.min_sinr[r] >= self.sinr_threshold
+        self.signal[r] = 0.0
+        self.lock[r] = -1
+        return r,ok
+
+    ############################
+    def power_at(self,id):
+        '''Return the total power (mW) currently received by node id'''
+        return self.total[id] if id < len(self.total) else 0.0
+
+###########################################################
+class LogDistanceChannel(ChannelModel):
+    '''
+    Log-distance path loss with optional log-normal shadowing.  Path loss
+    is ref_loss_db at ref_dist and grows by 10*exponent dB per decade of
+    distance.  Shadowing is drawn once per link, with standard deviation
+    shadowing_db, and is the same in both directions.
+    '''
+    def __init__(self,sim,exponent=3.0,ref_loss_db=40.0,ref_dist=1.0,
+                 shadowing_db=0.0,seed=None,**kwargs):
+        super().__init__(sim,**kwargs)
+        self.exponent = exponent
+        self.ref_loss_db = ref_loss_db
+        self.ref_dist = ref_dist
+        self.shadowing_sigma = shadowing_db
+        if seed is None:
+            seed = sim.random.getrandbits(32)
+        self.seed = seed
+
+    ############################
+    def path_loss_db(self,dist):
+        dist = np.maximum(dist,self.ref_dist)
+        return self.ref_loss_db + 10*self.exponent*np.log10(dist/self.ref_dist)
+
+    ############################
+    def shadowing_db(self,src,dst):
+        if not self.shadowing_sigma or len(src) == 0:
+            return 0.0
+        # derive one standard normal value per unordered pair from a hash
+        # of the seed and the pair, so that every rebuild gives each link
+        # the same value again, however many nodes are added
+        lo = np.minimum(src,dst).astype(np.uint64)
+        hi = np.maximum(src,dst).astype(np.uint64)
+        keys = (lo << np.uint64(32)) | hi
+        u1 = _uniform(keys,self.seed)
+        u2 = _uniform(keys,self.seed+1)
+        values = np.sqrt(-2*np.log(u1))*np.cos(2*np.pi*u2)
+        return self.shadowing_sigma*values
+
+###########################################################
+class SinrPhyLayer(DefaultPhyLayer):
+    '''
+    PHY layer deciding reception from the SINR computed by the simulator's
+    channel model, which defaults to a LogDistanceChannel.  A frame is
+    received if it is above the sensitivity when it starts, and its SINR
+    stays above the threshold until it ends.  Frames overlapping a locked
+    reception, and locked frames that fail, count as collisions.
+
+    Received powers are applied at the start and the end of a transmission
+    for all receivers together, neglecting propagation delays.
+    '''
+
+    def __init__(self,node,bitrate=250e3,ber=0,tx_power_dbm=0.0):
+        super().__init__(node,bitrate,ber)
+        self.tx_power = dbm_to_mw(tx_power_dbm)
+        if node.sim.channel is None:
+            node.sim.channel = LogDistanceChannel(node.sim)
+        self.channel = node.sim.channel
+
+    def send_pdu(self,pdu):
+        self.node.check_range()
+        tx_time = pdu.nbits/self.bitrate
+        self.on_tx_start(pdu)
+        self.node.delayed_exec(tx_time,self.on_tx_end,pdu)
+        stat,id = self._counters,self.node.id
+        stat['total_tx'][id] += 1
+        stat['total_bits_tx'][id] += pdu.nbits
+        stat['total_channel_tx'][id] += tx_time
+
+        ids,gains = self.channel.link_gains(id)
+        if len(ids) == 0:
+            return
+        power = self.tx_power*gains
+        before = self.channel.total[ids] >= self.channel.cca_threshold
+        serial,locked = self.channel.begin(ids,power)
+        self._mark_busy(ids,before)
+
+        # frames that cannot be locked onto because the receiver is busy
+        missed = ~locked & (power >= self.channel.sensitivity) & \
+                 (self.channel.lock[ids] >= 0)
+        nodes = self.node.sim.nodes
+        for i in ids[missed].tolist():
+            phy = nodes[i].phy
+            phy._counters['total_collision'][i] += 1
+            phy.on_collision(pdu)
+
+        self.node.delayed_exec(tx_time,self._end_tx,ids,power,serial,pdu)
+
+    def _mark_busy(self,ids,before):
+        # record when receivers start sensing a busy channel
+        now = self.node.now
+        after = self.channel.total[ids] >= self.channel.cca_threshold
+        nodes = self.node.sim.nodes
+        for i in ids[after & ~before].tolist():
+            nodes[i].phy._channel_busy_start = now
+
+    def _end_tx(self,ids,power,serial,pdu):
+        channel = self.channel
+        before = channel.total[ids] >= channel.cca_threshold
+        received,ok = channel.end(ids,power,serial)
+        nodes = self.node.sim.nodes
+        now = self.node.now
+        after = channel.total[ids] >= channel.cca_threshold
+        for i in ids[before & ~after].tolist():
+            phy = nodes[i].phy
+            phy._counters['total_channel_busy'][i] += now - phy._channel_busy_start
+            phy._channel_busy_start = 0
+        for i,success in zip(received.tolist(),ok.tolist()):
+            nodes[i].phy._receive(pdu,success)
+
+    def _receive(self,pdu,success):
+        stat,id = self._counters,self.node.id
+        if not success:
+            stat['total_collision'][id] += 1
+            self.on_collision(pdu)
+        elif self.node.sim.random.random() < (1-self.ber)**pdu.nbits:
+            self.node.mac.on_receive_pdu(pdu)
+            stat['total_rx'][id] += 1
+            stat['total_bits_rx'][id] += pdu.nbits
+        else:
+            stat['total_error'][id] += 1
+
+    def cca(self):
+        """Return True if the energy sensed on the channel is below the CCA
+        threshold"""
+        return self.channel.power_at(self.node.id) < self.channel.cca_threshold
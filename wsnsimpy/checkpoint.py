@@ -0,0 +1,179 @@
+'''
+Checkpointing of a simulation's state, used by Simulator.checkpoint() and
+Simulator.restore()
+'''
+import io
+import pickle
+from array import array
+from heapq import heapify
+from itertools import count
+
+import numpy as np
+import simpy
+import simpy.rt
+from simpy.core import StopSimulation
+
+FORMAT_VERSION = 1
+
+###########################################################
+def _shared_objects(sim):
+    '''
+    Return a dict mapping keys to objects that belong to the simulator
+    itself rather than to its state, and are therefore not stored but
+    referred to by key
+    '''
+    shared = {'sim':sim}
+    for name in sim.CHECKPOINT_EXCLUDE:
+        obj = getattr(sim,name,None)
+        if obj is not None and not isinstance(obj,(int,float,str,tuple)):
+            shared[name] = obj
+    return shared
+
+###########################################################
+class _Pickler(pickle.Pickler):
+    '''
+    Pickler storing shared objects, stat columns and neighbor arrays as
+    persistent IDs.  SimPy events and processes are dropped if allowed, or
+    rejected since generators cannot be pickled.
+    '''
+
+    def __init__(self,file,refs,drop_processes):
+        super().__init__(file,pickle.HIGHEST_PROTOCOL)
+        self.refs = refs
+        self.drop_processes = drop_processes
+
+    def persistent_id(self,obj):
+        key = self.refs.get(id(obj))
+        if key is not None:
+            return key
+        if isinstance(obj,simpy.events.Event):
+            if self.drop_processes:
+                return ('dropped',)
+            raise ValueError('cannot checkpoint pending SimPy event {!r}; '
+                    'use drop_processes=True to discard processes and events'
+                    .format(obj))
+        return None
+
+###########################################################
+class _Unpickler(pickle.Unpickler):
+
+    def __init__(self,file,refs):
+        super().__init__(file)
+        self.refs = refs
+
+    def persistent_load(self,key):
+        if key == ('dropped',):
+            return None
+        return self.refs[key]
+
+###########################################################
+def save_checkpoint(sim,path,drop_processes=False):
+    '''
+    Write the state of sim to path as an .npz archive.  Stat counters and
+    neighbor lists are stored as arrays; nodes, layers, pending callbacks
+    and the remaining simulator attributes are stored as a pickle in the
+    archive.
+    '''
+    env = sim.env
+    # the event ending the latest run(), rescheduled by SimPy once it has
+    # stopped the simulation, is not part of the state
+    queue = [e for e in env._queue
+             if any(cb != StopSimulation.callback for cb in e[3].callbacks or ())]
+    if queue and not drop_processes:
+        raise ValueError('cannot checkpoint {} pending SimPy events; use '
+                'drop_processes=True to discard processes and events'
+                .format(len(queue)))
+
+    arrays = {}
+    refs = {}
+    for key,obj in _shared_objects(sim).items():
+        refs[id(obj)] = key
+    for layer,columns in sim.stats._layers.items():
+        refs[id(columns)] = ('counters',layer)
+    for name,col in sim.stats.columns.items():
+        refs[id(col)] = ('column',name)
+        arrays['column:'+name] = np.array(col,dtype=col.typecode)
+
+    nodes = sim.nodes
+    lengths = [len(n.neighbor_ids) for n in nodes]
+    arrays['nbr_indptr'] = np.concatenate([[0],np.cumsum(lengths,dtype=np.int64)])
+    arrays['nbr_ids'] = np.concatenate([np.zeros(0,dtype=np.intc)]+
+            [np.frombuffer(n.neighbor_ids,dtype=np.intc) for n in nodes])
+    arrays['nbr_dists'] = np.concatenate([np.zeros(0)]+
+            [np.frombuffer(n.neighbor_dists) for n in nodes])
+    for n in nodes:
+        refs[id(n.neighbor_ids)] = ('nbr_ids',n.id)
+        refs[id(n.neighbor_dists)] = ('nbr_dists',n.id)
+
+    exclude = set(sim.CHECKPOINT_EXCLUDE)
+    state = {
+        'version'      : FORMAT_VERSION,
+        'attrs'        : {k:v for k,v in vars(sim).items() if k not in exclude},
+        'random'       : sim.random.getstate(),
+        'now'          : env._now,
+        'callbacks'    : [e for e in env._callbacks if e[2] is not None],
+        'callback_seq' : next(env._callback_seq),
+        'eid'          : next(env._eid),
+    }
+    env._callback_seq = count(state['callback_seq']+1)
+    env._eid = count(state['eid']+1)
+
+    buf = io.BytesIO()
+    _Pickler(buf,refs,drop_processes).dump(state)
+    arrays['state'] = np.frombuffer(buf.getvalue(),dtype=np.uint8)
+    with open(path,'wb') as f:
+        np.savez_compressed(f,**arrays)
+
+###########################################################
+def load_checkpoint(sim,path):
+    '''
+    Replace the state of sim, which must be a freshly created simulator of
+    the same class without nodes, by the one saved in path
+    '''
+    with np.load(path) as npz:
+        arrays = {name:npz[name] for name in npz.files}
+
+    refs = {key:obj for key,obj in _shared_objects(sim).items()}
+    stats = sim.stats
+    stats.columns.clear()
+    stats._layers.clear()
+    size = 0
+    for name in arrays:
+        if not name.startswith('column:'):
+            continue
+        values = arrays[name]
+        col = array(values.dtype.char,values.tobytes())
+        name = name[len('column:'):]
+        stats.columns[name] = col
+        layer,counter = name.split('.',1)
+        stats._layers.setdefault(layer,{})[counter] = col
+        refs[('column',name)] = col
+        size = len(col)
+    stats.size = size
+    for layer,columns in stats._layers.items():
+        refs[('counters',layer)] = columns
+
+    indptr = arrays['nbr_indptr'].tolist()
+    ids = arrays['nbr_ids'].astype(np.intc)
+    dists = arrays['nbr_dists']
+    for i in range(len(indptr)-1):
+        lo,hi = indptr[i],indptr[i+1]
+        refs[('nbr_ids',i)] = array('i',ids[lo:hi].tobytes())
+        refs[('nbr_dists',i)] = array('d',dists[lo:hi].tobytes())
+
+    state = _Unpickler(io.BytesIO(arrays['state'].tobytes()),refs).load()
+    if state['version'] != FORMAT_VERSION:
+        raise ValueError('unsupported checkpoint format {}'.format(state['version']))
+
+    vars(sim).update(state['attrs'])
+    sim.random.setstate(state['random'])
+    env = sim.env
+    env._now = state['now']
+    env._callbacks = state['callbacks']
+    heapify(env._callbacks)
+    env._callback_seq = count(state['callback_seq'])
+    env._eid = count(state['eid'])
+    if isinstance(env,simpy.rt.RealtimeEnvironment):
+        env.env_start = env._now
+        env.sync()
+    return state
@@ -47,13 +47,13 @@ class MyNode(wsp.Node):
         seq = 0
         while True:
             yield self.timeout(1)
-            self.log(f"Send data to {DEST} with seq {seq}")
+            self.log("Send data to {} with seq {}",DEST,seq)
             self.send_data(self.id, seq)
             seq += 1
 
     ###################
     def send_data(self,src,seq):
-        self.log(f"Forward data with seq {seq} via {self.next}")
+        self.log("Forward data with seq {} via {}",seq,self.next)
         self.send(self.next, msg='data', src=src, seq=seq)
 
     ###################
@@ -64,9 +64,9 @@ class MyNode(wsp.Node):
             self.prev = sender
             self.scene.addlink(sender,self.id,"parent")
             if self.id is DEST:
-                self.log(f"Receive RREQ from {src}")
+                self.log("Receive RREQ from {}",src)
                 yield self.timeout(5)
-                self.log(f"Send RREP to {src}")
+                self.log("Send RREP to {}",src)
                 self.send_rreply(self.id)
             else:
                 yield self.timeout(delay())
@@ -75,7 +75,7 @@ class MyNode(wsp.Node):
         elif msg == 'rreply':
             self.next = sender
             if self.id is SOURCE:
-                self.log(f"Receive RREP from {src}")
+                self.log("Receive RREP from {}",src)
                 yield self.timeout(5)
                 self.log("Start sending data")
                 self.start_process(self.start_send_data())
@@ -89,7 +89,7 @@ class MyNode(wsp.Node):
                 self.send_data(src,**kwargs)
             else:
                 seq = kwargs['seq']
-                self.log(f"Got data from {src} with seq {seq}")
+                self.log("Got data from {} with seq {}",src,seq)
 
 ###########################################################
 sim = wsp.Simulator(
@@ -25,16 +25,16 @@ class MyNode(wsp.Node):
     ##################
     def broadcast(self):
         self.scene.nodewidth(self.id, 3)
-        self.log(f"Broadcast message")
+        self.log("Broadcast message")
         self.send(wsp.BROADCAST_ADDR)
 
     ##################
     def on_receive(self, sender, **kwargs):
-        self.log(f"Receive message from {sender}")
+        self.log("Receive message from {}",sender)
         if self.recv:
-            self.log(f"Message seen; reject")
+            self.log("Message seen; reject")
             return
-        self.log(f"New message; prepare to rebroadcast")
+        self.log("New message; prepare to rebroadcast")
         self.recv = True
         self.scene.nodecolor(self.id,1,0,0)
         yield self.timeout(random.uniform(0.5,1.0))
@@ -26,16 +26,16 @@ class MyNode(wsp.LayeredNode):
     ##################
     def broadcast(self):
         self.scene.nodewidth(self.id, 3)
-        self.log(f"Broadcast message")
+        self.log("Broadcast message")
         self.send(wsp.BROADCAST_ADDR, nbits=MSG_NBITS)
 
     ##################
     def on_receive(self,sender,*args,**kwargs):
-        self.log(f"Receive message from {sender}")
+        self.log("Receive message from {}",sender)
         if self.recv:
-            self.log(f"Message seen; reject")
+            self.log("Message seen; reject")
             return
-        self.log(f"New message; prepare to rebroadcast")
+        self.log("New message; prepare to rebroadcast")
         self.recv = True
         self.scene.nodecolor(self.id,0,0,1)
         yield self.timeout(random.uniform(0.5,1.0))
@@ -45,22 +45,22 @@ class MyNode(wsp.LayeredNode):
     ##################
     def show_stats(self):
         # Physical layer
-        self.log(f"PHY: Number of transmissions = {self.phy.stat.total_tx}")
-        self.log(f"PHY: Number of successful receptions = {self.phy.stat.total_rx}")
-        self.log(f"PHY: Number of collisions = {self.phy.stat.total_collision}")
-        self.log(f"PHY: Number of errors = {self.phy.stat.total_error}")
-        self.log(f"PHY: Total channel busy time (s) = {self.phy.stat.total_channel_busy}")
-        self.log(f"PHY: Total channel tx time (s) = {self.phy.stat.total_channel_tx}")
-        self.log(f"PHY: Number of bits transmitted = {self.phy.stat.total_bits_tx}")
-        self.log(f"PHY: Number of bits received successfully = {self.phy.stat.total_bits_rx}")
+        self.log("PHY: Number of transmissions = {}",self.phy.stat.total_tx)
+        self.log("PHY: Number of successful receptions = {}",self.phy.stat.total_rx)
+        self.log("PHY: Number of collisions = {}",self.phy.stat.total_collision)
+        self.log("PHY: Number of errors = {}",self.phy.stat.total_error)
+        self.log("PHY: Total channel busy time (s) = {}",self.phy.stat.total_channel_busy)
+        self.log("PHY: Total channel tx time (s) = {}",self.phy.stat.total_channel_tx)
+        self.log("PHY: Number of bits transmitted = {}",self.phy.stat.total_bits_tx)
+        self.log("PHY: Number of bits received successfully = {}",self.phy.stat.total_bits_rx)
 
         # MAC layer
-        self.log(f"MAC: Number of broadcasts sent = {self.mac.stat.total_tx_broadcast}")
-        self.log(f"MAC: Number of unicasts sent = {self.mac.stat.total_tx_unicast}")
-        self.log(f"MAC: Number of broadcasts received = {self.mac.stat.total_rx_broadcast}")
-        self.log(f"MAC: Number of unicasts received = {self.mac.stat.total_rx_unicast}")
-        self.log(f"MAC: Number of retransmissions = {self.mac.stat.total_retransmit}")
-        self.log(f"MAC: Number of acks sent = {self.mac.stat.total_ack}")
+        self.log("MAC: Number of broadcasts sent = {}",self.mac.stat.total_tx_broadcast)
+        self.log("MAC: Number of unicasts sent = {}",self.mac.stat.total_tx_unicast)
+        self.log("MAC: Number of broadcasts received = {}",self.mac.stat.total_rx_broadcast)
+        self.log("MAC: Number of unicasts received = {}",self.mac.stat.total_rx_unicast)
+        self.log("MAC: Number of retransmissions = {}",self.mac.stat.total_retransmit)
+        self.log("MAC: Number of acks sent = {}",self.mac.stat.total_ack)
         
 ###########################################################
 sim = wsp.Simulator(
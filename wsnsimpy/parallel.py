@@ -0,0 +1,315 @@
+'''
+Sharded simulation over several processes, one per spatial region
+'''
+import math
+import multiprocessing
+import traceback
+
+import numpy as np
+
+from .wsnsimpy import Simulator, DefaultPhyLayer, ensure_generator
+
+###########################################################
+class _NullScene:
+    '''Scene accepting and ignoring all scene commands'''
+    def _ignore(self,*args,**kwargs):
+        pass
+    def __getattr__(self,name):
+        return self._ignore
+
+###########################################################
+class _GhostNode:
+    '''
+    Stand-in for a node owned by another shard.  Calls scheduled on a ghost
+    are sent to the owning shard instead of being executed locally.
+    '''
+    def __init__(self,node):
+        self.id = node.id
+        self.pos = node.pos
+        self.tx_range = node.tx_range
+        if hasattr(node,'phy'):
+            self.phy = _GhostPhy(self)
+
+    def __repr__(self):
+        return '<Ghost %d:(%.2f,%.2f)>' % (self.id,self.pos[0],self.pos[1])
+
+    def on_receive(self,*args,**kwargs):
+        raise RuntimeError('ghost node {} cannot be called directly'.format(self.id))
+
+###########################################################
+class _GhostPhy:
+    def __init__(self,node):
+        self.node = node
+
+    def on_rx_start(self,pdu):
+        raise RuntimeError('ghost node {} cannot be called directly'.format(self.node.id))
+
+    def on_rx_end(self,pdu):
+        raise RuntimeError('ghost node {} cannot be called directly'.format(self.node.id))
+
+_RX_METHODS = {
+    DefaultPhyLayer._start_rx_all : 'on_rx_start',
+    DefaultPhyLayer._end_rx_all   : 'on_rx_end',
+}
+
+###########################################################
+class ShardedSimulator(Simulator):
+    '''
+    Simulator running nodes in several worker processes, each owning the
+    nodes of one strip of the terrain.  Nodes are added and configured in
+    the parent process exactly as with Simulator; run() then forks one
+    worker per shard, in which nodes owned by other shards are replaced by
+    ghosts.  init(), node init() and run() are only called in the worker
+    owning the node.
+
+    Receptions scheduled by a node on a ghost, i.e., Node.send() and
+    DefaultPhyLayer's rx-start and rx-end events, are sent to the owning
+    shard, stamped with their delivery time.  Workers advance in windows of
+    lookahead seconds and exchange these messages at the end of each
+    window, after which all shards skip to the earliest pending event.  By
+    default, lookahead is the smallest propagation delay over links
+    crossing shards, so that every message reaches its shard before its
+    delivery time and causality is preserved exactly.  A larger lookahead
+    trades accuracy for speed: messages due before the end of the window
+    they arrive in are delivered at its start, and are counted in
+    late_deliveries.  With DefaultPhyLayer, its prop_delay_quantum bounds
+    the lookahead from below.
+
+    Only interactions through these calls are supported; protocol code
+    reading or modifying other nodes' state directly sees ghosts.  The
+    topology must stay static, and channel models are not supported.
+    Each shard uses its own random generator seeded from seed and the
+    shard number, so random draws differ from those of a sequential run.
+    Stat counters and queue_length_histogram() of all shards are merged;
+    when collect is given, collect(node) is called in the workers on every
+    node after the run, and the results are gathered in results, a dict
+    indexed by node ID.  Workers are started with fork.
+    '''
+
+    def __init__(self,until,shards=2,seed=0,lookahead=None,collect=None,
+                 cell_size=None,max_range=None):
+        super().__init__(until,timescale=0,seed=seed,cell_size=cell_size,
+                         max_range=max_range)
+        self.shards = shards
+        self.lookahead = lookahead
+        self.collect = collect
+        self.results = {}
+        self.late_deliveries = 0
+        self.windows = 0
+        self._queue_histogram = np.zeros(1)
+        self.scene = _NullScene()
+        self.visual = False
+        self.owner = None
+        self._shard = None
+        self._outbox = None
+
+    ############################
+    def partition(self):
+        '''
+        Assign nodes to shards as strips of equal node counts along the
+        longer side of the deployment, and return the owner of each node
+        '''
+        pos = np.array([n.pos for n in self.nodes],dtype=float).reshape(-1,2)
+        n = len(pos)
+        extent = pos.max(axis=0) - pos.min(axis=0) if n else np.zeros(2)
+        axis = 0 if extent[0] >= extent[1] else 1
+        order = np.argsort(pos[:,axis],kind='stable')
+        owner = np.empty(n,dtype=np.int64)
+        owner[order] = np.arange(n)*self.shards//max(n,1)
+        return owner
+
+    ############################
+    def _delay(self,node,dist):
+        '''Return the delay of a reception at distance dist from node'''
+        if hasattr(node,'phy'):
+            quantum = node.phy.prop_delay_quantum
+            if quantum:
+                return math.ceil(dist/3e8/quantum)*quantum
+            return dist/3e8
+        return dist/1000000
+
+    ############################
+    def _min_cross_delay(self):
+        '''Return the smallest delay over links crossing shards'''
+        min_delay = math.inf
+        owner = self.owner
+        for node in self.nodes:
+            src = owner[node.id]
+            for dist,id in zip(node.neighbor_dists,node.neighbor_ids):
+                if dist > node.tx_range:
+                    break
+                if owner[id] != src:
+                    min_delay = min(min_delay,self._delay(node,dist))
+        return min_delay
+
+    ############################
+    def delayed_exec(self,delay,func,*args,**kwargs):
+        '''
+        Forward calls scheduled on ghosts to their owning shards, and
+        execute all others locally
+        '''
+        if self._outbox is not None:
+            target = getattr(func,'__self__',None)
+            if type(target) is _GhostNode:
+                self._forward(delay,target.id,func.__name__,args,kwargs)
+                return
+            name = _RX_METHODS.get(getattr(func,'__func__',None))
+            if name is not None:
+                phys,pdu = args
+                local = []
+                for phy in phys:
+                    if type(phy) is _GhostPhy:
+                        self._forward(delay,phy.node.id,name,(pdu,),{})
+                    else:
+                        local.append(phy)
+                if not local:
+                    return
+                args = (local,pdu)
+        return super().delayed_exec(delay,func,*args,**kwargs)
+
+    ############################
+    def _forward(self,delay,id,name,args,kwargs):
+        self._outbox[self.owner[id]].append(
+                (self.env._now+delay,id,name,args,kwargs))
+
+    ############################
+    def _deliver(self,messages):
+        now = self.env._now
+        messages.sort(key=lambda m: m[0])
+        for (time,id,name,args,kwargs) in messages:
+            if time < now:
+                self.late_deliveries += 1
+            node = self.nodes[id]
+            target = node.phy if name in ('on_rx_start','on_rx_end') else node
+            Simulator.delayed_exec(self,max(time-now,0),
+                    getattr(target,name),*args,**kwargs)
+
+    ############################
+    def run(self):
+        # tx_range is commonly assigned right after add_node()
+        self.refresh_neighbor_lists()
+        self.owner = self.partition().tolist()
+        if self.lookahead is None:
+            min_delay = self._min_cross_delay()
+            if min_delay <= 0:
+                raise ValueError('nodes of different shards are co-located; '
+                        'a lookahead must be given')
+            self.lookahead = min_delay
+
+        ctx = multiprocessing.get_context('fork')
+        inboxes = [ctx.Queue() for _ in range(self.shards)]
+        results = ctx.Queue()
+        workers = [ctx.Process(target=self._run_shard,args=(k,inboxes,results))
+                   for k in range(self.shards)]
+        for w in workers:
+            w.start()
+        errors = []
+        totals = {}
+        for _ in workers:
+            (k,error,stats,collected,late,windows,hist) = results.get()
+            if error is not None:
+                errors.append('shard {}:\n{}'.format(k,error))
+                continue
+            for name,values in stats.items():
+                totals[name] = totals[name]+values if name in totals else values
+            self.results.update(collected)
+            self.late_deliveries += late
+            self.windows = max(self.windows,windows)
+            if len(hist) > len(self._queue_histogram):
+                hist[:len(self._queue_histogram)] += self._queue_histogram
+                self._queue_histogram = hist
+            else:
+                self._queue_histogram[:len(hist)] += hist
+        for w in workers:
+            w.join()
+        if errors:
+            raise RuntimeError('\n'.join(errors))
+        for name,values in totals.items():
+            col = self.stats.declare(name,float if values.dtype.kind == 'f' else int)
+            if values.dtype.kind == 'f' and col.typecode == 'q':
+                col = self.stats.widen(name)
+            col[:] = type(col)(col.typecode,values.astype(col.typecode).tobytes())
+        self.env._now = self.until
+
+    ############################
+    def queue_length_histogram(self):
+        if self._shard is None:
+            return self._queue_histogram.copy()
+        return super().queue_length_histogram()
+
+    ############################
+    def _run_shard(self,k,inboxes,results):
+        '''Body of the worker process of shard k'''
+        try:
+            self._shard = k
+            self._outbox = {dst:[] for dst in range(self.shards) if dst != k}
+            self.random.seed(self.random.getrandbits(64)+k)
+            for i,node in enumerate(self.nodes):
+                if self.owner[i] != k:
+                    self.nodes[i] = _GhostNode(node)
+            owned = [n for n in self.nodes if type(n) is not _GhostNode]
+
+            self.init()
+            for n in owned:
+                n.init()
+            for n in owned:
+                self.env.process(ensure_generator(self.env,n.run))
+            self._run_windows(k,inboxes)
+            for n in owned:
+                n.finish()
+            hist = self.queue_length_histogram()
+
+            stats = {name:np.array(col) for name,col in self.stats.columns.items()}
+            collected = {}
+            if self.collect is not None:
+                collected = {n.id:self.collect(n) for n in owned}
+            results.put((k,None,stats,collected,self.late_deliveries,self.windows,
+                         hist))
+        except BaseException:
+            # unblock shards waiting for this one before reporting
+            for inbox in inboxes:
+                inbox.put((None,k,None,None))
+            results.put((k,traceback.format_exc(),None,None,0,0,None))
+
+    ############################
+    def _run_windows(self,k,inboxes):
+        '''
+        Advance through windows [start,start+lookahead).  At the end of a
+        window, every shard sends each other shard the messages for it and
+        the earliest time at which it has anything to do; the next window
+        starts at the earliest of these times, so idle stretches are
+        skipped by all shards at once.
+        '''
+        env = self.env
+        early = {}
+        window = 0
+        start = env._now
+        while start < self.until:
+            end = min(start+self.lookahead,self.until)
+            while env.peek() < end:
+                env.step()
+            env._now = end
+            window += 1
+            next_time = env.peek()
+            for dst,messages in self._outbox.items():
+                if messages:
+                    next_time = min(next_time,min(m[0] for m in messages))
+            for dst,messages in self._outbox.items():
+                inboxes[dst].put((window,k,next_time,messages))
+                self._outbox[dst] = []
+            incoming = early.pop(window,[])
+            while len(incoming) < self.shards-1:
+                (w,src,time,messages) = inboxes[k].get()
+                if w is None:
+                    raise RuntimeError('shard {} failed'.format(src))
+                if w == window:
+                    incoming.append((src,time,messages))
+                else:
+                    early.setdefault(w,[]).append((src,time,messages))
+            incoming.sort(key=lambda m: m[0])
+            self._deliver([m for _,_,messages in incoming for m in messages])
+            start = max(end,min([next_time]+[time for _,time,_ in incoming]))
+            if start < self.until:
+                env._now = start
+        env._now = self.until
+        self.windows = window
@@ -0,0 +1,162 @@
+'''
+Opt-in instrumentation of a simulation run, enabled by
+Simulator(...,profile=True)
+'''
+import functools
+import sys
+from time import perf_counter
+
+from .wsnsimpy import is_generator_function
+
+###########################################################
+def _callback_name(func):
+    return getattr(func,'__qualname__',type(func).__name__)
+
+###########################################################
+class Profiler:
+    '''
+    Collect, for one simulation run, the number of events scheduled and
+    executed per callback type, the peak length of the event queue, the
+    event rate, and the wall-clock time spent in layer methods.  Times of
+    layer methods are inclusive, so a method calling another one is also
+    charged for the callee.  Generator methods are only charged for the
+    time spent between their yields.
+
+    Nothing is installed unless a Profiler is attached, so that disabled
+    profiling costs nothing.
+    '''
+
+    METHODS = ('send_pdu','on_rx_start','on_rx_end','process_queue','on_receive')
+
+    def __init__(self,sim):
+        self.sim = sim
+        self.scheduled = {}
+        self.executed = {}
+        self.calls = {}
+        self.times = {}
+        self.peak_queue = 0
+        self.wall_time = 0.0
+        self._start = None
+
+    ############################
+    def attach_env(self):
+        '''Count events going through the simulator's environment'''
+        env = self.sim.env
+        scheduled,executed = self.scheduled,self.executed
+        schedule_call,schedule,step = env.schedule_call,env.schedule,env.step
+
+        def _schedule_call(delay,func,args=(),kwargs={}):
+            name = _callback_name(func)
+            scheduled[name] = scheduled.get(name,0) + 1
+            return schedule_call(delay,func,args,kwargs)
+
+        def _schedule(event,*args,**kwargs):
+            name = type(event).__name__
+            scheduled[name] = scheduled.get(name,0) + 1
+            schedule(event,*args,**kwargs)
+
+        def _step():
+            env._discard_cancelled()
+            callbacks,queue = env._callbacks,env._queue
+            length = len(callbacks) + len(queue)
+            if length > self.peak_queue:
+                self.peak_queue = length
+            if callbacks and (not queue or callbacks[0][0] < queue[0][0]):
+                name = _callback_name(callbacks[0][2])
+            elif queue:
+                name = type(queue[0][3]).__name__
+            else:
+                name = None
+            if name is not None:
+                executed[name] = executed.get(name,0) + 1
+            step()
+
+        env.schedule_call = _schedule_call
+        env.schedule = _schedule
+        env.step = _step
+
+    ############################
+    def attach_nodes(self):
+        '''Time layer methods of all nodes'''
+        for node in self.sim.nodes:
+            for obj in (node,getattr(node,'phy',None),getattr(node,'mac',None),
+                        getattr(node,'net',None)):
+                if obj is None:
+                    continue
+                for name in self.METHODS:
+                    method = getattr(obj,name,None)
+                    if method is not None:
+                        key = '{}.{}'.format(type(obj).__name__,name)
+                        setattr(obj,name,self._timed(key,method))
+
+    ############################
+    def _timed(self,key,method):
+        calls,times = self.calls,self.times
+        calls.setdefault(key,0)
+        times.setdefault(key,0.0)
+
+        if is_generator_function(method):
+            @functools.wraps(method)
+            def wrapper(*args,**kwargs):
+                calls[key] += 1
+                gen = method(*args,**kwargs)
+                value,error = None,None
+                while True:
+                    start = perf_counter()
+                    try:
+                        if error is None:
+                            event = gen.send(value)
+                        else:
+                            event = gen.throw(error)
+                    except StopIteration as e:
+                        times[key] += perf_counter() - start
+                        return e.value
+                    times[key] += perf_counter() - start
+                    value,error = None,None
+                    try:
+                        value = yield event
+                    except BaseException as e:
+                        error = e
+        else:
+            @functools.wraps(method)
+            def wrapper(*args,**kwargs):
+                calls[key] += 1
+                start = perf_counter()
+                try:
+                    return method(*args,**kwargs)
+                finally:
+                    times[key] += perf_counter() - start
+        return wrapper
+
+    ############################
+    def start(self):
+        self._start = perf_counter()
+
+    ############################
+    def stop(self):
+        self.wall_time = perf_counter() - self._start
+
+    ############################
+    def report(self,file=None):
+        '''Print a summary of the run'''
+        if file is None:
+            file = sys.stdout
+        total = sum(self.executed.values())
+        rate = total/self.wall_time if self.wall_time > 0 else 0.0
+        print('=== wsnsimpy profile ===',file=file)
+        print('wall time: {:.3f} s, events executed: {}, events/sec: {:.0f}, '
+              'peak queue length: {}'.format(
+                  self.wall_time,total,rate,self.peak_queue),file=file)
+        print('{:<44}{:>12}{:>12}'.format('event','scheduled','executed'),file=file)
+        for name in sorted(set(self.scheduled)|set(self.executed),
+                           key=lambda n: -self.executed.get(n,0)):
+            print('{:<44}{:>12}{:>12}'.format(name,
+                self.scheduled.get(name,0),self.executed.get(name,0)),file=file)
+        print('{:<44}{:>12}{:>12}{:>12}'.format(
+            'method','calls','time (s)','us/call'),file=file)
+        for key in sorted(self.times,key=lambda k: -self.times[k]):
+            calls = self.calls[key]
+            if calls == 0:
+                continue
+            print('{:<44}{:>12}{:>12.3f}{:>12.1f}'.format(key,calls,
+                self.times[key],self.times[key]/calls*1e6),file=file)
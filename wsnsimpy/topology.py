@@ -0,0 +1,204 @@
+'''
+Sparse adjacency of the neighbor graph and vectorized graph analytics
+'''
+from bisect import bisect_right
+
+import numpy as np
+
+###########################################################
+class Topology:
+    '''
+    In-range neighbor graph of a simulator as a sparse matrix in CSR form
+    (indptr, indices, data), where row i lists the nodes reached by
+    transmissions of node i and data holds the distances to them.  Columns
+    of each row are sorted by node ID.  Links are directed, since nodes
+    may have different tx_ranges.
+
+    The matrix is kept by the simulator (see Simulator.topology) and only
+    the rows of nodes whose neighbor lists changed are recomputed before
+    it is next used.  SciPy is optional; it is only needed by to_scipy()
+    and used by connected_components() when available.
+    '''
+
+    def __init__(self,sim):
+        self.sim = sim
+        self.indptr = np.zeros(1,dtype=np.int64)
+        self.indices = np.zeros(0,dtype=np.int64)
+        self.data = np.zeros(0)
+        self._dirty = set()
+        self._version = None
+        self._rev = None
+
+    ############################
+    def invalidate(self,ids=None):
+        '''
+        Mark rows of the given node IDs as stale, or the whole matrix when
+        ids is None.  Called by the simulator right after it bumps
+        topology_version; if any earlier change went unreported, the whole
+        matrix is rebuilt.
+        '''
+        if ids is not None and self._version == self.sim.topology_version-1:
+            self._dirty.update(ids)
+            self._version = self.sim.topology_version
+        else:
+            self._version = None
+
+    ############################
+    @property
+    def size(self):
+        return len(self.indptr)-1
+
+    ############################
+    def refresh(self):
+        '''
+        Bring the matrix up to date with the simulator's neighbor lists
+        '''
+        nodes = self.sim.nodes
+        for node in nodes:
+            node.check_range()
+        n = len(nodes)
+        if self._version != self.sim.topology_version or self.size > n:
+            dirty = range(n)
+        elif self._dirty or self.size < n:
+            dirty = self._dirty | set(range(self.size,n))
+        else:
+            return
+        self._dirty = set()
+        self._version = self.sim.topology_version
+        self._rev = None
+
+        lengths = np.zeros(n,dtype=np.int64)
+        lengths[:self.size] = np.diff(self.indptr)[:n]
+        dirty = list(dirty)
+        stale = np.zeros(n,dtype=bool)
+        stale[dirty] = True
+        rows = np.repeat(np.arange(n),lengths)
+        keep = ~stale[rows]
+
+        counts = [bisect_right(nodes[i].neighbor_dists,nodes[i].tx_range)
+                  for i in dirty]
+        new_cols = [np.frombuffer(nodes[i].neighbor_ids,dtype=np.intc)[:k]
+                    for i,k in zip(dirty,counts)]
+        new_dists = [np.frombuffer(nodes[i].neighbor_dists)[:k]
+                     for i,k in zip(dirty,counts)]
+
+        r = np.concatenate([rows[keep],np.repeat(np.array(dirty,dtype=np.int64),counts)])
+        c = np.concatenate([self.indices[keep]]+new_cols).astype(np.int64)
+        d = np.concatenate([self.data[keep]]+new_dists)
+        order = np.lexsort((c,r))
+        self.indptr = np.zeros(n+1,dtype=np.int64)
+        np.cumsum(np.bincount(r,minlength=n),out=self.indptr[1:])
+        self.indices = c[order]
+        self.data = d[order]
+
+    ############################
+    def csr(self):
+        '''Return up-to-date (indptr,indices,data) arrays'''
+        self.refresh()
+        return self.indptr,self.indices,self.data
+
+    ############################
+    def to_scipy(self):
+        '''Return the matrix of distances as a scipy.sparse.csr_matrix'''
+        from scipy.sparse import csr_matrix
+        indptr,indices,data = self.csr()
+        n = len(indptr)-1
+        return csr_matrix((data,indices,indptr),shape=(n,n))
+
+    ############################
+    def _reverse(self):
+        '''Return the CSR arrays of the transposed graph'''
+        self.refresh()
+        if self._rev is None:
+            n = self.size
+            rows = np.repeat(np.arange(n),np.diff(self.indptr))
+            order = np.lexsort((rows,self.indices))
+            indptr = np.zeros(n+1,dtype=np.int64)
+            np.cumsum(np.bincount(self.indices,minlength=n),out=indptr[1:])
+            self._rev = (indptr,rows[order],self.data[order])
+        return self._rev
+
+    ############################
+    def degree(self,reverse=False):
+        '''
+        Return the number of neighbors of each node, i.e., the number of
+        nodes it reaches, or with reverse=True, the number of nodes reaching
+        it
+        '''
+        indptr = self._reverse()[0] if reverse else self.csr()[0]
+        return np.diff(indptr)
+
+    ############################
+    def degree_histogram(self,reverse=False):
+        '''Return the number of nodes having each degree, starting at 0'''
+        return np.bincount(self.degree(reverse))
+
+    ############################
+    def connected_components(self):
+        '''
+        Return the number of weakly connected components and the component
+        label of each node
+        '''
+        indptr,indices,data = self.csr()
+        n = len(indptr)-1
+        try:
+            from scipy.sparse.csgraph import connected_components
+        except ImportError:
+            pass
+        else:
+            return connected_components(self.to_scipy(),directed=True,
+                                        connection='weak')
+
+        # propagate the smallest node ID along links in both directions
+        rows = np.repeat(np.arange(n),np.diff(indptr))
+        labels = np.arange(n)
+        while True:
+            new = labels.copy()
+            np.minimum.at(new,rows,labels[indices])
+            np.minimum.at(new,indices,labels[rows])
+            new = new[new]
+            if np.array_equal(new,labels):
+                break
+            labels = new
+        roots,labels = np.unique(labels,return_inverse=True)
+        return len(roots),labels
+
+    ############################
+    def _frontier_neighbors(self,indptr,indices,frontier):
+        '''Return the neighbors of all frontier nodes, with repetitions'''
+        lo,hi = indptr[frontier],indptr[frontier+1]
+        count = hi-lo
+        total = count.sum()
+        first = np.repeat(lo-np.cumsum(count)+count,count)
+        return indices[first+np.arange(total)]
+
+    ############################
+    def hops(self,source,max_hops=None,reverse=False):
+        '''
+        Return the hop distance of every node from source, or -1 for nodes
+        that cannot be reached, via a level-synchronous BFS.  With
+        reverse=True, hops are counted towards source instead, as needed
+        for collecting data at a sink.  The search stops after max_hops
+        levels when given.
+        '''
+        indptr,indices = self._reverse()[:2] if reverse else self.csr()[:2]
+        n = len(indptr)-1
+        dist = np.full(n,-1,dtype=np.int64)
+        frontier = np.unique(np.atleast_1d(np.asarray(source,dtype=np.int64)))
+        dist[frontier] = 0
+        level = 0
+        while len(frontier) and (max_hops is None or level < max_hops):
+            level += 1
+            nbrs = self._frontier_neighbors(indptr,indices,frontier)
+            frontier = np.unique(nbrs[dist[nbrs] < 0])
+            dist[frontier] = level
+        return dist
+
+    ############################
+    def k_hop(self,id,k,reverse=False):
+        '''
+        Return the sorted IDs of nodes within k hops from node id, not
+        including id itself
+        '''
+        dist = self.hops(id,max_hops=k,reverse=reverse)
+        return np.flatnonzero(dist > 0)
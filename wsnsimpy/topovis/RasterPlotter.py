@@ -0,0 +1,289 @@
+import os
+import struct
+import zlib
+
+import numpy as np
+
+from .common import *
+from .TopoVis import GenericPlotter
+
+###############################################
+def writePNG(path, pixels):
+    """
+    Write an RGB image, given as a uint8 array of shape (height,width,3),
+    to a PNG file
+    """
+    h,w,_ = pixels.shape
+    raw = np.zeros((h, w*3+1), dtype=np.uint8)   # filter type 0 per row
+    raw[:,1:] = pixels.reshape(h, w*3)
+
+    def chunk(kind, data):
+        return (struct.pack('>I', len(data)) + kind + data +
+                struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff))
+
+    with open(path, 'wb') as f:
+        f.write(b'\x89PNG\r\n\x1a\n')
+        f.write(chunk(b'IHDR', struct.pack('>IIBBBBB', w, h, 8, 2, 0, 0, 0)))
+        f.write(chunk(b'IDAT', zlib.compress(raw.tobytes(), 1)))
+        f.write(chunk(b'IEND', b''))
+
+###############################################
+def rgb(color, default=(0,0,0)):
+    if color is None or color == DEFAULT:
+        color = default
+    return tuple(int(c*255) for c in color)
+
+###############################################
+def sampleSegments(x1, y1, x2, y2):
+    """
+    Return pixel coordinates along each segment, about one per pixel, the
+    index of the segment each of them belongs to, and its position along
+    the segment in pixels
+    """
+    n = np.ceil(np.maximum(abs(x2-x1), abs(y2-y1))).astype(np.int64) + 1
+    idx = np.repeat(np.arange(len(n)), n)
+    step = np.arange(n.sum()) - np.repeat(np.cumsum(n)-n, n)
+    t = step / np.maximum(n-1, 1)[idx]
+    xs = x1[idx] + (x2-x1)[idx]*t
+    ys = y1[idx] + (y2-y1)[idx]*t
+    return xs, ys, idx, step
+
+###############################################
+def sampleCircles(cx, cy, r):
+    """
+    Return pixel coordinates along each circle outline, about one per pixel,
+    the index of the circle each of them belongs to, and its position along
+    the outline in pixels
+    """
+    n = np.maximum(np.ceil(2*np.pi*r).astype(np.int64), 8)
+    idx = np.repeat(np.arange(len(n)), n)
+    step = np.arange(n.sum()) - np.repeat(np.cumsum(n)-n, n)
+    theta = 2*np.pi*step/n[idx]
+    return cx[idx] + r[idx]*np.cos(theta), cy[idx] + r[idx]*np.sin(theta), idx, step
+
+###############################################
+class Plotter(GenericPlotter):
+    """
+    Define an off-screen plotter rendering the scene into a NumPy pixel
+    buffer.  All nodes, links and shapes of a frame are drawn with a few
+    array operations per kind of object rather than one call per object.
+    Node labels and text are not rendered.
+
+    When outdir is given, a PNG frame is written there every frameInterval
+    seconds of simulation time, as obtained from clock() or else from the
+    latest setTime() call.  Frames are numbered by interval, so an image
+    sequence plays back at a constant rate.  Frames due are written before
+    the scene's state is changed by the next command, so that each of them
+    shows the state at its own time.
+    """
+
+    def __init__(self, outdir=None, frameInterval=0.1, clock=None, scale=1.0,
+                 params=None):
+        GenericPlotter.__init__(self, params)
+        self.outdir = outdir
+        self.frameInterval = frameInterval
+        self.clock = clock
+        self.scale = scale
+        self.time = 0.0
+        self.frame = 0
+        self.shapes = {}
+        self.pixels = None
+        if outdir is not None:
+            os.makedirs(outdir, exist_ok=True)
+
+    ###################
+    def init(self, tx, ty):
+        self.size = (int(np.ceil(tx*self.scale)), int(np.ceil(ty*self.scale)))
+        self.render()
+
+    ###################
+    def setTime(self, time):
+        self.time = time
+        self.advance()
+
+    ###################
+    def advance(self):
+        """
+        Write frames for all frame intervals elapsed so far
+        """
+        if self.outdir is None or self.pixels is None:
+            return
+        time = self.clock() if self.clock is not None else self.time
+        if time < self.frame*self.frameInterval:
+            return
+        self.render()
+        while time >= self.frame*self.frameInterval:
+            self.writeFrame()
+
+    ###################
+    def beforeUpdate(self):
+        self.advance()
+
+    ###################
+    def writeFrame(self):
+        writePNG(os.path.join(self.outdir, 'frame%06d.png' % self.frame),
+                 self.pixels)
+        self.frame += 1
+
+    ###################
+    def close(self):
+        """
+        Write a final frame showing the current state
+        """
+        if self.outdir is not None and self.pixels is not None:
+            self.render()
+            self.writeFrame()
+
+    ###################
+    def plot(self, xs, ys, colors, width=1, mask=None):
+        """
+        Set pixels at (xs,ys), given in scene coordinates, to colors, which
+        is either one RGB tuple or an array of them, one per pixel
+        """
+        colors = np.asarray(colors, dtype=np.uint8)
+        if mask is not None:
+            xs, ys = xs[mask], ys[mask]
+            if colors.ndim == 2:
+                colors = colors[mask]
+        xs = np.rint(xs*self.scale).astype(np.int64)
+        ys = np.rint(ys*self.scale).astype(np.int64)
+        if width > 1:
+            offsets = np.arange(width) - width//2
+            dx,dy = np.meshgrid(offsets, offsets)
+            xs = (xs[:,None] + dx.ravel()).ravel()
+            ys = (ys[:,None] + dy.ravel()).ravel()
+            if colors.ndim == 2:
+                colors = np.repeat(colors, len(offsets)**2, axis=0)
+        h,w,_ = self.pixels.shape
+        keep = (xs >= 0) & (xs < w) & (ys >= 0) & (ys < h)
+        if colors.ndim == 2:
+            colors = colors[keep]
+        self.pixels[ys[keep], xs[keep]] = colors
+
+    ###################
+    def drawStyled(self, sample, coords, styles):
+        """
+        Draw outlines of objects sharing the same kind, with coordinate
+        arrays coords, sampled by sample(*coords), and one LineStyle each
+        """
+        groups = {}
+        for i,style in enumerate(styles):
+            groups.setdefault((style.width, tuple(style.dash)), []).append(i)
+        for (width,dash),members in groups.items():
+            members = np.array(members)
+            xs,ys,idx,step = sample(*(c[members] for c in coords))
+            colors = np.array([rgb(styles[i].color) for i in members],
+                              dtype=np.uint8)[idx]
+            mask = None
+            if dash:
+                on = dash[0]
+                off = dash[1] if len(dash) > 1 else dash[0]
+                mask = step % (on+off) < on
+            self.plot(xs, ys, colors, max(1, int(width)), mask)
+
+    ###################
+    def render(self):
+        """
+        Redraw the whole scene into the pixel buffer
+        """
+        w,h = self.size
+        bg = self.params.bgcolor
+        self.pixels = np.empty((h,w,3), dtype=np.uint8)
+        self.pixels[:] = rgb(bg.rgb)
+        scene = self.scene
+        p = self.params
+
+        # links
+        if scene.links:
+            links = list(scene.links)
+            srows = scene.nodeIndex([s for (s,d,style) in links])
+            drows = scene.nodeIndex([d for (s,d,style) in links])
+            src,dst = scene.nodePos[srows],scene.nodePos[drows]
+            ssc,dsc = scene.nodeScale[srows],scene.nodeScale[drows]
+            diff = dst - src
+            dist = np.sqrt((diff*diff).sum(axis=1))
+            u = diff / np.where(dist > 0, dist, 1)[:,None]
+            a = src + u*(p.nodesize*ssc)[:,None]
+            b = dst - u*(p.nodesize*dsc)[:,None]
+            self.drawStyled(sampleSegments, (a[:,0],a[:,1],b[:,0],b[:,1]),
+                            [scene.lineStyles[style] for (s,d,style) in links])
+
+        # shapes
+        for kind,sample in (('circle',sampleCircles),('line',sampleSegments),
+                            ('rect',None)):
+            shapes = [s for s in self.shapes.values() if s[0] == kind]
+            if not shapes:
+                continue
+            if kind == 'rect':
+                for (_,coords,line,fill) in shapes:
+                    self.fillRect(coords, fill)
+                (x1,y1,x2,y2) = (np.array(c) for c in zip(*(s[1] for s in shapes)))
+                coords = (np.concatenate([x1,x2,x2,x1]), np.concatenate([y1,y1,y2,y2]),
+                          np.concatenate([x2,x2,x1,x1]), np.concatenate([y1,y2,y2,y1]))
+                styles = [s[2] for s in shapes]*4
+                self.drawStyled(sampleSegments, coords, styles)
+                continue
+            if kind == 'circle':
+                for (_,coords,line,fill) in shapes:
+                    self.fillCircle(coords, fill)
+            coords = tuple(np.array(c, dtype=float) for c in zip(*(s[1] for s in shapes)))
+            self.drawStyled(sample, coords, [s[2] for s in shapes])
+
+        # nodes
+        if scene.nodes:
+            (ids,pos,colors,widths,scales) = scene.nodeColumns()
+            radius = scales*p.nodesize
+            widths = np.where(widths == DEFAULT, p.nodewidth, widths)
+            colors = np.where((colors == DEFAULT).any(axis=1)[:,None],
+                              p.nodecolor.rgb, colors)
+            colors = (colors*255).astype(np.uint8)
+            for width in np.unique(widths):
+                members = widths == width
+                xs,ys,idx,step = sampleCircles(pos[members,0], pos[members,1],
+                                               radius[members])
+                self.plot(xs, ys, colors[members][idx], max(1, int(width)))
+
+    ###################
+    def fillRect(self, coords, fill):
+        if fill is None or fill.color is None:
+            return
+        (x1,y1,x2,y2) = (int(round(c*self.scale)) for c in coords)
+        self.pixels[max(min(y1,y2),0):max(y1,y2)+1,
+                    max(min(x1,x2),0):max(x1,x2)+1] = rgb(fill.color)
+
+    ###################
+    def fillCircle(self, coords, fill):
+        if fill is None or fill.color is None:
+            return
+        (x,y,r) = (c*self.scale for c in coords)
+        h,w,_ = self.pixels.shape
+        x1,x2 = max(int(x-r),0), min(int(x+r)+1,w)
+        y1,y2 = max(int(y-r),0), min(int(y+r)+1,h)
+        if x1 >= x2 or y1 >= y2:
+            return
+        yy,xx = np.mgrid[y1:y2, x1:x2]
+        inside = (xx-x)**2 + (yy-y)**2 <= r*r
+        self.pixels[y1:y2, x1:x2][inside] = rgb(fill.color)
+
+    #######################################################
+    # Shapes are kept by the plotter rather than the scene, so shape
+    # commands write frames due before updating them; drawing happens when
+    # a frame is rendered
+    #######################################################
+    def circle(self, x, y, r, id, linestyle, fillstyle):
+        self.advance()
+        self.shapes[id] = ('circle', (x,y,r), linestyle, fillstyle)
+
+    ###################
+    def line(self, x1, y1, x2, y2, id, linestyle):
+        self.advance()
+        self.shapes[id] = ('line', (x1,y1,x2,y2), linestyle, None)
+
+    ###################
+    def rect(self, x1, y1, x2, y2, id, linestyle, fillstyle):
+        self.advance()
+        self.shapes[id] = ('rect', (x1,y1,x2,y2), linestyle, fillstyle)
+
+    ###################
+    def delshape(self, id):
+        self.shapes.pop(id, None)
@@ -0,0 +1,116 @@
+import pickle
+
+from .TopoVis import GenericPlotter, QueuedPlotter
+
+KEYFRAME = '@keyframe'
+SNAPSHOT = '@snapshot'
+
+###############################################
+class RecordingPlotter(GenericPlotter):
+    """
+    Define a plotter that appends every scene scripting command, stamped
+    with the simulation time, to a recording file instead of drawing it.
+    The time is obtained from clock() when a clock is given, or else from
+    the latest setTime() call.
+
+    Records are written with a single pickler so that objects such as line
+    styles are stored only once.  Every keyframeInterval seconds of
+    simulation time, a snapshot of node, link, style and shape states is
+    written, after which the pickler starts afresh.  A Player can thus
+    seek to any time by restoring the closest preceding snapshot.
+    """
+
+    def __init__(self, path, clock=None, keyframeInterval=10.0, params=None):
+        GenericPlotter.__init__(self, params)
+        self.file = open(path, 'wb')
+        self.pickler = pickle.Pickler(self.file, pickle.HIGHEST_PROTOCOL)
+        self.clock = clock
+        self.time = 0.0
+        self.keyframeInterval = keyframeInterval
+        self.nextKeyframe = 0.0
+        self.shapes = {}
+
+    ###################
+    def setTime(self, time):
+        self.time = time
+
+    ###################
+    def record(self, name, args, kwargs):
+        if self.file is None:
+            return
+        time = self.clock() if self.clock is not None else self.time
+        self.pickler.dump((time,name,args,kwargs))
+        if name in QueuedPlotter.SHAPES:
+            self.shapes[args[QueuedPlotter.SHAPES[name]]] = (name,args)
+        elif name == 'delshape':
+            self.shapes.pop(args[0], None)
+        if time >= self.nextKeyframe:
+            self.keyframe(time)
+
+    ###################
+    def snapshot(self):
+        """
+        Return the state of the scene needed to redraw it from scratch
+        """
+        scene = self.scene
+        return {
+            'initialized' : scene.initialized,
+            'dim'         : scene.dim,
+            'nodes'       : [n.attributes() for n in scene.nodes.values()],
+            'links'       : list(scene.links),
+            'lineStyles'  : dict(scene.lineStyles),
+            'fillStyles'  : dict(scene.fillStyles),
+            'textStyles'  : dict(scene.textStyles),
+            'shapes'      : list(self.shapes.values()),
+        }
+
+    ###################
+    def keyframe(self, time):
+        self.pickler.dump((time,KEYFRAME,(),{}))
+        self.pickler.clear_memo()
+        self.pickler.dump((time,SNAPSHOT,(self.snapshot(),),{}))
+        self.file.flush()
+        self.nextKeyframe = time + self.keyframeInterval
+
+    ###################
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+def _recorded(name):
+    def _record_(self, *args, **kwargs):
+        self.record(name, args, kwargs)
+    _record_.__name__ = name
+    return _record_
+
+for _name in QueuedPlotter.COMMANDS:
+    setattr(RecordingPlotter, _name, _recorded(_name))
+
+###############################################
+def readRecording(path):
+    """
+    Read a file written by RecordingPlotter.  Return the list of commands as
+    (time,name,args,kwargs) tuples, and the list of keyframes as
+    (time,snapshot,index) tuples, where index is the position in the list
+    of commands of the first command following the snapshot.
+    """
+    commands = []
+    keyframes = []
+    with open(path, 'rb') as f:
+        unpickler = pickle.Unpickler(f)
+        while True:
+            try:
+                (time,name,args,kwargs) = unpickler.load()
+            except (EOFError, pickle.UnpicklingError):
+                # a truncated last record is expected if the recording
+                # process was interrupted
+                break
+            if name == KEYFRAME:
+                # the writer cleared its memo right after this record
+                unpickler = pickle.Unpickler(f)
+            elif name == SNAPSHOT:
+                keyframes.append((time,args[0],len(commands)))
+            else:
+                commands.append((time,name,args,kwargs))
+    return commands, keyframes
@@ -0,0 +1,228 @@
+"""
+Play back a scene recorded by RecordingPlotter.  Run as
+
+    python -m wsnsimpy.topovis.Replay [--speed S] [--start T] recording
+
+to replay a recording in a Tk window.  Press space to pause or resume,
+and the Left/Right arrow keys to skip backward/forward.
+"""
+import argparse
+from bisect import bisect_right
+from time import sleep, time as systime
+
+from .common import DEFAULT
+from .TopoVis import Scene, QueuedPlotter
+from .Recorder import readRecording
+
+NODE_DEFAULTS = {
+    'hollow' : DEFAULT,
+    'double' : DEFAULT,
+    'width'  : 1,
+    'color'  : (0,0,0),
+}
+
+###############################################
+class Player:
+    """
+    Replay a recording on a plotter through a private scene.  Commands are
+    applied up to a given time with advance(); seek() jumps to any time by
+    restoring the closest preceding keyframe first.
+    """
+
+    def __init__(self, path, plotter=None):
+        self.commands, self.keyframes = readRecording(path)
+        self.times = [c[0] for c in self.commands]
+        self.keyTimes = [k[0] for k in self.keyframes]
+        self.scene = Scene(realtime=True)
+        if plotter is not None:
+            self.scene.addPlotter(plotter)
+        self.shapes = {}
+        self.index = 0
+        self.time = 0.0
+
+    ###################
+    @property
+    def endTime(self):
+        return self.times[-1] if self.times else 0.0
+
+    ###################
+    @property
+    def terrainSize(self):
+        for (time,name,args,kwargs) in self.commands:
+            if name == 'init':
+                return args
+        return None
+
+    ###################
+    def addPlotter(self, plotter):
+        self.scene.addPlotter(plotter)
+
+    ###################
+    def apply(self, cmd):
+        (time,name,args,kwargs) = cmd
+        if name in QueuedPlotter.SHAPES:
+            self.shapes[args[QueuedPlotter.SHAPES[name]]] = (name,args)
+        elif name == 'delshape':
+            self.shapes.pop(args[0], None)
+        getattr(self.scene, name)(*args, **kwargs)
+
+    ###################
+    def advance(self, time):
+        """
+        Apply all commands recorded up to the specified time
+        """
+        commands = self.commands
+        while self.index < len(commands) and commands[self.index][0] <= time:
+            self.apply(commands[self.index])
+            self.index += 1
+        self.time = time
+        self.scene.setTime(time)
+
+    ###################
+    def seek(self, time):
+        """
+        Bring the scene to its state at the specified time
+        """
+        time = max(time, 0.0)
+        if time >= self.time:
+            self.advance(time)
+            return
+        k = bisect_right(self.keyTimes, time) - 1
+        if k < 0:
+            self.restore(None)
+            self.index = 0
+        else:
+            (_,snapshot,index) = self.keyframes[k]
+            self.restore(snapshot)
+            self.index = index
+        self.advance(time)
+
+    ###################
+    def skip(self, delta):
+        self.seek(self.time + delta)
+
+    ###################
+    def restore(self, snapshot):
+        """
+        Redraw the scene as described by a keyframe snapshot, or as an empty
+        scene if snapshot is None.  Nodes cannot be removed from a plotter,
+        so nodes unknown to the snapshot are only given their default look.
+        """
+        scene = self.scene
+        for id in list(self.shapes):
+            scene.delshape(id)
+        self.shapes.clear()
+        scene.clearlinks()
+        known = set() if snapshot is None else set(a['id'] for a in snapshot['nodes'])
+        for id in scene.nodes:
+            if id not in known:
+                self.restoreNode(dict(scene.nodes[id].attributes(),
+                    scale=1.0, label=str(id), hollow=DEFAULT,
+                    double=DEFAULT, width=DEFAULT, color=DEFAULT))
+        if snapshot is None:
+            return
+        if snapshot['initialized'] and not scene.initialized:
+            scene.init(*snapshot['dim'])
+        for kind in ('lineStyles','fillStyles','textStyles'):
+            define = getattr(scene, kind[:-1].lower())
+            for (id,style) in snapshot[kind].items():
+                define(id, **vars(style))
+        for attrs in snapshot['nodes']:
+            self.restoreNode(attrs)
+        for link in snapshot['links']:
+            scene.addlink(*link)
+        for cmd in snapshot['shapes']:
+            self.apply((0,)+cmd+({},))
+
+    ###################
+    def restoreNode(self, attrs):
+        scene = self.scene
+        id = attrs['id']
+        if id not in scene.nodes:
+            scene.node(id, *attrs['pos'])
+        else:
+            scene.nodemove(id, *attrs['pos'])
+        scene.nodescale(id, attrs['scale'])
+        scene.nodelabel(id, attrs['label'])
+        for attr,default in NODE_DEFAULTS.items():
+            value = attrs[attr]
+            if value == DEFAULT:
+                value = default
+            if value == DEFAULT:
+                continue
+            if attr == 'color':
+                scene.nodecolor(id, *value)
+            else:
+                getattr(scene, 'node'+attr)(id, value)
+
+    ###################
+    def play(self, speed=1.0, start=0.0, until=None, frameRate=30):
+        """
+        Replay from time start to time until (or the end of the recording),
+        speed times faster than real time, blocking until done
+        """
+        if until is None:
+            until = self.endTime
+        self.seek(start)
+        began = systime()
+        while self.time < until:
+            sleep(1.0/frameRate)
+            self.advance(min(start + (systime()-began)*speed, until))
+
+    ###################
+    def playTk(self, tkplotter, speed=1.0, start=0.0, frameRate=30, step=5.0):
+        """
+        Replay from within the main loop of a TkPlotter.Plotter, which must
+        be one of this player's plotters.  Space pauses and resumes
+        playback, and the Left/Right keys skip step seconds backward/forward.
+        """
+        self.seek(start)
+        state = {'paused' : False, 'origin' : systime(), 'base' : self.time}
+        interval = max(1, int(1000/frameRate))
+
+        def rebase():
+            state['origin'] = systime()
+            state['base'] = self.time
+
+        def toggle(event):
+            state['paused'] = not state['paused']
+            rebase()
+
+        def jump(delta):
+            def handler(event):
+                self.skip(delta)
+                rebase()
+            return handler
+
+        def tick():
+            if not state['paused'] and self.time < self.endTime:
+                self.advance(min(state['base'] + (systime()-state['origin'])*speed,
+                                 self.endTime))
+            tkplotter.tk.after(interval, tick)
+
+        tkplotter.tk.bind('<space>', toggle)
+        tkplotter.tk.bind('<Left>', jump(-step))
+        tkplotter.tk.bind('<Right>', jump(step))
+        tkplotter.tk.after(interval, tick)
+        tkplotter.tk.mainloop()
+
+###############################################
+def main():
+    parser = argparse.ArgumentParser(description='Replay a TopoVis recording')
+    parser.add_argument('recording')
+    parser.add_argument('--speed', type=float, default=1.0)
+    parser.add_argument('--start', type=float, default=0.0)
+    parser.add_argument('--step', type=float, default=5.0,
+            help='seconds skipped by the arrow keys')
+    parser.add_argument('--title', default='TopoVis Replay')
+    args = parser.parse_args()
+
+    from .TkPlotter import Plotter
+    player = Player(args.recording)
+    plotter = Plotter(windowTitle=args.title, terrain_size=player.terrainSize)
+    plotter.autoUpdate = False
+    player.addPlotter(plotter)
+    player.playTk(plotter, args.speed, args.start, step=args.step)
+
+if __name__ == '__main__':
+    main()
@@ -4,6 +4,7 @@ try:
 except ImportError:  # could be Python3
     from tkinter import *
 from . import GenericPlotter
+import numpy as np
 
 arrowMap = { 'head' : LAST, 'tail' : FIRST, 'both' : BOTH, 'none' : NONE }
 
@@ -20,11 +21,44 @@ class Plotter(GenericPlotter):
         self.nodes = {}
         self.links = {}
         self.nodeLinks = {}
+        self.nodeStyles = {}
         self.lineStyles = {}
         self.shapes = {}
         self.windowTitle = windowTitle
         self.prepareCanvas(terrain_size)
         self.lastShownTime = 0
+        self.autoUpdate = True
+
+    ###################
+    def update(self):
+        # Redraw right away unless commands are replayed in batches from
+        # within Tk's main loop, which redraws after each batch anyway
+        if self.autoUpdate:
+            self.tk.update()
+
+    ###################
+    def apply(self, commands):
+        # redraw once for the whole batch
+        autoUpdate = self.autoUpdate
+        self.autoUpdate = False
+        try:
+            GenericPlotter.apply(self, commands)
+        finally:
+            self.autoUpdate = autoUpdate
+        self.update()
+
+    ###################
+    def runQueue(self, queue, frameRate=30):
+        """
+        Replay commands collected by the QueuedPlotter queue, whose target
+        is this plotter, from within Tk's main loop at the given frame rate
+        """
+        self.autoUpdate = False
+        interval = max(1, int(1000/frameRate))
+        def drain():
+            queue.drain()
+            self.tk.after(interval, drain)
+        self.tk.after(interval, drain)
 
     ###################
     def prepareCanvas(self,terrain_size=None):
@@ -49,8 +83,8 @@ class Plotter(GenericPlotter):
         p = self.params
         c = self.canvas
         if id not in self.nodes.keys():
-            node_tag = c.create_oval(0,0,0,0)
-            label_tag = c.create_text(0,0,text=str(id))
+            node_tag = c.create_oval(0,0,0,0,tags=('node','n%s' % id))
+            label_tag = c.create_text(0,0,text=str(id),tags=('label','l%s' % id))
             self.nodes[id] = (node_tag,label_tag)
         else:
             (node_tag,label_tag) = self.nodes[id]
@@ -114,45 +148,113 @@ class Plotter(GenericPlotter):
     def node(self,id,x,y):
         self.nodeLinks[id] = []
         self.updateNodePosAndSize(id)
-        self.tk.update()
+        self.update()
 
     ###################
     def nodemove(self,id,x,y):
         self.updateNodePosAndSize(id)
-        self.tk.update()
+        self.update()
 
     ###################
     def nodecolor(self,id,r,g,b):
         (node_tag,label_tag) = self.nodes[id]
-        self.canvas.itemconfig(node_tag, outline=colorStr((r,g,b)))
-        self.canvas.itemconfigure(label_tag, fill=colorStr((r,g,b)))
-        self.tk.update()
+        color = colorStr((r,g,b))
+        self.unstyle(id, 'outline')
+        self.unstyle(id, 'fill')
+        self.canvas.itemconfig(node_tag, outline=color)
+        self.canvas.itemconfigure(label_tag, fill=color)
+        self.update()
+
+    ###################
+    def restyle(self,id,option,value):
+        """
+        Move the node's oval, or its label for the 'fill' option, to the
+        style tag '<option>:<value>' shared by all items with that value,
+        and return True if the item changed tag
+        """
+        styles = self.nodeStyles.setdefault(id, {})
+        old = styles.get(option)
+        new = '%s:%s' % (option, value)
+        if old == new:
+            return False
+        (node_tag,label_tag) = self.nodes[id]
+        item = label_tag if option == 'fill' else node_tag
+        if old is not None:
+            self.canvas.dtag(item, old)
+        self.canvas.addtag_withtag(new, item)
+        styles[option] = new
+        return True
+
+    ###################
+    def unstyle(self,id,option):
+        """
+        Take the node's item out of its style tag for option, if a bulk
+        call put it there, before the item is configured on its own
+        """
+        styles = self.nodeStyles.get(id)
+        if styles and option in styles:
+            (node_tag,label_tag) = self.nodes[id]
+            item = label_tag if option == 'fill' else node_tag
+            self.canvas.dtag(item, styles.pop(option))
+
+    ###################
+    def nodemoves(self,ids,positions):
+        for id in ids:
+            self.updateNodePosAndSize(id)
+        self.update()
+
+    ###################
+    def nodecolors(self,ids,colors):
+        colors = np.broadcast_to(colors,(len(ids),3)).tolist()
+        changed = set()
+        for id,color in zip(ids,colors):
+            color = colorStr(color)
+            if self.restyle(id, 'outline', color):
+                changed.add(color)
+            self.restyle(id, 'fill', color)
+        # configure each style tag once, whatever the number of nodes
+        for color in changed:
+            self.canvas.itemconfigure('outline:'+color, outline=color)
+            self.canvas.itemconfigure('fill:'+color, fill=color)
+        self.update()
+
+    ###################
+    def nodewidths(self,ids,widths):
+        widths = np.broadcast_to(widths,(len(ids),)).tolist()
+        changed = set()
+        for id,width in zip(ids,widths):
+            if self.restyle(id, 'width', width):
+                changed.add(width)
+        for width in changed:
+            self.canvas.itemconfigure('width:%s' % width, width=width)
+        self.update()
 
     ###################
     def nodewidth(self,id,width):
         (node_tag,label_tag) = self.nodes[id]
+        self.unstyle(id, 'width')
         self.canvas.itemconfig(node_tag, width=width)
-        self.tk.update()
+        self.update()
 
     ###################
     def nodescale(self,id,scale):
         # scale attribute has been set by TopoVis
         # just update the node
         self.updateNodePosAndSize(id)
-        self.tk.update()
+        self.update()
 
     ###################
     def nodelabel(self,id,label):
         (node_tag,label_tag) = self.nodes[id]
         self.canvas.itemconfigure(label_tag, text=self.scene.nodes[id].label)
-        self.tk.update()
+        self.update()
 
     ###################
     def addlink(self,src,dst,style):
         self.nodeLinks[src].append((src,dst,style))
         self.nodeLinks[dst].append((src,dst,style))
         self.links[(src,dst,style)] = self.createLink(src, dst, style)
-        self.tk.update()
+        self.update()
 
     ###################
     def dellink(self,src,dst,style):
@@ -160,7 +262,7 @@ class Plotter(GenericPlotter):
         self.nodeLinks[dst].remove((src,dst,style))
         self.canvas.delete(self.links[(src,dst,style)])
         del self.links[(src,dst,style)]
-        self.tk.update()
+        self.update()
 
     ###################
     def clearlinks(self):
@@ -168,7 +270,7 @@ class Plotter(GenericPlotter):
         self.links.clear()
         for n in self.nodes.keys():
             self.nodeLinks[n] = []
-        self.tk.update()
+        self.update()
 
     ###################
     def circle(self,x,y,r,id,linestyle,fillstyle):
@@ -177,7 +279,7 @@ class Plotter(GenericPlotter):
             del self.shapes[id]
         self.shapes[id] = self.canvas.create_oval(x-r,y-r,x+r,y+r)
         self.configPolygon(self.shapes[id], linestyle, fillstyle)
-        self.tk.update()
+        self.update()
 
     ###################
     def line(self,x1,y1,x2,y2,id,linestyle):
@@ -186,7 +288,7 @@ class Plotter(GenericPlotter):
             del self.shapes[id]
         self.shapes[id] = self.canvas.create_line(x1,y1,x2,y2)
         self.configLine(self.shapes[id], linestyle)
-        self.tk.update()
+        self.update()
 
     ###################
     def rect(self,x1,y1,x2,y2,id,linestyle,fillstyle):
@@ -195,10 +297,10 @@ class Plotter(GenericPlotter):
             del self.shapes[id]
         self.shapes[id] = self.canvas.create_rectangle(x1,y1,x2,y2)
         self.configPolygon(self.shapes[id], linestyle, fillstyle)
-        self.tk.update()
+        self.update()
 
     ###################
     def delshape(self,id):
         if id in self.shapes.keys():
             self.canvas.delete(self.shapes[id])
-            self.tk.update()
+            self.update()
@@ -1,16 +1,67 @@
 from time import sleep, time as systime
 from threading import Timer
 from heapq import heappush, heappop
+from collections import deque
+import functools
 import inspect
 
+import numpy as np
+
 from .common import *
 
 ###############################################
 class Node:
     """
-    Define a dummy node structure to keep track of arbitrary node attributes
+    Define a node structure to keep track of arbitrary node attributes.
+    Position, color, width and scale are stored in the scene's node columns
+    and accessed here as properties.
     """
-    pass
+    def __init__(self, scene, row):
+        self._scene = scene
+        self._row = row
+
+    @property
+    def pos(self):
+        return tuple(self._scene.nodePos[self._row].tolist())
+
+    @pos.setter
+    def pos(self, pos):
+        self._scene.nodePos[self._row] = pos
+
+    @property
+    def color(self):
+        color = self._scene.nodeColor[self._row]
+        return DEFAULT if color[0] == DEFAULT else tuple(color.tolist())
+
+    @color.setter
+    def color(self, color):
+        self._scene.nodeColor[self._row] = color
+
+    @property
+    def width(self):
+        width = self._scene.nodeWidth[self._row].item()
+        return DEFAULT if width == DEFAULT else width
+
+    @width.setter
+    def width(self, width):
+        self._scene.nodeWidth[self._row] = width
+
+    @property
+    def scale(self):
+        return self._scene.nodeScale[self._row].item()
+
+    @scale.setter
+    def scale(self, scale):
+        self._scene.nodeScale[self._row] = scale
+
+    def attributes(self):
+        """
+        Return a dict of the node's attributes
+        """
+        return {'id' : self.id, 'pos' : self.pos, 'scale' : self.scale,
+                'label' : self.label, 'hollow' : self.hollow,
+                'double' : self.double, 'width' : self.width,
+                'color' : self.color}
 
 ###############################################
 class GenericPlotter:
@@ -31,6 +82,7 @@ class GenericPlotter:
     #######################################################
     def init(self,tx,ty): pass
     def setTime(self, time): pass
+    def beforeUpdate(self): pass   # called before a command changes the scene
     def node(self,id,x,y): pass
     def nodemove(self,id,x,y): pass
     def nodehollow(self,id,flag): pass
@@ -51,34 +103,158 @@ class GenericPlotter:
     def fillstyle(self,id,**kwargs): pass
     def textstyle(self,id,**kwargs): pass
 
+    #######################################################
+    # Bulk commands may be overridden for efficiency
+    #######################################################
+    def nodemoves(self,ids,positions):
+        positions = np.broadcast_to(positions, (len(ids),2)).tolist()
+        for id,pos in zip(ids,positions):
+            self.nodemove(id,*pos)
+
+    def nodecolors(self,ids,colors):
+        colors = np.broadcast_to(colors, (len(ids),3)).tolist()
+        for id,color in zip(ids,colors):
+            self.nodecolor(id,*color)
+
+    def nodewidths(self,ids,widths):
+        widths = np.broadcast_to(widths, (len(ids),)).tolist()
+        for id,width in zip(ids,widths):
+            self.nodewidth(id,width)
+
+    ###################
+    def apply(self, commands):
+        """
+        Execute a batch of commands given as (name,args,kwargs) tuples.
+        Plotters may override this to process a batch more efficiently.
+        """
+        methods = {}
+        for (name,args,kwargs) in commands:
+            method = methods.get(name)
+            if method is None:
+                method = methods[name] = getattr(self, name)
+            method(*args, **kwargs)
+
 ###############################################
+# Names of scene scripting commands forwarded to plotters
+COMMANDS = ('init','node','nodemove','nodehollow','nodedouble',
+        'nodecolor','nodewidth','nodelabel','nodescale','addlink',
+        'dellink','clearlinks','show','circle','line','rect','delshape',
+        'linestyle','fillstyle','textstyle','nodemoves','nodecolors',
+        'nodewidths')
+
+###############################################
+class QueuedPlotter(GenericPlotter):
+    """
+    Define a plotter proxy that can be driven from any thread.  Scene
+    scripting commands are only appended to a queue; drain() must be called
+    periodically, from the thread owning the target plotter, to replay them
+    on the target.  Commands overridden within the same batch are dropped
+    on the way, e.g., shapes deleted before ever being drawn, or node
+    colors set again later in the batch.  count is the number of commands
+    queued so far, which tells whether the scene has been changing.
+    """
+
+    COMMANDS = COMMANDS
+
+    # commands whose effect is entirely replaced by a later command of the
+    # same name on the same node
+    NODE_ATTRS = ('nodemove','nodehollow','nodedouble','nodecolor',
+            'nodewidth','nodelabel','nodescale')
+
+    # position of the shape ID among arguments of shape commands
+    SHAPES = {'circle':3, 'line':4, 'rect':4}
+
+    def __init__(self, target):
+        GenericPlotter.__init__(self, target.params)
+        self.target = target
+        self.queue = deque()
+        self.time = None
+        self.count = 0
+
+    ###################
+    def setScene(self, scene):
+        GenericPlotter.setScene(self, scene)
+        self.target.setScene(scene)
+
+    ###################
+    def setTime(self, time):
+        self.time = time
+
+    ###################
+    def apply(self, commands):
+        self.queue.extend(commands)
+        self.count += len(commands)
+
+    ###################
+    def drain(self):
+        """
+        Replay all queued commands on the target plotter
+        """
+        queue = self.queue
+        batch = [queue.popleft() for _ in range(len(queue))]
+        if batch:
+            self.target.apply(self.coalesce(batch))
+        if self.time is not None:
+            self.target.setTime(self.time)
+        return len(batch)
+
+    ###################
+    def coalesce(self, batch):
+        """
+        Return the list of commands in batch that are not overridden by a
+        later command in the same batch
+        """
+        kept = []
+        seen = set()
+        deleted = set()
+        for cmd in reversed(batch):
+            (name,args,kwargs) = cmd
+            if name in self.NODE_ATTRS:
+                key = (name,args[0])
+                if key in seen:
+                    continue
+                seen.add(key)
+            elif name == 'delshape':
+                deleted.add(args[0])
+            elif name in self.SHAPES:
+                if args[self.SHAPES[name]] in deleted:
+                    continue
+            kept.append(cmd)
+        kept.reverse()
+        return kept
+
+def _queued(name):
+    def _enqueue_(self, *args, **kwargs):
+        self.queue.append((name,args,kwargs))
+        self.count += 1
+    _enqueue_.__name__ = name
+    return _enqueue_
+
+for _name in QueuedPlotter.COMMANDS:
+    setattr(QueuedPlotter, _name, _queued(_name))
+
+###############################################
+# Undecorated scene scripting commands, which only update the scene's state
+_stateUpdates = {}
+
 def informPlotters(_func_):
     """
     Invoke the instance method of the same name inside each of the registered
-    plotters 
+    plotters.  Plotters' bound methods are looked up in the scene's dispatch
+    table, which is built when plotters are added.  Plotters' beforeUpdate()
+    methods are called before the scene's state changes.
     """
+    name = _func_.__name__
+    _stateUpdates[name] = _func_
+
+    @functools.wraps(_func_)
     def _wrap_(self, *args, **kwargs):
+        for method in self.dispatch['beforeUpdate']:
+            method()
         _func_(self, *args, **kwargs)
-        for plotter in self.plotters:
-            plotter_func = getattr(plotter, _func_.__name__)
-            plotter_func(*args, **kwargs)
-
-    # code snippet for preserving function's name, doc, and signature
-    # (from http://numericalrecipes.wordpress.com/2009/05/25/signature-preserving-function-decorators/)
-    sig = list(inspect.getargspec(_func_))
-    wrap_sig = list(inspect.getargspec(_wrap_))
-    if not sig[2] :
-        sig[2] = wrap_sig[2]
-    src =  'def %s%s :\n' %(_func_.__name__, inspect.formatargspec(*sig))
-    sig[3] = None # if not, all vars with defaults are set to default value
-    src += '    return _wrap_%s\n' % (inspect.formatargspec(*sig))
-    evaldict = {'_wrap_' : _wrap_}
-    code = compile(src, '<string>', 'single')
-    #exec code in evaldict  # Python2
-    exec(code,evaldict)  # Python3
-    ret = evaldict[_func_.__name__]
-    ret.__doc__ = _func_.__doc__
-    return ret
+        for method in self.dispatch[name]:
+            method(*args, **kwargs)
+    return _wrap_
 
 ###############################################
 class Scene:
@@ -97,6 +273,9 @@ class Scene:
         immediately once invoked.
         """
         self.plotters = []
+        self.dispatch = {}   # Command name -> list of plotters' bound methods
+        self._compiled = {}  # String commands compiled by execute()
+        self._buildDispatch()
         self.time = 0.0
         self.initialized = False
         self.timescale = timescale
@@ -106,6 +285,13 @@ class Scene:
 
         self.dim = (0,0)     # Terrain dimension
         self.nodes = {}      # Nodes' information
+
+        # Node columns, one row per node in order of definition
+        self.nodeRows = {}   # Node ID -> row
+        self.nodePos = np.zeros((0,2))
+        self.nodeColor = np.zeros((0,3))
+        self.nodeWidth = np.zeros(0)
+        self.nodeScale = np.zeros(0)
         self.links = set()   # Set of links between nodes
         self.lineStyles = {} # List of defined line styles
         self.fillStyles = {} # List of defined fill styles
@@ -136,6 +322,7 @@ class Scene:
         """
         plotter.setScene(self)
         self.plotters.append(plotter)
+        self._buildDispatch()
 
     ###################
     def removePlotter(self, plotter):
@@ -143,6 +330,63 @@ class Scene:
         Remove the specified plotter from keeping track of scene scripts
         """
         self.plotters.remove(plotter)
+        self._buildDispatch()
+
+    ###################
+    def _buildDispatch(self):
+        """
+        Resolve every plotter command to the list of bound methods of all
+        registered plotters
+        """
+        self.dispatch = {name : [getattr(p, name) for p in self.plotters]
+                for name in COMMANDS + ('setTime','apply')}
+        # only plotters overriding beforeUpdate() are called before updates
+        self.dispatch['beforeUpdate'] = [p.beforeUpdate for p in self.plotters
+                if type(p).beforeUpdate is not GenericPlotter.beforeUpdate]
+
+    ###################
+    def apply(self, commands):
+        """
+        Execute a batch of scene scripting commands, given as (name,args) or
+        (name,args,kwargs) tuples.  The scene's state is updated for every
+        command, while each plotter receives the whole batch through a
+        single call to its apply() method.
+        """
+        for method in self.dispatch['beforeUpdate']:
+            method()
+        batch = []
+        for cmd in commands:
+            name,args = cmd[0],cmd[1]
+            kwargs = cmd[2] if len(cmd) > 2 else {}
+            if name in QueuedPlotter.SHAPES:
+                args = self._shapeArgs(name, args, kwargs)
+                kwargs = {}
+            else:
+                _stateUpdates[name](self, *args, **kwargs)
+            batch.append((name,args,kwargs))
+        for method in self.dispatch['apply']:
+            method(batch)
+
+    ###################
+    def _shapeArgs(self, name, args, kwargs):
+        """
+        Resolve the ID and styles of a shape command the same way as
+        circle(), line() and rect() do, and return the arguments passed on
+        to plotters
+        """
+        bound = inspect.signature(getattr(self, name)).bind(*args, **kwargs)
+        bound.apply_defaults()
+        params = bound.arguments
+        if params['id'] is None:
+            params['id'] = self._getUniqueId()
+        if not isinstance(params['line'],LineStyle):
+            params['line'] = self.lineStyles[params['line']]
+        if 'fill' in params and not isinstance(params['fill'],FillStyle):
+            params['fill'] = self.fillStyles[params['fill']]
+        if params['delay'] != INF:
+            self.executeAfter(params['delay'], self.delshape, params['id'])
+        del params['delay']
+        return tuple(params.values())
 
     ###################
     def execute(self, time, cmd, *args, **kwargs):
@@ -161,8 +405,11 @@ class Scene:
                 proc(*a,**kw)
             self.setTime(time)
         if type(cmd) is str:
-            #exec 'self.' + cmd    # Python2
-            exec('self.' + cmd)  # Python3
+            code = self._compiled.get(cmd)
+            if code is None:
+                code = compile('self.' + cmd, '<scene>', 'exec')
+                self._compiled[cmd] = code
+            exec(code, globals(), {'self' : self})
         else:
             cmd(*args, **kwargs)
 
@@ -199,8 +446,8 @@ class Scene:
         if not self.realtime:
             sleep((time-self.time)*self.timescale)
             self.time = time
-        for plotter in self.plotters:
-            plotter.setTime(time)
+        for method in self.dispatch['setTime']:
+            method(time)
 
     ###################
     @informPlotters
@@ -228,7 +475,13 @@ class Scene:
         (Scene scripting command)
         Define a node with the specified ID and location (x,y)
         """
-        self.nodes[id]        = Node()
+        row = self.nodeRows.get(id)
+        if row is None:
+            row = len(self.nodeRows)
+            self.nodeRows[id] = row
+            if row == len(self.nodeScale):
+                self._growNodeColumns()
+        self.nodes[id]        = Node(self,row)
         self.nodes[id].id     = id
         self.nodes[id].pos    = (x,y)
         self.nodes[id].scale  = 1.0
@@ -238,6 +491,35 @@ class Scene:
         self.nodes[id].width  = DEFAULT
         self.nodes[id].color  = DEFAULT
 
+    ###################
+    def _growNodeColumns(self):
+        size = max(16, 2*len(self.nodeScale))
+        grow = size - len(self.nodeScale)
+        self.nodePos = np.concatenate([self.nodePos, np.zeros((grow,2))])
+        self.nodeColor = np.concatenate([self.nodeColor, np.zeros((grow,3))])
+        self.nodeWidth = np.concatenate([self.nodeWidth, np.zeros(grow)])
+        self.nodeScale = np.concatenate([self.nodeScale, np.zeros(grow)])
+
+    ###################
+    def nodeIndex(self, ids):
+        """
+        Return the rows of the node columns holding the specified nodes
+        """
+        rows = self.nodeRows
+        return np.fromiter((rows[id] for id in ids), dtype=np.int64,
+                           count=len(ids))
+
+    ###################
+    def nodeColumns(self):
+        """
+        Return node IDs, positions, colors, widths and scales as arrays
+        with one row per node.  DEFAULT colors and widths are stored as
+        DEFAULT in all of their components.
+        """
+        n = len(self.nodeRows)
+        return (list(self.nodeRows), self.nodePos[:n], self.nodeColor[:n],
+                self.nodeWidth[:n], self.nodeScale[:n])
+
     ###################
     @informPlotters
     def nodemove(self,id,x,y):
@@ -257,6 +539,36 @@ class Scene:
         """
         self.nodes[id].color = (r,g,b)
 
+    ###################
+    @informPlotters
+    def nodemoves(self,ids,positions):
+        """
+        (Scene scripting command)
+        Move the nodes whose IDs are listed in ids to the corresponding rows
+        of positions, an array of shape (len(ids),2)
+        """
+        self.nodePos[self.nodeIndex(ids)] = positions
+
+    ###################
+    @informPlotters
+    def nodecolors(self,ids,colors):
+        """
+        (Scene scripting command)
+        Set colors of the nodes listed in ids, where colors is either one
+        (r,g,b) tuple or an array of shape (len(ids),3)
+        """
+        self.nodeColor[self.nodeIndex(ids)] = colors
+
+    ###################
+    @informPlotters
+    def nodewidths(self,ids,widths):
+        """
+        (Scene scripting command)
+        Set outline widths of the nodes listed in ids, where widths is
+        either one width or an array of them
+        """
+        self.nodeWidth[self.nodeIndex(ids)] = widths
+
     ###################
     @informPlotters
     def nodelabel(self,id,label):
@@ -356,8 +668,8 @@ class Scene:
             line = self.lineStyles[line]
         if not isinstance(fill,FillStyle):
             fill = self.fillStyles[fill]
-        for plotter in self.plotters:
-            plotter.circle(x, y, r, id, line, fill)
+        for method in self.dispatch['circle']:
+            method(x, y, r, id, line, fill)
         if delay != INF:
             self.executeAfter(delay, self.delshape, id)
         else:
@@ -378,8 +690,8 @@ class Scene:
             id = self._getUniqueId()
         if not isinstance(line,LineStyle):
             line = self.lineStyles[line]
-        for plotter in self.plotters:
-            plotter.line(x1, y1, x2, y2, id, line)
+        for method in self.dispatch['line']:
+            method(x1, y1, x2, y2, id, line)
         if delay != INF:
             self.executeAfter(delay, self.delshape, id)
         else:
@@ -402,8 +714,8 @@ class Scene:
             line = self.lineStyles[line]
         if not isinstance(fill,FillStyle):
             fill = self.fillStyles[fill]
-        for plotter in self.plotters:
-            plotter.rect(x1, y1, x2, y2, id, line, fill)
+        for method in self.dispatch['rect']:
+            method(x1, y1, x2, y2, id, line, fill)
         if delay != INF:
             self.executeAfter(delay, self.delshape, id)
         else:
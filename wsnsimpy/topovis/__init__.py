@@ -1,5 +1,7 @@
 from .TopoVis import *
 from .common import Parameters
+from .Recorder import RecordingPlotter
 
 __all__ = ['LineStyle', 'FillStyle', 'TextStyle', 'Node', 'Scene',
-		'GenericPlotter', 'Parameters']
+		'GenericPlotter', 'QueuedPlotter', 'RecordingPlotter',
+		'Parameters']
@@ -0,0 +1,233 @@
+'''
+Buffered binary event tracing for Node.log()
+'''
+from array import array
+
+import numpy as np
+
+###########################################################
+def record_dtype(max_args):
+    return np.dtype([
+        ('time','f8'),
+        ('node','i4'),
+        ('code','i4'),
+        ('nargs','u1'),
+        ('strmask','u1'),
+        ('intmask','u1'),
+        ('args','f8',(max_args,)),
+    ])
+
+###########################################################
+class Tracer:
+    '''
+    Collect log records (time, node ID, event code, args) in a fixed-size
+    in-memory ring buffer without formatting them.  The event code of a
+    record is the index of its format string in a table of interned
+    strings; numeric args are kept as numbers and other args are interned
+    as strings as well.
+
+    When path is given, the buffer is flushed to that file each time it
+    fills up, as a series of NumPy arrays: string tables added since the
+    previous flush, followed by a structured array of records.  Otherwise,
+    only the latest capacity records are kept, and strings are only kept
+    while records in the buffer refer to them; the codes of dropped strings
+    are reused.  Use load_trace() to read a trace file back.
+    '''
+
+    def __init__(self,path=None,capacity=65536,max_args=4):
+        if max_args > 8:
+            raise ValueError('max_args cannot exceed 8')
+        self.path = path
+        self.capacity = capacity
+        self.max_args = max_args
+        self.dtype = record_dtype(max_args)
+        self.strings = []
+        self._codes = {}
+        self._flushed_strings = 0
+        # reference counts of strings and free codes, in ring mode only
+        self._refs = [] if path is None else None
+        self._free = []
+        self._time = array('d',[0])*capacity
+        self._node = array('i',[0])*capacity
+        self._code = array('i',[0])*capacity
+        self._nargs = array('B',[0])*capacity
+        self._strmask = array('B',[0])*capacity
+        self._intmask = array('B',[0])*capacity
+        self._args = array('d',[0])*(capacity*max_args)
+        self._pos = 0
+        self._wrapped = False
+        self.count = 0
+        self._file = open(path,'wb') if path is not None else None
+
+    ############################
+    def _intern(self,s):
+        code = self._codes.get(s)
+        if code is None:
+            if self._free:
+                code = self._free.pop()
+                self.strings[code] = s
+            else:
+                code = len(self.strings)
+                self.strings.append(s)
+                if self._refs is not None:
+                    self._refs.append(0)
+            self._codes[s] = code
+        if self._refs is not None:
+            self._refs[code] += 1
+        return code
+
+    ############################
+    def _release(self,j):
+        '''Drop references of the record at slot j, about to be overwritten'''
+        refs = self._refs
+        codes = [self._code[j]]
+        strmask = self._strmask[j]
+        base = j*self.max_args
+        for k in range(self._nargs[j]):
+            if strmask & (1<<k):
+                codes.append(int(self._args[base+k]))
+        for code in codes:
+            refs[code] -= 1
+            if refs[code] == 0:
+                del self._codes[self.strings[code]]
+                self.strings[code] = None
+                self._free.append(code)
+
+    ############################
+    def record(self,time,node,fmt,args=()):
+        '''
+        Append a record telling that node logged fmt.format(*args) at the
+        given time
+        '''
+        if len(args) > self.max_args:
+            args = (fmt.format(*args),)
+            fmt = '{}'
+        j = self._pos
+        if j == self.capacity:
+            if self._file is not None:
+                self.flush()
+            else:
+                self._wrapped = True
+            j = 0
+        if self._wrapped:
+            self._release(j)
+        self._time[j] = time
+        self._node[j] = node
+        self._code[j] = self._intern(fmt)
+        strmask = intmask = 0
+        base = j*self.max_args
+        for k,a in enumerate(args):
+            t = type(a)
+            if t is float:
+                self._args[base+k] = a
+            elif t is int:
+                self._args[base+k] = a
+                intmask |= 1<<k
+            else:
+                self._args[base+k] = self._intern(str(a))
+                strmask |= 1<<k
+        self._nargs[j] = len(args)
+        self._strmask[j] = strmask
+        self._intmask[j] = intmask
+        self._pos = j+1
+        self.count += 1
+
+    ############################
+    def _records(self,lo,hi):
+        recs = np.empty(hi-lo,dtype=self.dtype)
+        recs['time'] = np.frombuffer(self._time,dtype='f8')[lo:hi]
+        recs['node'] = np.frombuffer(self._node,dtype='i4')[lo:hi]
+        recs['code'] = np.frombuffer(self._code,dtype='i4')[lo:hi]
+        recs['nargs'] = np.frombuffer(self._nargs,dtype='u1')[lo:hi]
+        recs['strmask'] = np.frombuffer(self._strmask,dtype='u1')[lo:hi]
+        recs['intmask'] = np.frombuffer(self._intmask,dtype='u1')[lo:hi]
+        recs['args'] = np.frombuffer(self._args,dtype='f8').reshape(
+                -1,self.max_args)[lo:hi]
+        return recs
+
+    ############################
+    def records(self):
+        '''Return buffered records in chronological order'''
+        if self._wrapped:
+            return np.concatenate([self._records(self._pos,self.capacity),
+                                   self._records(0,self._pos)])
+        return self._records(0,self._pos)
+
+    ############################
+    def flush(self):
+        '''Write buffered records and new strings to the trace file'''
+        if self._file is None:
+            return
+        new = self.strings[self._flushed_strings:]
+        if new:
+            np.save(self._file,np.array(new,dtype=str))
+            self._flushed_strings = len(self.strings)
+        if self._pos:
+            np.save(self._file,self._records(0,self._pos))
+        self._file.flush()
+        self._pos = 0
+
+    ############################
+    def close(self):
+        if self._file is not None:
+            self.flush()
+            self._file.close()
+            self._file = None
+
+    ############################
+    def columns(self):
+        '''Return buffered records as columns, like load_trace()'''
+        return _columns(self.records(),list(self.strings))
+
+###########################################################
+def _columns(recs,strings):
+    cols = {name:recs[name] for name in recs.dtype.names}
+    cols['strings'] = strings
+    return cols
+
+###########################################################
+def load_trace(path):
+    '''
+    Read a trace file written by a Tracer and return a dict of columns:
+    NumPy arrays time, node, code, nargs, strmask, intmask and args, plus
+    the list of interned strings
+    '''
+    strings,chunks = [],[]
+    with open(path,'rb') as f:
+        while True:
+            try:
+                a = np.load(f)
+            except (EOFError,ValueError):
+                break
+            if a.dtype.names is None:
+                strings.extend(a.tolist())
+            else:
+                chunks.append(a)
+    if chunks:
+        recs = np.concatenate(chunks)
+    else:
+        recs = np.empty(0,dtype=record_dtype(4))
+    return _columns(recs,strings)
+
+###########################################################
+def format_trace(trace):
+    '''
+    Generate log lines of a trace, as returned by load_trace() or
+    Tracer.columns(), in the format used by Node.log()
+    '''
+    strings = trace['strings']
+    for time,node,code,nargs,strmask,intmask,args in zip(
+            trace['time'].tolist(),trace['node'].tolist(),
+            trace['code'].tolist(),trace['nargs'].tolist(),
+            trace['strmask'].tolist(),trace['intmask'].tolist(),
+            trace['args'].tolist()):
+        values = []
+        for k in range(nargs):
+            if strmask & (1<<k):
+                values.append(strings[int(args[k])])
+            elif intmask & (1<<k):
+                values.append(int(args[k]))
+            else:
+                values.append(args[k])
+        msg = strings[code].format(*values) if nargs else strings[code]
+        yield f"Node {'#'+str(node):4}[{time:10.5f}] {msg}"
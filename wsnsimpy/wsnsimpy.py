@@ -1,19 +1,38 @@
-from collections import deque
+from array import array
+from collections import OrderedDict, deque
+from heapq import heappush, heappop
+from itertools import count
 import bisect
 import inspect
+import math
 import random
+from time import monotonic, sleep
+import numpy as np
 import simpy
+import simpy.rt
 from simpy.util import start_delayed
 
 BROADCAST_ADDR = 0xFFFF
 
+###########################################################
+def is_generator_function(func):
+    '''
+    Return True if func (possibly a bound method) is a generator function.
+    This is a cheaper version of inspect.isgeneratorfunction() for the
+    common cases.
+    '''
+    code = getattr(getattr(func,'__func__',func),'__code__',None)
+    if code is None:
+        return inspect.isgeneratorfunction(func)
+    return bool(code.co_flags & inspect.CO_GENERATOR)
+
 ###########################################################
 def ensure_generator(env,func,*args,**kwargs):
     '''
     Make sure that func is a generator function.  If it is not, return a
     generator wrapper
     '''
-    if inspect.isgeneratorfunction(func):
+    if is_generator_function(func):
         return func(*args,**kwargs)
     else:
         def _wrapper():
@@ -21,14 +40,282 @@ def ensure_generator(env,func,*args,**kwargs):
             yield env.timeout(0)
         return _wrapper()
 
+###########################################################
+class Environment(simpy.Environment):
+    '''
+    SimPy environment that additionally serves a heap of plain-function
+    callbacks, [time,seq,func,args,kwargs], without creating any SimPy
+    event or process for them.  At equal times, SimPy events go first.
+    A scheduled callback can be cancelled; it is then only discarded when
+    it reaches the top of the heap.
+    '''
+
+    def __init__(self,*args,**kwargs):
+        super().__init__(*args,**kwargs)
+        self._callbacks = []
+        self._callback_seq = count()
+
+    def schedule_call(self,delay,func,args=(),kwargs={}):
+        '''
+        Call func(*args,**kwargs) after delay, and return a handle that can
+        be passed to cancel_call()
+        '''
+        entry = [self._now+delay,next(self._callback_seq),func,args,kwargs]
+        heappush(self._callbacks,entry)
+        return entry
+
+    def cancel_call(self,entry):
+        '''Cancel a callback scheduled by schedule_call(), if still pending'''
+        entry[2] = None
+        entry[3] = entry[4] = None
+
+    def _discard_cancelled(self):
+        callbacks = self._callbacks
+        while callbacks and callbacks[0][2] is None:
+            heappop(callbacks)
+
+    def peek(self):
+        time = super().peek()
+        self._discard_cancelled()
+        if self._callbacks and self._callbacks[0][0] < time:
+            return self._callbacks[0][0]
+        return time
+
+    def step(self):
+        callbacks = self._callbacks
+        if callbacks and callbacks[0][2] is None:
+            self._discard_cancelled()
+        if callbacks and (not self._queue or callbacks[0][0] < self._queue[0][0]):
+            self._wait_until(callbacks[0][0])
+            self._now,_,func,args,kwargs = heappop(callbacks)
+            func(*args,**kwargs)
+        else:
+            super().step()
+
+    def _wait_until(self,time):
+        pass
+
+###########################################################
+class RealtimeEnvironment(Environment,simpy.rt.RealtimeEnvironment):
+    '''
+    Real-time version of Environment, which also synchronizes callbacks
+    with the wall-clock time
+    '''
+
+    def _wait_until(self,time):
+        delta = self.real_start + (time-self.env_start)*self.factor - monotonic()
+        if delta > 0:
+            sleep(delta)
+
+###########################################################
+class HybridEnvironment(Environment):
+    '''
+    Environment that only synchronizes with the wall-clock time while
+    something visible is going on, and otherwise runs at full speed.
+
+    probe() is polled before each step and must return a value that changes
+    whenever something visible happens, e.g., the number of scene commands
+    issued so far.  Events up to hold seconds of simulation time after the
+    last change are paced by factor seconds of wall-clock time per second of
+    simulation time; later events, and all events while probe is None, run
+    without sleeping.  Pacing restarts from the current wall-clock time
+    after an idle stretch, so skipped time is never caught up with.
+
+    lag tells how many seconds of wall-clock time the last paced event ran
+    behind schedule, and max_lag is the largest lag seen so far.
+    '''
+
+    def __init__(self,factor=1.0,hold=1.0,probe=None,*args,**kwargs):
+        super().__init__(*args,**kwargs)
+        self.factor = factor
+        self.hold = hold
+        self.probe = probe
+        self.lag = 0.0
+        self.max_lag = 0.0
+        self._last_probe = None
+        self._active_until = -math.inf
+        self._anchor = None
+
+    def step(self):
+        if self.probe is not None:
+            self._pace()
+        Environment.step(self)
+
+    def _pace(self):
+        value = self.probe()
+        if value != self._last_probe:
+            self._last_probe = value
+            self._active_until = self._now + self.hold
+        time = self.peek()
+        if time > self._active_until:
+            self._anchor = None
+            self.lag = 0.0
+            return
+        if self._anchor is None:
+            self._anchor = (monotonic(),self._now)
+        real,start = self._anchor
+        delta = real + (time-start)*self.factor - monotonic()
+        if delta > 0:
+            self.lag = 0.0
+            sleep(delta)
+        else:
+            self.lag = -delta
+            if self.lag > self.max_lag:
+                self.max_lag = self.lag
+
 ###########################################################
 def distance(pos1,pos2):
-    return ((pos1[0]-pos2[0])**2 + (pos1[1]-pos2[1])**2)**0.5
+    dx = pos1[0]-pos2[0]
+    dy = pos1[1]-pos2[1]
+    return math.sqrt(dx*dx + dy*dy)
 
 ###########################################################
 class Stat:
     pass
 
+###########################################################
+class StatRegistry:
+    '''
+    Simulator-wide statistics store.  Each counter is a column named
+    "<layer>.<counter>" and indexed by node ID, so that statistics of all
+    nodes can be aggregated or exported with a few array operations.
+    Columns are kept as typed arrays from the array module, which are cheap
+    to update one element at a time, and are exported as NumPy arrays.
+    Integer columns, which also hold booleans, are widened to float when
+    first assigned a float.
+    '''
+
+    def __init__(self):
+        self.columns = {}
+        self.size = 0
+        self._layers = {}
+
+    @staticmethod
+    def typecode(dtype):
+        '''
+        Return the array typecode of counters of type dtype, which may be a
+        Python or NumPy number type, or None if dtype is not a number type
+        '''
+        if issubclass(dtype,(float,np.floating)):
+            return 'd'
+        if issubclass(dtype,(int,np.integer,np.bool_)):
+            return 'q'
+        return None
+
+    def declare(self,name,dtype=int):
+        '''Create the named counter column unless it already exists'''
+        if name not in self.columns:
+            code = self.typecode(dtype)
+            if code is None:
+                raise TypeError('counter {} must be a number, not {}'
+                        .format(name,dtype.__name__))
+            col = array(code,[0])*self.size
+            self.columns[name] = col
+            layer,counter = name.split('.',1)
+            self._layers.setdefault(layer,{})[counter] = col
+        return self.columns[name]
+
+    def widen(self,name):
+        '''
+        Convert the named integer column to float and return the new column.
+        Layers keeping a reference to the old column must fetch it again.
+        '''
+        col = array('d',self.columns[name])
+        self.columns[name] = col
+        layer,counter = name.split('.',1)
+        self._layers[layer][counter] = col
+        return col
+
+    def resize(self,size):
+        '''Make room for nodes with IDs up to size-1'''
+        if size > self.size:
+            for col in self.columns.values():
+                col.extend(array(col.typecode,[0])*(size-self.size))
+            self.size = size
+
+    def counters(self,layer):
+        '''
+        Return a dict mapping counter names of the given layer to their
+        columns, for layers that update counters directly by node ID
+        '''
+        return self._layers.setdefault(layer,{})
+
+    def view(self,layer,index,**counters):
+        '''
+        Return a StatView of the given layer for node ID index, declaring
+        the given counters, each mapped to its type, and resetting them to
+        zero
+        '''
+        self.resize(index+1)
+        for name,dtype in counters.items():
+            self.declare(layer+'.'+name,dtype)[index] = 0
+        return StatView(self,layer,index)
+
+    def snapshot(self):
+        '''Return a copy of all columns as a dict of NumPy arrays'''
+        return {name:np.array(col) for name,col in self.columns.items()}
+
+    def totals(self):
+        '''Return the sum of each counter over all nodes'''
+        return {name:sum(col) for name,col in self.columns.items()}
+
+    def to_dataframe(self):
+        '''Return all columns as a pandas DataFrame indexed by node ID'''
+        import pandas
+        frame = pandas.DataFrame(self.snapshot())
+        frame.index.name = 'node'
+        return frame
+
+###########################################################
+class StatView:
+    '''
+    Per-node view of one layer's counters in a StatRegistry, which are read
+    and updated as attributes, e.g., self.stat.total_tx += 1.  Numbers are
+    kept in the registry; other values, such as None or lists, are stored
+    in the view only, as with a plain Stat.
+    '''
+    __slots__ = ('_registry','_layer','_columns','_index','_extra')
+
+    def __init__(self,registry,layer,index):
+        object.__setattr__(self,'_registry',registry)
+        object.__setattr__(self,'_layer',layer)
+        object.__setattr__(self,'_columns',registry.counters(layer))
+        object.__setattr__(self,'_index',index)
+        object.__setattr__(self,'_extra',{})
+
+    def __reduce__(self):
+        return (StatView,(self._registry,self._layer,self._index),self._extra)
+
+    def __setstate__(self,extra):
+        self._extra.update(extra)
+
+    def __getattr__(self,name):
+        extra = self._extra
+        if extra and name in extra:
+            return extra[name]
+        try:
+            return self._columns[name][self._index]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def __setattr__(self,name,value):
+        try:
+            self._columns[name][self._index] = value
+        except (KeyError,TypeError):
+            code = StatRegistry.typecode(type(value))
+            if code is None:
+                self._extra[name] = value
+                return
+            key = self._layer+'.'+name
+            col = self._columns.get(name)
+            if col is None:
+                col = self._registry.declare(key,type(value))
+            elif code == 'd' and col.typecode == 'q':
+                col = self._registry.widen(key)
+            col[self._index] = float(value) if col.typecode == 'd' else int(value)
+        if self._extra:
+            self._extra.pop(name,None)
+
 ###########################################################
 class Node:
     tx_range = 0
@@ -39,7 +326,12 @@ class Node:
         self.sim = sim
         self.id  = id
         self.logging = True
-        self.neighbor_distance_list = []
+        self.neighbor_dists = array('d')
+        self.neighbor_ids = array('i')
+        # distance up to which the neighbor lists were built
+        self._list_range = 0
+        self._cell = None
+        self._timers = {}
         self.timeout = self.sim.timeout
 
     ############################
@@ -56,31 +348,63 @@ class Node:
         return self.sim.env.now
 
     ############################
-    def log(self,msg):
+    def log(self,msg,*args):
+        '''
+        Log msg.format(*args).  When the simulator has a tracer, the message
+        is recorded unformatted in the tracer's buffer instead of printed.
+        '''
         if self.logging:
+            tracer = self.sim.tracer
+            if tracer is not None:
+                tracer.record(self.sim.env._now,self.id,msg,args)
+                return
+            if args:
+                msg = msg.format(*args)
             print(f"Node {'#'+str(self.id):4}[{self.now:10.5f}] {msg}")
 
+    ############################
+    @property
+    def neighbor_distance_list(self):
+        '''
+        List of (distance,node) pairs sorted by distance, built from
+        neighbor_dists and neighbor_ids.  Kept for compatibility; changing
+        the list does not change the node's neighbors.
+        '''
+        nodes = self.sim.nodes
+        return [(dist,nodes[id]) for dist,id in
+                zip(self.neighbor_dists,self.neighbor_ids)]
+
+    ############################
+    def check_range(self):
+        '''
+        Extend the neighbor lists if tx_range has grown beyond the distance
+        they were built for.  Called before the lists are used, so that
+        tx_range may be changed at any time.
+        '''
+        if self.tx_range > self._list_range:
+            self.sim.update_neighbor_list(self.id)
+
     ############################
     def send(self,dst,*args,**kwargs):
-        for (dist,node) in self.neighbor_distance_list:
+        if self.tx_range > self._list_range:
+            self.check_range()
+        nodes = self.sim.nodes
+        for dist,id in zip(self.neighbor_dists,self.neighbor_ids):
             if dist <= self.tx_range:
-                if dst == BROADCAST_ADDR or dst is node.id:
+                if dst == BROADCAST_ADDR or dst == id:
                     prop_time = dist/1000000
                     self.delayed_exec(
-                            prop_time,node.on_receive,self.id,*args,**kwargs)
+                            prop_time,nodes[id].on_receive,self.id,*args,**kwargs)
             else:
                 break
 
     ############################
     @property
     def neighbors(self):
-        _neighbors = []
-        for (dist,node) in self.neighbor_distance_list:
-            if dist <= self.tx_range:
-                _neighbors.append(node)
-            else:
-                break
-        return _neighbors
+        self.check_range()
+        k = bisect.bisect_right(self.neighbor_dists,self.tx_range)
+        nodes = self.sim.nodes
+        return [nodes[id] for id in self.neighbor_ids[:k]]
 
     ############################
     def create_event(self):
@@ -98,6 +422,56 @@ class Node:
     def delayed_exec(self,delay,func,*args,**kwargs):
         return self.sim.delayed_exec(delay,func,*args,**kwargs)
 
+    ############################
+    def set_timer(self,name,delay,*args,**kwargs):
+        '''
+        Call on_timer_fired(name,*args,**kwargs) after delay.  Setting a
+        timer that is already pending replaces it.  Timers are callbacks on
+        the environment's shared heap, so a cancelled timer costs nothing
+        more than being discarded when its time comes.
+        '''
+        timer = self._timers.get(name)
+        if timer is not None:
+            self.sim.env.cancel_call(timer)
+        self._timers[name] = self.sim.env.schedule_call(
+                delay,self._fire_timer,(name,args,kwargs))
+
+    ############################
+    def cancel_timer(self,name):
+        '''
+        Cancel a pending timer.  Return True if the timer was pending.
+        '''
+        timer = self._timers.pop(name,None)
+        if timer is None:
+            return False
+        self.sim.env.cancel_call(timer)
+        return True
+
+    ############################
+    def reset_timer(self,name,delay):
+        '''
+        Restart a timer with a new delay, keeping the arguments it was set
+        with.  A timer that is not pending is set without arguments.
+        '''
+        timer = self._timers.get(name)
+        if timer is None:
+            self.set_timer(name,delay)
+        else:
+            (_,args,kwargs) = timer[3]
+            self.set_timer(name,delay,*args,**kwargs)
+
+    ############################
+    def timer_pending(self,name):
+        return name in self._timers
+
+    ############################
+    def _fire_timer(self,name,args,kwargs):
+        del self._timers[name]
+        if is_generator_function(self.on_timer_fired):
+            self.sim.env.process(self.on_timer_fired(name,*args,**kwargs))
+        else:
+            self.on_timer_fired(name,*args,**kwargs)
+
     ############################
     def init(self):
         pass
@@ -117,8 +491,8 @@ class Node:
         pass
 
     ############################
-    def on_timer_fired(self,*args,**kwargs):
-        '''To be overriden'''
+    def on_timer_fired(self,name,*args,**kwargs):
+        '''To be overriden; called when the timer set by set_timer() fires'''
         pass
 
     ############################
@@ -134,44 +508,130 @@ class PDU:
         for f in fields:
             setattr(self,f,fields[f])
 
+###########################################################
+class CompactPDU:
+    '''
+    Base class for fixed-layout PDUs used by the default layers.  Fields are
+    declared with __slots__ so that no per-instance dict is allocated, and
+    the layer name is a class attribute.  An encapsulating PDU only refers
+    to its payload and accounts for the header bits in nbits.
+    '''
+    __slots__ = ('nbits',)
+    layer = None
+
+###########################################################
+class AppPDU(CompactPDU):
+    __slots__ = ('args','kwargs','priority')
+    layer = 'app'
+
+    def __init__(self,nbits,args,kwargs,priority=None):
+        self.nbits = nbits
+        self.args = args
+        self.kwargs = kwargs
+        self.priority = priority
+
+###########################################################
+class NetPDU(CompactPDU):
+    __slots__ = ('src','dst','payload','seq','priority')
+    layer = 'net'
+
+    def __init__(self,header_bits,src,dst,payload,seq=None,priority=None):
+        self.nbits = payload.nbits + header_bits
+        self.src = src
+        self.dst = dst
+        self.payload = payload
+        self.seq = seq
+        self.priority = priority
+
+###########################################################
+class MacFrame(CompactPDU):
+    __slots__ = ('src','dst','payload','seq')
+    layer = 'mac'
+    type = 'data'
+
+    def __init__(self,header_bits,src,dst,payload,seq=None):
+        self.nbits = payload.nbits + header_bits
+        self.src = src
+        self.dst = dst
+        self.payload = payload
+        self.seq = seq
+
+###########################################################
+class MacAck(CompactPDU):
+    __slots__ = ('for_frame','seq')
+    layer = 'mac'
+    type = 'ack'
+
+    def __init__(self,nbits,for_frame,seq=None):
+        self.nbits = nbits
+        self.for_frame = for_frame
+        self.seq = seq
+
 ###########################################################
 class DefaultPhyLayer:
 
     LAYER_NAME = 'phy'
 
-    def __init__(self,node,bitrate=250e3,ber=0):
+    # Neighbors whose propagation delays are equal share a single rx-start
+    # and a single rx-end event per transmission.  Propagation delays are
+    # rounded up to a multiple of prop_delay_quantum (in seconds); the
+    # default of 1 us, i.e., 300 m, yields exactly one pair of events per
+    # transmission for any tx_range up to 300 m.  A quantum of 0 or None
+    # keeps exact delays, and one pair of events per distinct delay.
+    PROP_DELAY_QUANTUM = 1e-6
+
+    def __init__(self,node,bitrate=250e3,ber=0,
+                 prop_delay_quantum=PROP_DELAY_QUANTUM):
         self.node = node
         self.bitrate = bitrate
         self.ber = ber
+        self.prop_delay_quantum = prop_delay_quantum
         self._current_rx_count = 0
         self._channel_busy_start = 0
 
-        self.stat = Stat()
-        self.stat.total_tx = 0
-        self.stat.total_rx = 0
-        self.stat.total_collision = 0
-        self.stat.total_error = 0
-        self.stat.total_bits_tx = 0
-        self.stat.total_bits_rx = 0
-        self.stat.total_channel_busy = 0
-        self.stat.total_channel_tx = 0
+        self.stat = node.sim.stats.view(self.LAYER_NAME,node.id,
+                total_tx=int,
+                total_rx=int,
+                total_collision=int,
+                total_error=int,
+                total_bits_tx=int,
+                total_bits_rx=int,
+                total_channel_busy=float,
+                total_channel_tx=float)
+        self._counters = node.sim.stats.counters(self.LAYER_NAME)
 
     def send_pdu(self,pdu):
+        self.node.check_range()
         tx_time = pdu.nbits/self.bitrate
         self.on_tx_start(pdu)
         self.node.delayed_exec(tx_time,self.on_tx_end,pdu)
-        self.stat.total_tx += 1
-        self.stat.total_bits_tx += pdu.nbits
-        self.stat.total_channel_tx += tx_time
-        for (dist,node) in self.node.neighbor_distance_list:
-            if dist <= self.node.tx_range:
+        stat,id = self._counters,self.node.id
+        stat['total_tx'][id] += 1
+        stat['total_bits_tx'][id] += pdu.nbits
+        stat['total_channel_tx'][id] += tx_time
+        quantum = self.prop_delay_quantum
+        receivers = {}
+        nodes = self.node.sim.nodes
+        tx_range = self.node.tx_range
+        for dist,id in zip(self.node.neighbor_dists,self.node.neighbor_ids):
+            if dist <= tx_range:
                 prop_time = dist/3e8
-                self.node.delayed_exec(
-                        prop_time,node.phy.on_rx_start,pdu)
-                self.node.delayed_exec(
-                        prop_time+tx_time,node.phy.on_rx_end,pdu)
+                if quantum:
+                    prop_time = math.ceil(prop_time/quantum)*quantum
+                receivers.setdefault(prop_time,[]).append(nodes[id].phy)
             else:
                 break
+        for prop_time,phys in receivers.items():
+            self.node.delayed_exec(prop_time,self._start_rx_all,phys,pdu)
+            self.node.delayed_exec(prop_time+tx_time,self._end_rx_all,phys,pdu)
+
+    def _start_rx_all(self,phys,pdu):
+        for phy in phys:
+            phy.on_rx_start(pdu)
+
+    def _end_rx_all(self,phys,pdu):
+        for phy in phys:
+            phy.on_rx_end(pdu)
 
     def on_tx_start(self,pdu):
         pass
@@ -190,21 +650,22 @@ class DefaultPhyLayer:
             self._channel_busy_start = self.node.now
 
     def on_rx_end(self,pdu):
+        stat,id = self._counters,self.node.id
         self._current_rx_count -= 1
         if self._current_rx_count != 0:
             self._collision = True
         else:
-            self.stat.total_channel_busy += self.node.now - self._channel_busy_start
+            stat['total_channel_busy'][id] += self.node.now - self._channel_busy_start
             self._channel_busy_start = 0
         if not self._collision:
             if self.node.sim.random.random() < (1-self.ber)**pdu.nbits:
                 self.node.mac.on_receive_pdu(pdu)
-                self.stat.total_rx += 1
-                self.stat.total_bits_rx += pdu.nbits
+                stat['total_rx'][id] += 1
+                stat['total_bits_rx'][id] += pdu.nbits
             else:
-                self.stat.total_error += 1
+                stat['total_error'][id] += 1
         else:
-            self.stat.total_collision += 1
+            stat['total_collision'][id] += 1
 
     def on_collision(self,pdu):
         pass
@@ -214,25 +675,217 @@ class DefaultPhyLayer:
         return self._current_rx_count == 0
 
 
+###########################################################
+class DuplicateCache:
+    '''
+    Bounded record of recently received (src,seq) keys, used by layers to
+    drop retransmitted copies of PDUs they have already passed up.  At most
+    capacity keys are kept, the least recently seen being evicted first.
+    When lifetime is given, a key seen longer than lifetime seconds ago no
+    longer counts as a duplicate; lifetime should be shorter than the time
+    a sender takes to wrap around its sequence numbers.
+    '''
+
+    def __init__(self,capacity=16,lifetime=None):
+        self.capacity = capacity
+        self.lifetime = lifetime
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def seen(self,key,now):
+        '''
+        Return True if key was seen before and has not expired; record key
+        as seen at time now in any case
+        '''
+        entries = self._entries
+        time = entries.get(key)
+        entries[key] = now
+        entries.move_to_end(key)
+        if time is not None and (self.lifetime is None or now-time <= self.lifetime):
+            return True
+        if len(entries) > self.capacity:
+            entries.popitem(last=False)
+        return False
+
+###########################################################
+def frame_priority(frame,layer_priority):
+    '''
+    Return the priority of the outermost PDU carried by frame whose
+    priority is set, or else the priority layer_priority gives to the
+    layer of the innermost PDU carried by frame
+    '''
+    pdu = frame
+    while True:
+        priority = getattr(pdu,'priority',None)
+        if priority is not None:
+            return priority
+        payload = getattr(pdu,'payload',None)
+        if not hasattr(payload,'layer'):
+            return layer_priority.get(pdu.layer,0)
+        pdu = payload
+
+###########################################################
+class TxQueue:
+    '''
+    Transmit queue of a MAC layer, holding at most capacity frames, or any
+    number of them when capacity is None.  The frame at the head is the one
+    being sent and is never dropped.  When a frame arrives at a full queue,
+    policy selects the frame to drop:
+
+    - 'tail': the arriving frame
+    - 'head': the oldest frame waiting behind the head
+    - 'priority': the newest of the frames with the lowest
+      frame_priority(), which is set by senders, e.g., with
+      LayeredNode.send(...,priority=1) or on a NetPDU, and otherwise
+      derived from LAYER_PRIORITY, so that control packets can be kept in
+      favor of application data
+
+    The time spent at each queue length is accumulated in time_at, and the
+    integral of the queue length over time is added to area[index] when an
+    area column is given.  Besides the methods below, the queue supports
+    len(), indexing and iteration, like the deque it replaces.
+    '''
+
+    POLICIES = ('tail','head','priority')
+    LAYER_PRIORITY = {'app':0,'net':1,'mac':2}
+
+    def __init__(self,env,capacity=None,policy='tail',area=None,index=None):
+        if policy not in self.POLICIES:
+            raise ValueError('unknown drop policy {!r}'.format(policy))
+        if capacity is not None and capacity < 1:
+            raise ValueError('queue capacity must be at least 1')
+        self.capacity = capacity
+        self.policy = policy
+        self.time_at = array('d',[0.0])
+        self._frames = deque()
+        self._env = env
+        self._area = area
+        self._index = index
+        self._since = env.now
+
+    def __len__(self):
+        return len(self._frames)
+
+    def __getitem__(self,i):
+        return self._frames[i]
+
+    def __iter__(self):
+        return iter(self._frames)
+
+    def flush(self):
+        '''Account for the time elapsed since the latest change'''
+        now = self._env.now
+        n = len(self._frames)
+        elapsed = now - self._since
+        if elapsed > 0:
+            while len(self.time_at) <= n:
+                self.time_at.append(0.0)
+            self.time_at[n] += elapsed
+            if self._area is not None:
+                self._area[self._index] += n*elapsed
+        self._since = now
+
+    def mean_length(self):
+        '''Return the time-weighted average queue length so far'''
+        self.flush()
+        total = sum(self.time_at)
+        if total == 0:
+            return 0.0
+        return sum(n*t for n,t in enumerate(self.time_at))/total
+
+    def append(self,frame):
+        '''
+        Queue frame, and return the frame dropped to make room for it, if
+        any, which may be frame itself
+        '''
+        self.flush()
+        frames = self._frames
+        if self.capacity is None or len(frames) < self.capacity:
+            frames.append(frame)
+            return None
+        if self.policy == 'tail' or len(frames) == 1:
+            return frame
+        if self.policy == 'head':
+            victim = 1
+        else:
+            prio = self.LAYER_PRIORITY
+            victim = None
+            lowest = frame_priority(frame,prio)
+            for i in range(len(frames)-1,0,-1):
+                level = frame_priority(frames[i],prio)
+                if level < lowest:
+                    victim,lowest = i,level
+            if victim is None:
+                return frame
+        dropped = frames[victim]
+        del frames[victim]
+        frames.append(frame)
+        return dropped
+
+    def extend(self,frames):
+        '''Queue each of frames in turn, and return the list of dropped frames'''
+        dropped = (self.append(frame) for frame in frames)
+        return [frame for frame in dropped if frame is not None]
+
+    def appendleft(self,frame):
+        '''
+        Put frame at the head of the queue, e.g., to send it again right
+        away, and return the frame dropped from the tail if the queue was
+        full
+        '''
+        self.flush()
+        frames = self._frames
+        frames.appendleft(frame)
+        if self.capacity is not None and len(frames) > self.capacity:
+            return frames.pop()
+        return None
+
+    def popleft(self):
+        self.flush()
+        return self._frames.popleft()
+
+    def clear(self):
+        self.flush()
+        self._frames.clear()
+
 ###########################################################
 class DefaultMacLayer:
+    '''
+    Default MAC retrying unicast frames until they are acknowledged.
+    Frames carry a 16-bit sequence number, which cannot wrap around within
+    dup_lifetime at the rate frames are sent; ACKs are matched on it, and
+    retransmitted copies of a frame already received are acknowledged
+    again but not passed up.  Frames are queued in a TxQueue of the given
+    capacity and drop policy.
+    '''
 
     LAYER_NAME = 'mac'
     HEADER_BITS = 64
 
-    def __init__(self,node):
+    def __init__(self,node,dup_capacity=16,dup_lifetime=1.0,
+                 queue_capacity=None,queue_policy='tail'):
         self.node = node
-        self.tx_queue = deque()
         self.ack_event = None
-        self.stat = Stat()
-        self.stat.total_tx_broadcast = 0
-        self.stat.total_tx_unicast = 0
-        self.stat.total_rx_broadcast = 0
-        self.stat.total_rx_unicast = 0
-        self.stat.total_retransmit = 0
-        self.stat.total_ack = 0
+        self._seq = 0
+        self.duplicates = DuplicateCache(dup_capacity,dup_lifetime)
+        self.stat = node.sim.stats.view(self.LAYER_NAME,node.id,
+                total_tx_broadcast=int,
+                total_tx_unicast=int,
+                total_rx_broadcast=int,
+                total_rx_unicast=int,
+                total_retransmit=int,
+                total_ack=int,
+                total_duplicate=int,
+                total_queue_drop=int,
+                queue_length_time=float)
+        self._counters = node.sim.stats.counters(self.LAYER_NAME)
+        self.tx_queue = TxQueue(node.sim.env,queue_capacity,queue_policy,
+                self._counters['queue_length_time'],node.id)
 
     def process_queue(self):
+        stat,id = self._counters,self.node.id
         retries = 0
         while self.tx_queue:
             frame = self.tx_queue[0]
@@ -259,67 +912,235 @@ class DefaultMacLayer:
                 if self.ack_event.triggered:
                     retries = 0
                     self.tx_queue.popleft()
-                    self.stat.total_tx_unicast += 1
+                    stat['total_tx_unicast'][id] += 1
                 else:
                     retries += 1
                     backoff_time = self.node.sim.random.randrange(2**retries)*5e-3
                     yield self.node.timeout(backoff_time)
-                    self.stat.total_retransmit += 1
+                    stat['total_retransmit'][id] += 1
             else:
                 retries = 0
                 self.tx_queue.popleft()
-                self.stat.total_tx_broadcast += 1
+                stat['total_tx_broadcast'][id] += 1
             self.ack_event = None
 
+    def on_restore(self):
+        '''
+        Resume sending queued frames after a restore, as the process doing
+        so was dropped by the checkpoint.  The frame in progress is sent
+        again from the start.
+        '''
+        self.ack_event = None
+        if self.tx_queue:
+            self.node.start_process(self.node.create_process(
+                self.process_queue))
+
     def send_pdu(self,dst,pdu):
-        mac_pdu = PDU(self.LAYER_NAME,pdu.nbits+self.HEADER_BITS,
-                type='data',
-                src=self.node.id,
-                dst=dst,
-                payload=pdu)
-        self.tx_queue.append(mac_pdu)
-        if len(self.tx_queue) == 1:
+        mac_pdu = MacFrame(self.HEADER_BITS,self.node.id,dst,pdu,self._seq)
+        self._seq = (self._seq+1) & 0xFFFF
+        idle = not self.tx_queue
+        if self.tx_queue.append(mac_pdu) is not None:
+            self._counters['total_queue_drop'][self.node.id] += 1
+        if idle:
             self.node.start_process(self.node.create_process(
                 self.process_queue))
 
     def on_receive_pdu(self,pdu):
+        stat,id = self._counters,self.node.id
         if pdu.type == 'data':
-            if pdu.dst == BROADCAST_ADDR or pdu.dst == self.node.id:
-                # TODO: need to get rid of duplications
+            if pdu.dst == BROADCAST_ADDR:
                 self.node.net.on_receive_pdu(pdu.src,pdu.payload)
-
-                # ack if this is a unicast frame
-                if pdu.dst != BROADCAST_ADDR:
-                    ack = PDU(self.LAYER_NAME,nbits=self.HEADER_BITS,
-                            type='ack',
-                            for_frame=pdu)
-                    self.node.phy.send_pdu(ack)
-                    self.stat.total_ack += 1
-                    self.stat.total_rx_unicast += 1
+                stat['total_rx_broadcast'][id] += 1
+            elif pdu.dst == id:
+                # only unicast frames are retransmitted, and thus duplicated
+                if self.duplicates.seen((pdu.src,pdu.seq),self.node.now):
+                    stat['total_duplicate'][id] += 1
                 else:
-                    self.stat.total_rx_broadcast += 1
+                    self.node.net.on_receive_pdu(pdu.src,pdu.payload)
+                    stat['total_rx_unicast'][id] += 1
+
+                # acknowledge duplicates too, as the previous ACK was lost
+                ack = MacAck(self.HEADER_BITS,pdu,pdu.seq)
+                self.node.phy.send_pdu(ack)
+                stat['total_ack'][id] += 1
         elif pdu.type == 'ack' and self.ack_event is not None:
-            if pdu.for_frame == self.ack_event.wait_for:
+            frame = self.ack_event.wait_for
+            if pdu.seq == frame.seq and pdu.for_frame.src == id:
                 self.ack_event.succeed()
 
+###########################################################
+class CsmaMacLayer:
+    '''
+    Unslotted CSMA/CA MAC in the style of IEEE 802.15.4, written as a state
+    machine driven by cancellable callbacks rather than a SimPy process.
+    Before each transmission, the MAC backs off for a random number of
+    unit periods in [0,2^BE-1] and then performs CCA.  When the channel is
+    busy, NB and BE are incremented; the frame is dropped once NB exceeds
+    max_backoffs.  Unicast frames are acknowledged, and retransmitted up to
+    max_retries times when no ACK arrives in time; the ACK timeout is
+    cancelled as soon as the ACK is received.  Frames carry a sequence
+    number, which is used to match ACKs and, through a DuplicateCache, to
+    suppress duplicates.  Frames wait in a TxQueue of the given capacity
+    and drop policy.  Durations assume the 2.4 GHz PHY.
+    '''
+
+    LAYER_NAME = 'mac'
+    HEADER_BITS = 64
+    ACK_BITS = 40
+    UNIT_BACKOFF_PERIOD = 320e-6
+    TURNAROUND_TIME = 192e-6
+    ACK_WAIT_DURATION = 864e-6
+
+    IDLE, BACKOFF, TX, WAIT_ACK = range(4)
+
+    def __init__(self,node,min_be=3,max_be=5,max_backoffs=4,max_retries=3,
+                 dup_capacity=16,dup_lifetime=0.25,
+                 queue_capacity=None,queue_policy='tail'):
+        self.node = node
+        self.min_be = min_be
+        self.max_be = max_be
+        self.max_backoffs = max_backoffs
+        self.max_retries = max_retries
+        self.state = self.IDLE
+        self._env = node.sim.env
+        self._timer = None
+        self._seq = node.sim.random.randrange(256)
+        self.duplicates = DuplicateCache(dup_capacity,dup_lifetime)
+        self.stat = node.sim.stats.view(self.LAYER_NAME,node.id,
+                total_tx_broadcast=int,
+                total_tx_unicast=int,
+                total_rx_broadcast=int,
+                total_rx_unicast=int,
+                total_retransmit=int,
+                total_ack=int,
+                total_access_failure=int,
+                total_tx_failure=int,
+                total_duplicate=int,
+                total_queue_drop=int,
+                queue_length_time=float)
+        self._counters = node.sim.stats.counters(self.LAYER_NAME)
+        self.tx_queue = TxQueue(self._env,queue_capacity,queue_policy,
+                self._counters['queue_length_time'],node.id)
+
+    def send_pdu(self,dst,pdu):
+        frame = MacFrame(self.HEADER_BITS,self.node.id,dst,pdu,self._seq)
+        self._seq = (self._seq+1) & 0xFF
+        if self.tx_queue.append(frame) is not None:
+            self._counters['total_queue_drop'][self.node.id] += 1
+        if self.state == self.IDLE:
+            self._start_frame()
+
+    def _start_frame(self):
+        self._retries = 0
+        self._start_csma()
+
+    def _start_csma(self):
+        self._nb = 0
+        self._be = self.min_be
+        self._backoff()
+
+    def _backoff(self):
+        self.state = self.BACKOFF
+        delay = self.node.sim.random.randrange(1 << self._be)*self.UNIT_BACKOFF_PERIOD
+        self._timer = self._env.schedule_call(delay,self._on_backoff_end)
+
+    def _on_backoff_end(self):
+        if self.node.phy.cca():
+            frame = self.tx_queue[0]
+            self.state = self.TX
+            self.node.phy.send_pdu(frame)
+            tx_time = frame.nbits/self.node.phy.bitrate
+            self._timer = self._env.schedule_call(tx_time,self._on_tx_end)
+            return
+        self._nb += 1
+        self._be = min(self._be+1,self.max_be)
+        if self._nb > self.max_backoffs:
+            self._counters['total_access_failure'][self.node.id] += 1
+            self._next_frame()
+        else:
+            self._backoff()
+
+    def _on_tx_end(self):
+        if self.tx_queue[0].dst == BROADCAST_ADDR:
+            self._counters['total_tx_broadcast'][self.node.id] += 1
+            self._next_frame()
+        else:
+            self.state = self.WAIT_ACK
+            self._timer = self._env.schedule_call(self.ACK_WAIT_DURATION,
+                    self._on_ack_timeout)
+
+    def _on_ack_timeout(self):
+        stat,id = self._counters,self.node.id
+        self._retries += 1
+        if self._retries > self.max_retries:
+            stat['total_tx_failure'][id] += 1
+            self._next_frame()
+        else:
+            stat['total_retransmit'][id] += 1
+            self._start_csma()
+
+    def _next_frame(self):
+        self.tx_queue.popleft()
+        self._timer = None
+        if self.tx_queue:
+            self._start_frame()
+        else:
+            self.state = self.IDLE
+
+    def on_receive_pdu(self,pdu):
+        stat,id = self._counters,self.node.id
+        if pdu.type == 'data':
+            if pdu.dst == BROADCAST_ADDR:
+                stat['total_rx_broadcast'][id] += 1
+                self.node.net.on_receive_pdu(pdu.src,pdu.payload)
+            elif pdu.dst == id:
+                # acknowledge duplicates too, as the previous ACK was lost
+                ack = MacAck(self.ACK_BITS,pdu,pdu.seq)
+                self._env.schedule_call(self.TURNAROUND_TIME,
+                        self.node.phy.send_pdu,(ack,))
+                stat['total_ack'][id] += 1
+                # only unicast frames are retransmitted, and thus duplicated
+                if self.duplicates.seen((pdu.src,pdu.seq),self._env._now):
+                    stat['total_duplicate'][id] += 1
+                else:
+                    stat['total_rx_unicast'][id] += 1
+                    self.node.net.on_receive_pdu(pdu.src,pdu.payload)
+        elif pdu.type == 'ack' and self.state == self.WAIT_ACK:
+            # ignore overheard ACKs meant for neighbors
+            if pdu.seq == self.tx_queue[0].seq and pdu.for_frame.src == id:
+                self._env.cancel_call(self._timer)
+                self._counters['total_tx_unicast'][id] += 1
+                self._next_frame()
+
 ###########################################################
 class DefaultNetLayer:
+    '''
+    Default network layer delivering packets to the node.  Packets carry
+    their origin and a 16-bit sequence number, so that copies of a packet
+    reaching the node again, e.g., through another relay in subclasses
+    that forward packets, are dropped.
+    '''
 
     LAYER_NAME = 'net'
     HEADER_BITS = 64
 
-    def __init__(self,node):
+    def __init__(self,node,dup_capacity=16,dup_lifetime=None):
         self.node = node
-        self.stat = Stat()
+        self._seq = 0
+        self.duplicates = DuplicateCache(dup_capacity,dup_lifetime)
+        self.stat = node.sim.stats.view(self.LAYER_NAME,node.id,
+                total_duplicate=int)
+        self._counters = node.sim.stats.counters(self.LAYER_NAME)
 
     def send_pdu(self,dst,pdu):
-        net_pdu = PDU(self.LAYER_NAME,pdu.nbits+self.HEADER_BITS,
-                src=self.node.id,
-                dst=dst,
-                payload=pdu)
+        net_pdu = NetPDU(self.HEADER_BITS,self.node.id,dst,pdu,self._seq)
+        self._seq = (self._seq+1) & 0xFFFF
         self.node.mac.send_pdu(dst,net_pdu)
 
     def on_receive_pdu(self,src,pdu):
+        if self.duplicates.seen((pdu.src,pdu.seq),self.node.now):
+            self._counters['total_duplicate'][self.node.id] += 1
+            return
         self.node.on_receive_pdu(src,pdu.payload)
 
 ###########################################################
@@ -346,29 +1167,77 @@ class LayeredNode(Node):
     ############################
     def send(self,dst,*args,**kwargs):
         nbits = kwargs.get("nbits",self.DEFAULT_MSG_NBITS)
-        app_pdu = PDU("app",nbits,args=args,kwargs=kwargs)
+        app_pdu = AppPDU(nbits,args,kwargs,kwargs.get("priority"))
         self.net.send_pdu(dst,app_pdu)
 
     ############################
     def on_receive_pdu(self,src,pdu):
-        # use process just in case on_receive is a generator
-        self.start_process(self.create_process(
-            self.on_receive,src,*pdu.args,**pdu.kwargs))
+        # on_receive may be a generator, in which case a process is started
+        self.delayed_exec(0,self.on_receive,src,*pdu.args,**pdu.kwargs)
 
 ###########################################################
 class Simulator:
 
+    # move_nodes() switches to a bulk rebuild when at least one out of this
+    # many nodes moves at once
+    BULK_MOVE_RATIO = 4
+
+    # attributes that checkpoint() does not save, as they belong to the
+    # simulator restoring a checkpoint rather than to the simulated state
+    CHECKPOINT_EXCLUDE = ('env','timeout','stats','random','until','timescale',
+            'profile','profiler','tracer','_topology','_grid','_restored')
+
     ############################
-    def __init__(self,until,timescale=1,seed=0):
-        if timescale > 0:
-            self.env = simpy.rt.RealtimeEnvironment(factor=timescale,strict=False)
-        else:
-            self.env = simpy.Environment()
+    def __init__(self,until,timescale=1,seed=0,cell_size=None,profile=False,
+                 max_range=None):
+        self.timescale = timescale
+        self.env = self.create_env()
         self.nodes = []
         self.until = until
-        self.timescale = timescale
         self.timeout = self.env.timeout
         self.random = random.Random(seed)
+        self.stats = StatRegistry()
+
+        # uniform grid used as a spatial index for neighbor discovery; when
+        # cell_size is not given, it follows the largest tx_range seen so far
+        self.cell_size = cell_size
+        self._auto_cell_size = cell_size is None
+        self._grid = {}
+        self._max_range = 0
+
+        # neighbor lists also keep nodes up to max_range beyond tx_range, so
+        # that tx_range can grow up to it without any rebuild, and channel
+        # models count these nodes as interferers
+        self.max_range = max_range
+
+        # incremented whenever any neighbor list changes, so that data
+        # derived from the neighbor graph can tell when it is stale
+        self.topology_version = 0
+        self._topology = None
+
+        # optional channel model shared by all nodes (see wsnsimpy.channel)
+        self.channel = None
+
+        # when profiling, run() instruments the environment and the nodes
+        # and prints a summary at the end (see wsnsimpy.profiling)
+        self.profile = profile
+        self.profiler = None
+
+        # optional wsnsimpy.trace.Tracer receiving Node.log() records
+        self.tracer = None
+
+        # set by restore(), so that run() resumes instead of starting over
+        self._restored = False
+
+    ############################
+    def create_env(self):
+        '''
+        Return the environment to run the simulation in, which follows the
+        wall-clock time when timescale > 0
+        '''
+        if self.timescale > 0:
+            return RealtimeEnvironment(factor=self.timescale,strict=False)
+        return Environment()
 
     ############################
     def init(self):
@@ -379,57 +1248,408 @@ class Simulator:
     def now(self):
         return self.env.now
 
+    ############################
+    @property
+    def realtime_lag(self):
+        '''
+        Seconds of wall-clock time by which the simulation currently runs
+        behind its timescale, when paced by a HybridEnvironment
+        '''
+        return getattr(self.env,'lag',0.0)
+
+    ############################
+    @property
+    def topology(self):
+        '''
+        The in-range neighbor graph as a wsnsimpy.topology.Topology, created
+        on first use and then kept up to date row by row
+        '''
+        if self._topology is None:
+            from .topology import Topology
+            self._topology = Topology(self)
+        return self._topology
+
+    ############################
+    def _neighbors_changed(self,ids):
+        '''Record that neighbor lists of nodes with the given IDs changed'''
+        self.topology_version += 1
+        if self._topology is not None:
+            self._topology.invalidate(ids)
+
     ############################
     def delayed_exec(self,delay,func,*args,**kwargs):
-        func = ensure_generator(self.env,func,*args,**kwargs)
-        start_delayed(self.env,func,delay=delay)
+        '''
+        Execute func(*args,**kwargs) after the specified delay.  A generator
+        function is started as a SimPy process; a plain function is simply
+        called back without creating any process, and a handle is returned
+        that can be passed to env.cancel_call().
+        '''
+        if is_generator_function(func):
+            if delay > 0:
+                start_delayed(self.env,func(*args,**kwargs),delay=delay)
+            else:
+                self.env.process(func(*args,**kwargs))
+            return
+        return self.env.schedule_call(delay,func,args,kwargs)
 
     ############################
     def add_node(self,nodeclass,pos):
         id = len(self.nodes)
         node = nodeclass(self,id,pos)
         self.nodes.append(node)
+        self.stats.resize(len(self.nodes))
         self.update_neighbor_list(id)
         return node
 
+    ############################
+    def add_nodes(self,nodeclass,positions):
+        '''
+        Add one node of class nodeclass at each of the given positions, which
+        may be a NumPy array of shape (n,2) or any sequence of (x,y) pairs.
+        Unlike calling add_node() repeatedly, neighbor lists are built once
+        in a single cell-blocked, vectorized pass.  Return the list of new
+        nodes.
+        '''
+        positions = np.asarray(positions,dtype=float).reshape(-1,2)
+        first = len(self.nodes)
+        new_nodes = []
+        for i,pos in enumerate(positions.tolist()):
+            node = nodeclass(self,first+i,tuple(pos))
+            self.nodes.append(node)
+            new_nodes.append(node)
+        self.stats.resize(len(self.nodes))
+        for node in new_nodes:
+            self._update_range(self.neighbor_range(node))
+        for node in new_nodes:
+            node._cell = self._cell_of(node.pos)
+            self._grid.setdefault(node._cell,[]).append(node)
+
+        # only lists of nodes around the new ones need rebuilding
+        cells = set()
+        for c in set(node._cell for node in new_nodes):
+            cells.update(self._cells_around(c,self._max_range))
+        self._build_neighbor_lists(cells)
+        return new_nodes
+
+    ############################
+    def neighbor_range(self,node):
+        '''
+        Return the distance up to which neighbor lists of node are kept,
+        i.e., its tx_range, or max_range when larger
+        '''
+        if self.max_range is not None and self.max_range > node.tx_range:
+            return self.max_range
+        return node.tx_range
+
+    ############################
+    def _build_neighbor_lists(self,cells):
+        '''
+        Rebuild neighbor lists of all nodes located in the given grid cells.
+        Candidate pairs are generated for all of these nodes at once, one
+        neighboring cell offset at a time, so that distances are computed in
+        a few vectorized passes.
+        '''
+        nodes = self.nodes
+        rows = np.array([n.id for c in cells for n in self._grid[c]],dtype=np.int64)
+        if len(rows) == 0:
+            return
+        xy = np.array([n.pos for n in nodes],dtype=float).reshape(-1,2)
+        ranges = np.array([self.neighbor_range(n) for n in nodes],dtype=float)
+        cxy = np.array([n._cell for n in nodes],dtype=np.int64).reshape(-1,2)
+        rings = int(math.ceil(ranges[rows].max()/self.cell_size))
+
+        # encode cells as integer keys and sort nodes by key, so that nodes
+        # sharing a cell form a contiguous run
+        cxy = cxy - cxy.min(axis=0) + rings
+        width = cxy[:,1].max() + rings + 1
+        keys = cxy[:,0]*width + cxy[:,1]
+        order = np.argsort(keys,kind='stable')
+        sorted_keys = keys[order]
+
+        pair_rows,pair_cols,pair_dists = [],[],[]
+        for dx in range(-rings,rings+1):
+            for dy in range(-rings,rings+1):
+                target = keys[rows] + dx*width + dy
+                lo = np.searchsorted(sorted_keys,target,'left')
+                count = np.searchsorted(sorted_keys,target,'right') - lo
+                total = count.sum()
+                if total == 0:
+                    continue
+                r = np.repeat(rows,count)
+                first = np.repeat(lo-np.cumsum(count)+count,count)
+                c = order[first+np.arange(total)]
+                diff = xy[r]-xy[c]
+                d = np.sqrt((diff*diff).sum(axis=1))
+                keep = (d <= ranges[r]) & (r != c)
+                pair_rows.append(r[keep])
+                pair_cols.append(c[keep])
+                pair_dists.append(d[keep])
+
+        r = np.concatenate(pair_rows)
+        c = np.concatenate(pair_cols)
+        d = np.concatenate(pair_dists)
+        sort = np.lexsort((c,d,r))
+        dists = d[sort]
+        ids = c[sort].astype(np.intc)
+        self._neighbors_changed(rows.tolist())
+        ends = np.cumsum(np.bincount(r,minlength=len(nodes)))
+        starts = ends - np.bincount(r,minlength=len(nodes))
+        for i,start,end,r in zip(rows.tolist(),
+                starts[rows].tolist(),ends[rows].tolist(),ranges[rows].tolist()):
+            nodes[i].neighbor_dists = array('d',dists[start:end].tobytes())
+            nodes[i].neighbor_ids = array('i',ids[start:end].tobytes())
+            nodes[i]._list_range = r
+
+    ############################
+    def _cell_of(self,pos):
+        return (int(pos[0]//self.cell_size),int(pos[1]//self.cell_size))
+
+    ############################
+    def _update_range(self,r):
+        '''
+        Keep track of the largest neighbor range and make sure the grid
+        exists and its cells are not much smaller than that range
+        '''
+        if r > self._max_range:
+            self._max_range = r
+        if self.cell_size is None:
+            self._regrid(r if r > 0 else 1.0)
+        elif self._auto_cell_size and r > 2*self.cell_size:
+            self._regrid(r)
+
+    ############################
+    def _regrid(self,cell_size):
+        self.cell_size = cell_size
+        self._grid = {}
+        for n in self.nodes:
+            if n._cell is not None:
+                n._cell = self._cell_of(n.pos)
+                self._grid.setdefault(n._cell,[]).append(n)
+
+    ############################
+    def _cells_around(self,cell,r):
+        '''
+        Return all non-empty grid cells that may contain nodes within
+        distance r from any point inside the given cell
+        '''
+        rings = int(math.ceil(r/self.cell_size))
+        cx,cy = cell
+        grid = self._grid
+        return [(x,y)
+                for x in range(cx-rings,cx+rings+1)
+                for y in range(cy-rings,cy+rings+1)
+                if (x,y) in grid]
+
+    ############################
+    def _nodes_around(self,cell,r):
+        '''
+        Generate all nodes in grid cells that may contain nodes within
+        distance r from any point inside the given cell
+        '''
+        for c in self._cells_around(cell,r):
+            yield from self._grid[c]
+
     ############################
     def update_neighbor_list(self,id):
         '''
         Maintain each node's neighbor list by sorted distance after affected
-        by addition or relocation of node with ID id
+        by addition or relocation of node with ID id, or by a change of its
+        tx_range.  Only nodes within neighbor_range() of a node are kept in
+        its neighbor list, which is stored as parallel arrays neighbor_dists
+        and neighbor_ids so that memory grows with the number of links
+        rather than with the number of node pairs.
         '''
         me = self.nodes[id]
-
-        # (re)sort other nodes' neighbor lists by distance
-        for n in self.nodes:
-            # skip this node
+        my_range = self.neighbor_range(me)
+        changed = [id]
+
+        # detach this node from neighbor lists of nodes around its previous
+        # location, before a regrid moves it to the cell of its new position
+        if me._cell is not None:
+            for n in self._nodes_around(me._cell,self._max_range):
+                if n is me or id not in n.neighbor_ids:
+                    continue
+                i = n.neighbor_ids.index(id)
+                del n.neighbor_dists[i]
+                del n.neighbor_ids[i]
+                changed.append(n.id)
+        self._update_range(my_range)
+        self._relocate(me)
+
+        # insert this node into nearby nodes' neighbor lists while
+        # maintaining sort order by distance, and rebuild its own list
+        mylist = []
+        for n in self._nodes_around(me._cell,self._max_range):
             if n is me:
                 continue
+            dist = distance(n.pos,me.pos)
+            if dist <= my_range:
+                mylist.append((dist,n.id))
+            if dist <= n._list_range:
+                # equal distances are ordered by node ID
+                dists,ids = n.neighbor_dists,n.neighbor_ids
+                i = bisect.bisect_left(dists,dist)
+                while i < len(dists) and dists[i] == dist and ids[i] < id:
+                    i += 1
+                dists.insert(i,dist)
+                ids.insert(i,id)
+                changed.append(n.id)
+        mylist.sort()
+        me.neighbor_dists = array('d',[dist for dist,_ in mylist])
+        me.neighbor_ids = array('i',[nid for _,nid in mylist])
+        me._list_range = my_range
+        self._neighbors_changed(changed)
 
-            nlist = n.neighbor_distance_list
+    ############################
+    def _relocate(self,me):
+        '''
+        Move node me to the grid cell of its current position, touching only
+        the cells it left and entered
+        '''
+        cell = self._cell_of(me.pos)
+        if cell == me._cell:
+            return
+        if me._cell is not None:
+            nodes = self._grid[me._cell]
+            nodes.remove(me)
+            if not nodes:
+                del self._grid[me._cell]
+        me._cell = cell
+        self._grid.setdefault(cell,[]).append(me)
 
-            # remove this node from other nodes' neighbor lists
-            for i,(dist,neighbor) in enumerate(nlist):
-                if neighbor is me:
-                    del nlist[i]
-                    break
+    ############################
+    def move_nodes(self,ids,positions):
+        '''
+        Relocate the nodes with the given IDs to the given positions, which
+        may be a NumPy array of shape (n,2) or any sequence of (x,y) pairs.
+        A few nodes are moved one by one; a large batch, such as a mobility
+        tick over all nodes, rebuilds the lists around the moved nodes in a
+        single vectorized pass.
+        '''
+        positions = np.asarray(positions,dtype=float).reshape(-1,2).tolist()
+        if len(positions)*self.BULK_MOVE_RATIO < len(self.nodes):
+            for id,pos in zip(ids,positions):
+                self.nodes[id].pos = tuple(pos)
+                self.update_neighbor_list(id)
+            return
+        cells = set()
+        for id,pos in zip(ids,positions):
+            me = self.nodes[id]
+            cells.add(me._cell)
+            me.pos = tuple(pos)
+            self._relocate(me)
+            cells.add(me._cell)
+        affected = set()
+        for c in cells:
+            affected.update(self._cells_around(c,self._max_range))
+        self._build_neighbor_lists(affected)
 
-            # then insert it while maintaining sort order by distance
-            bisect.insort(nlist,(distance(n.pos,me.pos),me))
+    ############################
+    def refresh_neighbor_lists(self):
+        '''
+        Rebuild all neighbor lists from the spatial index.  Lists of nodes
+        whose tx_range has grown are otherwise extended one by one when next
+        used; this rebuilds them all at once, and also trims lists of nodes
+        whose tx_range has shrunk.
+        '''
+        for n in self.nodes:
+            self._update_range(self.neighbor_range(n))
+        self._build_neighbor_lists(list(self._grid))
 
-        self.nodes[id].neighbor_distance_list = [
-                (distance(n.pos,me.pos),n)
-                for n in self.nodes if n is not me
-                ]
-        self.nodes[id].neighbor_distance_list.sort()
+    ############################
+    def checkpoint(self,path,drop_processes=False):
+        '''
+        Save the state of the simulation to path: nodes and their layers,
+        stat counters, neighbor lists, the random generator and pending
+        callbacks, including timers.  Generators cannot be saved, so
+        pending SimPy processes and events make this fail unless
+        drop_processes is True, in which case they are discarded.  A
+        checkpoint can be saved after run() returns or from a callback.
+        '''
+        from .checkpoint import save_checkpoint
+        save_checkpoint(self,path,drop_processes)
 
     ############################
-    def run(self):
-        self.init()
+    def restore(self,path):
+        '''
+        Load a checkpoint saved by checkpoint() into this simulator, which
+        must be of the same class and have no nodes yet.  run() then resumes
+        the simulation at the saved time, without calling init() or starting
+        node processes again, and runs it until this simulator's until.
+        Layers having an on_restore() method are then given a chance to
+        restart processes dropped by checkpoint().
+        '''
+        if self.nodes:
+            raise ValueError('cannot restore into a simulator with nodes')
+        from .checkpoint import load_checkpoint
+        load_checkpoint(self,path)
+        self._grid = {}
+        for n in self.nodes:
+            n._cell = self._cell_of(n.pos)
+            self._grid.setdefault(n._cell,[]).append(n)
+        self._topology = None
+        self.topology_version += 1
+        self._restored = True
+
+        # let layers restart what was dropped with SimPy processes
         for n in self.nodes:
-            n.init()
+            for layer in (getattr(n,'phy',None),getattr(n,'mac',None),
+                          getattr(n,'net',None)):
+                on_restore = getattr(layer,'on_restore',None)
+                if on_restore is not None:
+                    on_restore()
+
+    ############################
+    def _tx_queues(self):
         for n in self.nodes:
-            self.env.process(ensure_generator(self.env,n.run))
+            queue = getattr(getattr(n,'mac',None),'tx_queue',None)
+            if isinstance(queue,TxQueue):
+                yield queue
+
+    ############################
+    def _flush_queues(self):
+        for queue in self._tx_queues():
+            queue.flush()
+
+    ############################
+    def queue_length_histogram(self):
+        '''
+        Return the total time, summed over all nodes whose MAC uses a
+        TxQueue, spent at each transmit queue length, starting at 0
+        '''
+        hist = np.zeros(1)
+        for queue in self._tx_queues():
+            queue.flush()
+            times = np.frombuffer(queue.time_at)
+            if len(times) > len(hist):
+                hist = np.concatenate([hist,np.zeros(len(times)-len(hist))])
+            hist[:len(times)] += times
+        return hist
+
+    ############################
+    def run(self):
+        if not self._restored:
+            self.init()
+            for n in self.nodes:
+                n.init()
+            # tx_range is commonly assigned right after add_node()
+            self.refresh_neighbor_lists()
+        if self.profile:
+            from .profiling import Profiler
+            self.profiler = Profiler(self)
+            self.profiler.attach_env()
+            self.profiler.attach_nodes()
+            self.profiler.start()
+        if not self._restored:
+            for n in self.nodes:
+                self.env.process(ensure_generator(self.env,n.run))
         self.env.run(until=self.until)
+        if self.profiler is not None:
+            self.profiler.stop()
         for n in self.nodes:
             n.finish()
+        self._flush_queues()
+        if self.profiler is not None:
+            self.profiler.report()
+        if self.tracer is not None:
+            self.tracer.close()
@@ -3,8 +3,9 @@ import os
 from . import wsnsimpy 
 from .wsnsimpy import BROADCAST_ADDR, start_delayed, ensure_generator
 from threading import Thread
-from .topovis import Scene,LineStyle
+from .topovis import Scene,LineStyle,QueuedPlotter,RecordingPlotter
 from .topovis.TkPlotter import Plotter
+from .topovis import RasterPlotter
 
 ###########################################################
 class Node(wsnsimpy.Node):
@@ -73,6 +74,17 @@ class DefaultMacLayer(wsnsimpy.DefaultMacLayer):
         oid = self.node.scene.line(sx,sy,dx,dy,line="wsnsimpy:unicast")
         self.node.delayed_exec(0.2,self.node.scene.delshape,oid)
 
+###########################################################
+class CsmaMacLayer(wsnsimpy.CsmaMacLayer):
+    def on_receive_pdu(self,pdu):
+        super().on_receive_pdu(pdu)
+        if pdu.type != "data" or pdu.dst != self.node.id:
+            return
+        sx,sy = self.node.sim.nodes[pdu.src].pos
+        dx,dy = self.node.pos
+        oid = self.node.scene.line(sx,sy,dx,dy,line="wsnsimpy:unicast")
+        self.node.delayed_exec(0.2,self.node.scene.delshape,oid)
+
 ###########################################################
 class DefaultNetLayer(wsnsimpy.DefaultNetLayer):
     pass
@@ -97,50 +109,127 @@ class LayeredNode(wsnsimpy.LayeredNode):
 
 
 ###########################################################
-class _FakeScene:
-    def _fake_method(self,*args,**kwargs):
+class _FakeMethod:
+    '''No-op scene command, pickled by name so that checkpoints taken
+    without a scene can be restored with one'''
+    __slots__ = ('scene','name')
+    def __init__(self,scene,name):
+        self.scene = scene
+        self.name = name
+    def __call__(self,*args,**kwargs):
         pass
+    def __reduce__(self):
+        return (getattr,(self.scene,self.name))
+
+class _FakeScene:
     def __getattr__(self,name):
-        return self._fake_method
+        return _FakeMethod(self,name)
 
 ###########################################################
 class Simulator(wsnsimpy.Simulator):
     '''Wrap WsnSimPy's Simulator class so that Tk main loop can be started in the
-    main thread'''
-
-    def __init__(self,until,timescale=1,terrain_size=(500,500),visual=True,title=None):
-        super().__init__(until,timescale)
+    main thread.  When record names a file, scene commands are also recorded
+    there for later replay with wsnsimpy.topovis.Replay, which allows running
+    with visual=False and timescale=0 at full speed.  Likewise, when frames
+    names a directory, PNG images of the scene are written there every
+    frame_interval seconds of simulation time, without any display.
+
+    With visual=True and fast_forward=True, the simulation only follows
+    timescale while the scene has changed within the last hold seconds of
+    simulation time, and skips through quiet stretches at full speed; see
+    realtime_lag for how far it falls behind.  With visual=False, timescale
+    is ignored and the simulation never sleeps.'''
+
+    CHECKPOINT_EXCLUDE = wsnsimpy.Simulator.CHECKPOINT_EXCLUDE + ('visual',
+            'fast_forward','hold','terrain_size','frame_rate','scene','tkplot',
+            'tk','plotter','recorder','raster')
+
+    def __init__(self,until,timescale=1,terrain_size=(500,500),visual=True,title=None,seed=0,profile=False,frame_rate=30,record=None,frames=None,frame_interval=0.1,fast_forward=True,hold=1.0,max_range=None):
         self.visual = visual
+        self.fast_forward = fast_forward
+        self.hold = hold
+        super().__init__(until,timescale,seed,profile=profile,max_range=max_range)
         self.terrain_size = terrain_size
-        if self.visual:
+        self.frame_rate = frame_rate
+        self.recorder = None
+        self.raster = None
+        if self.visual or record is not None or frames is not None:
             self.scene = Scene(realtime=True)
+            if self.visual:
+                if title is None:
+                    title = "WsnSimPy"
+                self.tkplot = Plotter(windowTitle=title,terrain_size=terrain_size)
+                self.tk = self.tkplot.tk
+                # the simulation thread only queues scene commands, which
+                # are drawn by Tk's main loop once per frame
+                self.plotter = QueuedPlotter(self.tkplot)
+                self.scene.addPlotter(self.plotter)
+                if isinstance(self.env,wsnsimpy.HybridEnvironment):
+                    self.env.probe = lambda: self.plotter.count
+            if record is not None:
+                self.recorder = RecordingPlotter(record,clock=lambda: self.env.now)
+                self.scene.addPlotter(self.recorder)
+            if frames is not None:
+                self.raster = RasterPlotter.Plotter(frames,frame_interval,
+                        clock=lambda: self.env.now)
+                self.scene.addPlotter(self.raster)
+            self.scene.init(*terrain_size)
             self.scene.linestyle("wsnsimpy:tx", color=(0,0,1), dash=(5,5))
             self.scene.linestyle("wsnsimpy:ack", color=(0,1,1), dash=(5,5))
             self.scene.linestyle("wsnsimpy:unicast", color=(0,0,1), width=3, arrow='head')
             self.scene.linestyle("wsnsimpy:collision", color=(1,0,0), width=3)
-            if title is None:
-                title = "WsnSimPy"
-            self.tkplot = Plotter(windowTitle=title,terrain_size=terrain_size)
-            self.tk = self.tkplot.tk
-            self.scene.addPlotter(self.tkplot)
-            self.scene.init(*terrain_size)
         else:
             self.scene = _FakeScene()
 
+    def create_env(self):
+        if not self.visual or self.timescale <= 0:
+            return wsnsimpy.Environment()
+        if self.fast_forward:
+            return wsnsimpy.HybridEnvironment(factor=self.timescale,hold=self.hold)
+        return super().create_env()
+
     def init(self):
         super().init()
 
+    def restore(self,path):
+        super().restore(path)
+        for n in self.nodes:
+            self.scene.node(n.id,*n.pos)
+
+    def move_nodes(self,ids,positions):
+        super().move_nodes(ids,positions)
+        self.scene.nodemoves(ids,[self.nodes[id].pos for id in ids])
+
     def _update_time(self):
         while True:
             self.scene.setTime(self.now)
             yield self.timeout(0.1)
 
+    def _advance_frames(self):
+        # write frames at every frame interval, whether or not the scene
+        # changes, as nothing calls setTime() in headless runs
+        raster = self.raster
+        raster.advance()
+        self.env.schedule_call(raster.frame*raster.frameInterval-self.now,
+                self._advance_frames)
+
     def run(self):
         if self.visual:
             self.env.process(self._update_time())
-            thr = Thread(target=super().run)
-            thr.setDaemon(True)
+            thr = Thread(target=self._run)
+            thr.daemon = True
             thr.start()
+            self.tkplot.runQueue(self.plotter,self.frame_rate)
             self.tkplot.tk.mainloop()
         else:
-            super().run()
+            self._run()
+
+    def _run(self):
+        if self.raster is not None and not self._restored:
+            self.env.schedule_call(0,self._advance_frames)
+        super().run()
+        if self.recorder is not None:
+            self.recorder.close()
+        if self.raster is not None:
+            self.raster.advance()
+            self.raster.close()